@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Room, Teacher, Subject, StudentBatch, Department, GeneratedTimetable, TimetableSlot, PinnedSlot
+from .models import Room, Teacher, Subject, StudentBatch, Department, GeneratedTimetable, TimetableSlot, PinnedSlot, GenerationJob, SolverRun
 
 
 @admin.register(Room)
@@ -20,7 +20,7 @@ class StudentBatchAdmin(admin.ModelAdmin):
 
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+    list_display = ('name', 'solver_time_budget')
 
 @admin.register(GeneratedTimetable)
 class GeneratedTimetableAdmin(admin.ModelAdmin):
@@ -30,4 +30,12 @@ class GeneratedTimetableAdmin(admin.ModelAdmin):
 class PinnedSlotAdmin(admin.ModelAdmin):
     list_display = ('subject', 'department', 'day', 'slot_index')
 
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'department', 'status', 'created_at', 'finished_at')
+
+@admin.register(SolverRun)
+class SolverRunAdmin(admin.ModelAdmin):
+    list_display = ('department', 'solver_mode', 'num_variables', 'status', 'time_limit', 'time_to_best', 'wall_time', 'created_at')
+
 admin.site.register(TimetableSlot)
\ No newline at end of file
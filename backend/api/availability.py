@@ -0,0 +1,149 @@
+"""Weekly availability of teachers, batches and rooms as 40-bit masks.
+
+Bit day * SLOTS_PER_DAY + slot of a mask is set when that cell is usable, so an availability
+test is one shift and AND, and the number of usable cells (per week or per day) is a
+popcount. A teacher is usable inside their preferred window minus their unavailability
+blocks; a batch wherever one of its subjects' teachers is; a room in every cell not held by
+another department's published timetable (room_masks, applied per use since that changes
+with every publish elsewhere).
+
+The generator builds an Availability from the inputs it has just loaded, so the model always
+matches its input fingerprint. Slot editing reads department_availability(), which is cached
+per department and dropped by the model signals in signals.py on any change. Both read the
+unavailability blocks with load_unavailability(), so they mask the same teachers the same way.
+"""
+import threading
+
+from .models import Subject, Teacher, TeacherUnavailability
+from .scheduler import DAYS, SLOTS_PER_DAY, TIME_SLOT_INDEX
+
+DAY_INDEX = {day: i for i, day in enumerate(DAYS)}
+WEEK_CELLS = len(DAYS) * SLOTS_PER_DAY
+FULL_WEEK = (1 << WEEK_CELLS) - 1
+DAY_MASKS = [((1 << SLOTS_PER_DAY) - 1) << (d * SLOTS_PER_DAY) for d in range(len(DAYS))]
+
+
+def cell_bit(day, slot):
+    """Mask of the single cell (day index, slot index)."""
+    return 1 << (day * SLOTS_PER_DAY + slot)
+
+
+def window_mask(start, end):
+    """Cells with start <= slot < end on every day."""
+    start, end = max(start, 0), min(end, SLOTS_PER_DAY)
+    if start >= end:
+        return 0
+    day = ((1 << (end - start)) - 1) << start
+    return sum(day << (d * SLOTS_PER_DAY) for d in range(len(DAYS)))
+
+
+def cells(mask):
+    """[(day index, slot index)] of the set bits, in week order."""
+    found = []
+    while mask:
+        low = mask & -mask
+        found.append(divmod(low.bit_length() - 1, SLOTS_PER_DAY))
+        mask ^= low
+    return found
+
+
+def room_masks(rooms, reserved):
+    """{room id: mask} of the cells each room is free in; reserved maps (day, 'HH:MM') to room ids held elsewhere."""
+    masks = {r.id: FULL_WEEK for r in rooms}
+    for (day, start), room_ids in reserved.items():
+        if day in DAY_INDEX and start in TIME_SLOT_INDEX:
+            held = cell_bit(DAY_INDEX[day], TIME_SLOT_INDEX[start])
+            for r_id in room_ids:
+                if r_id in masks:
+                    masks[r_id] &= ~held
+    return masks
+
+
+class Availability:
+    """Teacher and batch masks of one set of scheduling inputs.
+
+    Subjects may name a teacher from another department, whom the model still schedules, so
+    those teachers get a mask too. unavailability_set holds (teacher id, 'MON', slot index).
+    """
+
+    def __init__(self, teachers, subjects, unavailability_set):
+        teacher_objs = {t.id: t for t in teachers}
+        for s in subjects:
+            if s.teacher and s.teacher_id not in teacher_objs:
+                teacher_objs[s.teacher_id] = s.teacher
+        self.teachers = {
+            t.id: window_mask(t.preferred_start_slot, t.preferred_end_slot) for t in teacher_objs.values()
+        }
+        for t_id, day, slot in unavailability_set:
+            if t_id in self.teachers and day in DAY_INDEX and 0 <= slot < SLOTS_PER_DAY:
+                self.teachers[t_id] &= ~cell_bit(DAY_INDEX[day], slot)
+        self.batches = {}
+        for s in subjects:
+            if s.batch_id and s.teacher_id in self.teachers:
+                self.batches[s.batch_id] = self.batches.get(s.batch_id, 0) | self.teachers[s.teacher_id]
+
+    def mask(self, kind, resource_id):
+        """Mask of a 'teacher' or 'batch'; 0 for one these inputs don't know."""
+        return (self.teachers if kind == 'teacher' else self.batches).get(resource_id, 0)
+
+    def free(self, kind, resource_id, day, slot):
+        return bool(self.mask(kind, resource_id) >> (day * SLOTS_PER_DAY + slot) & 1)
+
+    def count(self, kind, resource_id, day=None):
+        """Usable cells of a resource in the week, or on one day index."""
+        mask = self.mask(kind, resource_id)
+        return (mask if day is None else mask & DAY_MASKS[day]).bit_count()
+
+
+class AvailabilityCache:
+    def __init__(self):
+        self._entries = {}  # department_id -> Availability
+        self._lock = threading.Lock()
+
+    def get(self, department_id):
+        with self._lock:
+            return self._entries.get(department_id)
+
+    def put(self, department_id, availability):
+        with self._lock:
+            self._entries[department_id] = availability
+
+    def invalidate(self, department_id=None):
+        """Drop one department's entry, or every entry when department_id is None."""
+        with self._lock:
+            if department_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(department_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+availability_cache = AvailabilityCache()
+
+
+def load_unavailability(teachers, subjects):
+    """Unavailability set of the department's teachers and of every teacher its subjects name. Returns
+    {(teacher id, 'MON', slot index)}."""
+    teacher_ids = {t.id for t in teachers} | {s.teacher_id for s in subjects if s.teacher_id}
+    return set(
+        TeacherUnavailability.objects.filter(teacher_id__in=teacher_ids).values_list('teacher_id', 'day', 'slot_index')
+    )
+
+
+def department_availability(department_id):
+    """Availability of a department's teachers and batches, from the cache or built with three queries."""
+    availability = availability_cache.get(department_id)
+    if availability is None:
+        subjects = list(
+            Subject.objects.filter(department_id=department_id).select_related('teacher')
+            .only('batch_id', 'teacher__preferred_start_slot', 'teacher__preferred_end_slot')
+        )
+        teachers = list(
+            Teacher.objects.filter(department_id=department_id)
+            .only('preferred_start_slot', 'preferred_end_slot')
+        )
+        availability = Availability(teachers, subjects, load_unavailability(teachers, subjects))
+        availability_cache.put(department_id, availability)
+    return availability
@@ -0,0 +1,255 @@
+"""Synthetic campuses and a timing harness for generate_timetable().
+
+A CampusSpec describes a campus: departments of main batches with lab sub-batches, their
+teachers and the rooms they share, pins, how much of each teacher's week is blocked and how
+full each batch's week is. synthetic_campus() generates one in memory, seeded so a spec and
+seed always give the same instance, and build_campus() writes it to the database.
+run_benchmark() generates every department's timetables and returns the phase timings
+generate_timetable() reports, the model size and the peak resident memory as a JSON-ready
+dict. The benchmark_scheduler command runs presets of these in a throwaway database, and
+benchmark_model_build times the model build alone on in-memory campuses.
+"""
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from .models import Department, StudentBatch, Teacher, Subject, Room, PinnedSlot, TeacherUnavailability
+from .scheduler import DAYS, SLOTS_PER_DAY, generate_campus, generate_timetable
+
+CampusSpec = namedtuple('CampusSpec', [
+    'departments',           # departments, each generated on its own
+    'batches',               # main batches per department
+    'sub_batches',           # lab sub-batches per main batch
+    'theory_subjects',       # theory subjects per main batch
+    'lab_subjects',          # lab subjects per main batch, taught to each of its sub-batches
+    'subjects_per_teacher',  # theory subjects per teacher; lab teachers only teach labs
+    'room_ratio',            # theory rooms per main batch and lab rooms per two sub-batches, campus-wide
+    'pins',                  # pinned lectures per department
+    'unavailability',        # share of each teacher's 40 weekly cells blocked
+    'tightness',             # share of a batch's weekly class cap its lectures fill
+], defaults=[1, 4, 2, 6, 2, 2, 1.0, 0, 0.0, 0.6])
+
+PRESETS = {
+    'small': CampusSpec(),
+    'medium': CampusSpec(departments=3, batches=8, pins=4, unavailability=0.1),
+    'large': CampusSpec(departments=6, batches=12, pins=8, unavailability=0.1, tightness=0.7),
+    'tight': CampusSpec(departments=2, batches=6, pins=4, unavailability=0.25, tightness=0.85, room_ratio=0.6),
+}
+
+BATCH_SIZES = (50, 60, 70)
+THEORY_CAPACITIES = (60, 75)  # a 70-student batch only fits the larger rooms
+LAB_CAPACITY = 35
+
+
+Campus = namedtuple('Campus', ['departments', 'rooms', 'batches', 'teachers', 'subjects', 'unavailability', 'pins'])
+
+
+def synthetic_campus(spec, seed=0):
+    """Generate the campus of a CampusSpec as unsaved model instances. Returns a Campus.
+
+    Every instance gets an id, counted up from 1, so the campus can be handed straight to the
+    scheduler's model builder without touching the database; build_campus() saves it.
+    """
+    rng = random.Random(seed)
+    next_id = iter(range(1, 10 ** 9))
+    cells = [(day, slot) for day in DAYS for slot in range(SLOTS_PER_DAY)]
+    main_batches = spec.departments * spec.batches
+    theory_rooms = max(1, math.ceil(main_batches * spec.room_ratio))
+    lab_rooms = max(1, math.ceil(main_batches * spec.sub_batches * spec.room_ratio / 2)) if spec.sub_batches and spec.lab_subjects else 0
+    rooms = (
+        [Room(id=next(next_id), name=f"Room {i + 101}", capacity=THEORY_CAPACITIES[i % 2], is_lab=False) for i in range(theory_rooms)]
+        + [Room(id=next(next_id), name=f"Lab {i + 1}", capacity=LAB_CAPACITY, is_lab=True) for i in range(lab_rooms)]
+    )
+
+    # Lectures per theory subject so a batch group fills `tightness` of its weekly cap, at most one a day
+    lab_lectures = spec.lab_subjects * spec.sub_batches
+    target = spec.tightness * StudentBatch._meta.get_field('max_classes_per_day').default * len(DAYS)
+    theory_lectures = min(len(DAYS), max(1, round((target - lab_lectures) / max(spec.theory_subjects, 1))))
+
+    campus = Campus([], rooms, [], [], [], [], [])
+    for d in range(spec.departments):
+        dept = Department(id=next(next_id), name=f"Synthetic {d + 1}")
+        campus.departments.append(dept)
+        batches = [
+            StudentBatch(id=next(next_id), name=f"D{d + 1} Batch {i + 1}", size=rng.choice(BATCH_SIZES), department=dept)
+            for i in range(spec.batches)
+        ]
+        labs = [
+            StudentBatch(id=next(next_id), name=f"{b.name} - Lab {chr(65 + k)}", size=math.ceil(b.size / spec.sub_batches),
+                         department=dept, parent_batch=b)
+            for b in batches for k in range(spec.sub_batches)
+        ]
+        labs_of = {b.id: [lab for lab in labs if lab.parent_batch_id == b.id] for b in batches}
+        campus.batches.extend(batches + labs)
+
+        # Sub-batches hold their labs at the same time, so each needs its own teacher then. One
+        # teacher per lab subject allows that when there are at least as many lab subjects as
+        # sub-batches; otherwise as many teachers as sub-batches rotate over them.
+        per_teacher = max(spec.subjects_per_teacher, 1)
+        theory_count = math.ceil(spec.batches * spec.theory_subjects / per_teacher)
+        lab_pool = max(spec.lab_subjects, spec.sub_batches) if spec.lab_subjects else 0
+        teachers = [
+            Teacher(id=next(next_id), name=f"D{d + 1} Teacher {i + 1}", department=dept)
+            for i in range(theory_count + spec.batches * lab_pool)
+        ]
+        campus.teachers.extend(teachers)
+        subjects = []
+        for i, b in enumerate(batches):
+            for j in range(spec.theory_subjects):
+                teacher = teachers[(i * spec.theory_subjects + j) // per_teacher]
+                subjects.append(Subject(id=next(next_id), name=f"Subject {j + 1}", weekly_lectures=theory_lectures,
+                                        department=dept, batch=b, teacher=teacher))
+            lab_teachers = teachers[theory_count + i * lab_pool:theory_count + (i + 1) * lab_pool]
+            for j in range(spec.lab_subjects):
+                subjects.extend(
+                    Subject(id=next(next_id), name=f"Subject {j + 1} - Lab", weekly_lectures=1, department=dept, batch=lab,
+                            teacher=lab_teachers[j if spec.lab_subjects >= spec.sub_batches else (j + k) % lab_pool])
+                    for k, lab in enumerate(labs_of[b.id])
+                )
+        campus.subjects.extend(subjects)
+
+        blocked = round(spec.unavailability * len(cells))
+        unavailable = {t.id: set(rng.sample(cells, blocked)) for t in teachers}
+        campus.unavailability.extend(
+            TeacherUnavailability(id=next(next_id), teacher=t, day=day, slot_index=slot)
+            for t in teachers for day, slot in sorted(unavailable[t.id])
+        )
+
+        # Pins on theory subjects, each in a cell its teacher is free in and clear of the other pins
+        taken = set()
+        candidates = [s for s in subjects if s.batch.parent_batch_id is None]
+        rng.shuffle(candidates)
+        for s in candidates[:spec.pins]:
+            free = [
+                (day, slot) for day, slot in cells
+                if (day, slot) not in unavailable[s.teacher_id]
+                and not {('teacher', s.teacher_id, day, slot), ('batch', s.batch_id, day, slot), ('subject', s.id, day)} & taken
+            ]
+            if free:
+                day, slot = rng.choice(free)
+                taken |= {('teacher', s.teacher_id, day, slot), ('batch', s.batch_id, day, slot), ('subject', s.id, day)}
+                campus.pins.append(PinnedSlot(id=next(next_id), subject=s, department=dept, day=day, slot_index=slot))
+    return campus
+
+
+def _save(objs):
+    """Insert `objs` as new rows, pointing their foreign keys at the rows saved before them."""
+    for obj in objs:
+        obj.pk = None
+        for field in obj._meta.concrete_fields:
+            if field.is_relation and field.is_cached(obj) and getattr(obj, field.name) is not None:
+                setattr(obj, field.attname, getattr(obj, field.name).pk)
+    if objs:
+        type(objs[0]).objects.bulk_create(objs)
+
+
+def build_campus(spec, seed=0):
+    """Create the campus of a CampusSpec in the database. Returns (departments, rooms)."""
+    campus = synthetic_campus(spec, seed)
+    for objs in (
+        campus.rooms, campus.departments,
+        [b for b in campus.batches if b.parent_batch is None], [b for b in campus.batches if b.parent_batch is not None],
+        campus.teachers, campus.subjects, campus.unavailability, campus.pins,
+    ):
+        _save(objs)
+    return campus.departments, campus.rooms
+
+
+class PeakMemory:
+    """Context manager recording the process's resident set size: .start and .peak, in bytes.
+
+    A daemon thread reads /proc/self/statm every `interval` seconds. Without /proc, .peak is
+    getrusage()'s high-water mark, which covers the whole life of the process.
+    """
+
+    STATM = '/proc/self/statm'
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _rss(self):
+        if os.path.exists(self.STATM):
+            with open(self.STATM) as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._rss())
+
+    def __enter__(self):
+        self.start = self.peak = self._rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+
+def run_benchmark(spec, seed=0, num_variants=1, solver_mode='single', time_limit=10, campus=False):
+    """Build the campus of `spec`, generate its timetables and delete it again. Returns a JSON-ready dict.
+
+    Departments are generated one after another with generate_timetable(), or together with
+    generate_campus() when `campus` is set. Rooms are shared by every department, so run this
+    in a database holding no other rooms (the benchmark_scheduler command uses a throwaway one).
+    """
+    started = time.perf_counter()
+    with PeakMemory() as memory:
+        departments, rooms = build_campus(spec, seed)
+        setup = time.perf_counter() - started
+        options = {'num_variants': num_variants, 'solver_mode': solver_mode, 'warm_start_from': None, 'time_limit': time_limit}
+        try:
+            if campus:
+                results = generate_campus([d.id for d in departments], **options)['departments']
+            else:
+                results = {d.id: generate_timetable(d.id, **options) for d in departments}
+        finally:
+            wall_time = time.perf_counter() - started - setup
+            Department.objects.filter(id__in=[d.id for d in departments]).delete()
+            Room.objects.filter(id__in=[r.id for r in rooms]).delete()
+
+    per_department, phases = [], {}
+    for dept in departments:
+        result = results[dept.id]
+        solver = result.get('solver') or {}
+        timings = result.get('timings', {})
+        for phase, seconds in timings.items():
+            phases[phase] = round(phases.get(phase, 0) + seconds, 3)
+        per_department.append({
+            'name': dept.name,
+            'status': result['status'],
+            'variables': solver.get('variables'),
+            'constraints': solver.get('constraints'),
+            'variant_statuses': [v['status'] for v in solver.get('variants', [])],
+            'timings': timings,
+        })
+    statuses = {d['status'] for d in per_department}
+    return {
+        'spec': spec._asdict(),
+        'seed': seed,
+        'solver_mode': solver_mode,
+        'num_variants': num_variants,
+        'time_limit': time_limit,
+        'campus': campus,
+        'status': statuses.pop() if len(statuses) == 1 else 'partial',
+        'setup_seconds': round(setup, 3),
+        'wall_seconds': round(wall_time, 3),
+        'phases': phases,
+        'variables': sum(d['variables'] or 0 for d in per_department),
+        'constraints': sum(d['constraints'] or 0 for d in per_department),
+        'peak_rss_mb': round(memory.peak / 2 ** 20, 1),
+        'rss_growth_mb': round((memory.peak - memory.start) / 2 ** 20, 1),
+        'departments': per_department,
+    }
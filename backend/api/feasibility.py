@@ -0,0 +1,271 @@
+"""Vectorised pre-solve feasibility checks.
+
+Availability is held as NumPy boolean matrices over (entity, day, slot): teachers, batches and
+subjects, plus room capacity per room class and cell. Every check below is a necessary
+condition of the CP-SAT model in scheduler._build_model, so a failed check proves the model
+infeasible and the solver can be skipped. Passing all checks proves nothing.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+from .availability import WEEK_CELLS, Availability, room_masks
+from .scheduler import DAYS, SLOTS_PER_DAY, _room_classes
+
+
+HALL_MAX_TEACHERS = 10  # beyond this many teachers per batch, only singletons and the full set are checked
+
+
+def _unpack(masks):
+    """Boolean (len(masks), day, slot) array of 40-bit weekly masks."""
+    masks = np.array(masks, dtype=np.uint64)
+    bits = (masks[:, None] >> np.arange(WEEK_CELLS, dtype=np.uint64)) & np.uint64(1)
+    return bits.astype(bool).reshape(len(masks), len(DAYS), SLOTS_PER_DAY)
+
+
+class AvailabilityMatrices:
+    """Boolean (n, day, slot) availability for teachers, subjects and batches; room counts per class and cell."""
+
+    def __init__(self, batches, subjects, teachers, rooms, unavailability_set, availability=None, reserved=None):
+        # Teachers: the rows unpack the weekly masks of availability.Availability (preferred window
+        # minus unavailability blocks, subjects' teachers from other departments included)
+        availability = availability or Availability(teachers, subjects, unavailability_set)
+        teacher_objs = {t.id: t for t in teachers}
+        for s in subjects:
+            if s.teacher and s.teacher_id not in teacher_objs:
+                teacher_objs[s.teacher_id] = s.teacher
+        self.teachers = list(teacher_objs.values())
+        self.teacher_row = {t.id: i for i, t in enumerate(self.teachers)}
+        self.teacher = _unpack([availability.mask('teacher', t.id) for t in self.teachers])
+
+        # Room classes: rooms available per cell, less those `reserved` holds for other departments
+        self.room_classes = _room_classes(rooms)
+        free = room_masks(rooms, reserved or {})
+        self.room_class = np.array(
+            [_unpack([free[r.id] for r in rc]).sum(axis=0) for rc in self.room_classes], dtype=int
+        ).reshape(len(self.room_classes), len(DAYS), SLOTS_PER_DAY)
+
+        # Subjects the model creates variables for: batch, teacher, a room that fits, some free cell
+        self.subjects = []
+        rows = []
+        for s in subjects:
+            if not s.batch or not s.teacher:
+                continue
+            is_lab = s.batch.parent_batch_id is not None
+            if not any(rc[0].is_lab == is_lab and rc[0].capacity >= s.batch.size for rc in self.room_classes):
+                continue
+            row = self.teacher[self.teacher_row[s.teacher_id]]
+            if row.any():
+                self.subjects.append(s)
+                rows.append(row)
+        self.subject = np.array(rows, dtype=bool).reshape(len(rows), len(DAYS), SLOTS_PER_DAY)
+        self.subject_row = {s.id: i for i, s in enumerate(self.subjects)}
+
+        # Batches: a cell is usable if any of the batch's schedulable subjects can go there
+        known = {b.id for b in batches}
+        self.batches = list(batches) + list({s.batch_id: s.batch for s in self.subjects if s.batch_id not in known}.values())
+        self.batch_row = {b.id: i for i, b in enumerate(self.batches)}
+        self.batch = np.zeros((len(self.batches), len(DAYS), SLOTS_PER_DAY), dtype=bool)
+        for i, s in enumerate(self.subjects):
+            if s.batch_id in self.batch_row:
+                self.batch[self.batch_row[s.batch_id]] |= self.subject[i]
+
+    def rooms_at_least(self, is_lab, capacity):
+        """(day, slot) count of rooms of this kind with at least `capacity` seats."""
+        idx = [i for i, rc in enumerate(self.room_classes) if rc[0].is_lab == is_lab and rc[0].capacity >= capacity]
+        return self.room_class[idx].sum(axis=0)
+
+
+def _day_bound(avail, day_caps, cap=None):
+    """Max lectures that fit: per day the smaller of free cells, summed subject day caps and `cap`."""
+    per_day = np.minimum(avail.sum(axis=-1), day_caps)
+    if cap is not None:
+        per_day = np.minimum(per_day, cap)
+    return int(per_day.sum(axis=-1)) if per_day.ndim == 1 else per_day.sum(axis=-1)
+
+
+def check_feasibility(batches, subjects, teachers, rooms, pinned_slots, unavailability_set, availability=None, reserved=None):
+    """Run the necessary-condition checks. Returns (errors, warnings) as message lists.
+
+    Any error means the CP-SAT model is infeasible as built; warnings flag data the model
+    silently ignores (subjects it can't place at all, pins on unavailable cells). `reserved`
+    maps (day, 'HH:MM') to room ids held elsewhere, as for scheduler._build_model.
+    """
+    m = AvailabilityMatrices(batches, subjects, teachers, rooms, unavailability_set, availability, reserved)
+    errors, warnings = [], []
+    day_index = {d: i for i, d in enumerate(DAYS)}
+    batch_by_id = {b.id: b for b in batches}
+
+    placed = {s.id for s in m.subjects}
+    for s in subjects:
+        if s.batch and s.teacher and s.id not in placed:
+            warnings.append(f"⚠️ Subject '{s.name}' ({s.batch.name}) can't be scheduled: no room fits the batch or its teacher is never available. It will be left out.")
+    if not m.subjects:
+        return errors, warnings
+
+    weekly = np.array([s.weekly_lectures for s in m.subjects], dtype=int)
+
+    # C5 per-day cap per subject: 1, or the number of pins that day
+    all_pins = np.zeros((len(m.subjects), len(DAYS)), dtype=int)
+    pin_cells = np.zeros((len(m.subjects), len(DAYS), SLOTS_PER_DAY), dtype=bool)
+    for p in pinned_slots:
+        i = m.subject_row.get(p.subject_id)
+        if i is None or p.day not in day_index:
+            continue
+        d = day_index[p.day]
+        all_pins[i, d] += 1
+        if 0 <= p.slot_index < SLOTS_PER_DAY and m.subject[i, d, p.slot_index]:
+            pin_cells[i, d, p.slot_index] = True
+        else:
+            warnings.append(f"⚠️ Pin for '{m.subjects[i].name}' on {p.day} slot {p.slot_index} falls outside its teacher's availability and is ignored.")
+    day_caps = np.maximum(all_pins, 1)
+
+    # 1. Subjects: weekly lectures against per-day caps, and pins against weekly lectures
+    subject_bound = np.minimum(m.subject.sum(axis=2), day_caps).sum(axis=1)
+    reported = set()  # teachers already named in an error; later checks would only repeat it
+    for i in np.flatnonzero(weekly > subject_bound):
+        s = m.subjects[i]
+        reported.add(s.teacher_id)
+        errors.append(f"❌ '{s.name}' ({s.batch.name}) needs {weekly[i]} lectures/week but at most {subject_bound[i]} fit: one per day, within {s.teacher.name}'s available slots.")
+    pins_per_subject = pin_cells.sum(axis=(1, 2))
+    for i in np.flatnonzero(pins_per_subject > weekly):
+        s = m.subjects[i]
+        errors.append(f"❌ '{s.name}' ({s.batch.name}) has {pins_per_subject[i]} pinned slots but only {weekly[i]} lectures/week.")
+
+    subjects_of_teacher = defaultdict(list)
+    subjects_of_batch = defaultdict(list)
+    subjects_of_group = defaultdict(list)
+    for i, s in enumerate(m.subjects):
+        subjects_of_teacher[s.teacher_id].append(i)
+        subjects_of_batch[s.batch_id].append(i)
+        subjects_of_group[s.batch.parent_batch_id or s.batch_id].append(i)
+
+    # 2. Teachers (C2 one class per cell, C7 daily cap)
+    for t in teachers:
+        idx = subjects_of_teacher.get(t.id)
+        if not idx:
+            continue
+        avail = m.teacher[m.teacher_row[t.id]]
+        bound = _day_bound(avail, day_caps[idx].sum(axis=0), t.max_classes_per_day)
+        demand = int(weekly[idx].sum())
+        if demand > bound and t.id not in reported:
+            reported.add(t.id)
+            errors.append(f"❌ Teacher '{t.name}' has {demand} lectures/week but at most {bound} fit their available slots and {t.max_classes_per_day}/day cap.")
+        pins = pin_cells[idx].sum(axis=0)
+        if (pins > 1).any():
+            d, slot = np.argwhere(pins > 1)[0]
+            errors.append(f"❌ Teacher '{t.name}' has {pins[d, slot]} pinned classes on {DAYS[d]} slot {slot}.")
+        if (pins.sum(axis=1) > t.max_classes_per_day).any():
+            d = int(np.argmax(pins.sum(axis=1)))
+            errors.append(f"❌ Teacher '{t.name}' has {pins[d].sum()} pinned classes on {DAYS[d]}, above their {t.max_classes_per_day}/day cap.")
+
+    # 3. Batches: C4 one class per cell, C8 group daily cap, theory/lab exclusion
+    for b in batches:
+        if b.parent_batch_id is not None:
+            continue
+        group = subjects_of_group.get(b.id, [])
+        if not group:
+            continue
+        per_subject_day = np.minimum(m.subject[group].sum(axis=2), day_caps[group]).sum(axis=0)
+        bound = int(np.minimum(per_subject_day, b.max_classes_per_day).sum())
+        demand = int(weekly[group].sum())
+        if demand > bound:
+            errors.append(f"❌ Batch '{b.name}' (with its lab sub-batches) has {demand} lectures/week but at most {bound} fit its {b.max_classes_per_day}/day cap.")
+
+        # Theory cells and one sub-batch's lab cells are disjoint and each holds one lecture
+        theory = subjects_of_batch.get(b.id, [])
+        theory_demand = int(weekly[theory].sum()) if theory else 0
+        labs_by_sub = defaultdict(list)
+        for i in group:
+            if m.subjects[i].batch_id != b.id:
+                labs_by_sub[m.subjects[i].batch_id].append(i)
+        for sb_id, labs in labs_by_sub.items():
+            if sb_id not in batch_by_id:
+                continue
+            cells = m.batch[m.batch_row[sb_id]] | (m.batch[m.batch_row[b.id]] if theory else False)
+            need = theory_demand + int(weekly[labs].sum())
+            if need > cells.sum():
+                errors.append(f"❌ Batch '{b.name}' needs {need} separate slots for theory plus '{batch_by_id[sb_id].name}' labs but its teachers are free in only {int(cells.sum())}.")
+
+        # C6 lab synchronisation: sub-batches whose lab cells coincide run labs together,
+        # so they need the same number of lab sessions
+        if len(labs_by_sub) >= 2:
+            rows = m.batch[[m.batch_row[sb] for sb in labs_by_sub]]
+            totals = {sb: int(weekly[labs].sum()) for sb, labs in labs_by_sub.items()}
+            if (rows == rows[0]).all() and len(set(totals.values())) > 1:
+                detail = ", ".join(f"'{m.batches[m.batch_row[sb]].name}' {n}" for sb, n in totals.items())
+                errors.append(f"❌ Lab sub-batches of '{b.name}' must hold labs at the same time but need different numbers of sessions ({detail}).")
+
+        # Pins: a group can't exceed its daily cap; theory and lab pins can't share a cell
+        group_pins = pin_cells[group].sum(axis=0)
+        if (group_pins.sum(axis=1) > b.max_classes_per_day).any():
+            d = int(np.argmax(group_pins.sum(axis=1)))
+            errors.append(f"❌ Batch '{b.name}' has {group_pins[d].sum()} pinned classes on {DAYS[d]}, above its {b.max_classes_per_day}/day cap.")
+        if theory and labs_by_sub:
+            lab_idx = [i for labs in labs_by_sub.values() for i in labs]
+            clash = pin_cells[theory].any(axis=0) & pin_cells[lab_idx].any(axis=0)
+            if clash.any():
+                d, slot = np.argwhere(clash)[0]
+                errors.append(f"❌ Batch '{b.name}' has a theory and a lab class pinned on {DAYS[d]} slot {slot}.")
+
+    # 4. Hall bounds per batch: lectures taught by any subset of its teachers fit only in the
+    #    cells where one of those teachers is free, one per cell, within the daily caps
+    for b_id, idx in subjects_of_batch.items():
+        b = m.subjects[idx[0]].batch
+        if b_id not in batch_by_id:
+            continue  # C4 only covers the department's own batches
+        main = batch_by_id.get(b.parent_batch_id or b.id)
+        group_cap = main.max_classes_per_day if main else None
+        pins = pin_cells[idx].sum(axis=0)
+        if (pins > 1).any():
+            d, slot = np.argwhere(pins > 1)[0]
+            errors.append(f"❌ Batch '{b.name}' has {pins[d, slot]} classes pinned on {DAYS[d]} slot {slot}.")
+        by_teacher = defaultdict(list)
+        for i in idx:
+            by_teacher[m.subjects[i].teacher_id].append(i)
+        t_ids = list(by_teacher)
+        k = len(t_ids)
+        if not k:
+            continue
+        avail = np.array([m.teacher[m.teacher_row[t]] for t in t_ids]).reshape(k, -1)
+        demand = np.array([weekly[by_teacher[t]].sum() for t in t_ids])
+        caps = np.array([day_caps[by_teacher[t]].sum(axis=0) for t in t_ids])
+        if k <= HALL_MAX_TEACHERS:
+            masks = ((np.arange(1, 2 ** k)[:, None] >> np.arange(k)) & 1).astype(int)
+        else:
+            masks = np.vstack([np.eye(k, dtype=int), np.ones((1, k), dtype=int)])
+        union = (masks @ avail.astype(int) > 0).reshape(len(masks), len(DAYS), SLOTS_PER_DAY)
+        bounds = _day_bound(union, masks @ caps, group_cap)
+        fresh = masks @ np.array([t in reported for t in t_ids], dtype=int) == 0
+        violated = np.flatnonzero((masks @ demand > bounds) & fresh)
+        if violated.size:
+            worst = violated[np.argmin(masks[violated].sum(axis=1))]
+            names = ", ".join(m.teachers[m.teacher_row[t_ids[j]]].name for j in np.flatnonzero(masks[worst]))
+            errors.append(f"❌ Batch '{b.name}': subjects taught by {names} need {int(masks[worst] @ demand)} lectures/week but those teachers are free for at most {int(bounds[worst])} of its slots.")
+
+    # 5. Rooms: room sets are nested by capacity, so lectures needing at least tier k seats
+    #    can only use rooms of that size, in cells where their teachers are free
+    for is_lab in (False, True):
+        caps = sorted({rc[0].capacity for rc in m.room_classes if rc[0].is_lab == is_lab})
+        kind = [i for i, s in enumerate(m.subjects) if (s.batch.parent_batch_id is not None) == is_lab]
+        if not caps or not kind:
+            continue
+        tier_of = np.array([bisect_left(caps, m.subjects[i].batch.size) for i in kind])
+        label = "lab" if is_lab else "theory"
+        for tier, cap in enumerate(caps):
+            needing = [kind[j] for j in np.flatnonzero(tier_of >= tier)]
+            if not needing:
+                continue
+            rooms_here = m.rooms_at_least(is_lab, cap)
+            cells = m.subject[needing].any(axis=0)
+            supply = int((rooms_here * cells).sum())
+            demand = int(weekly[needing].sum())
+            if demand > supply:
+                errors.append(f"❌ {demand} {label} lectures/week need a room with at least {cap} seats but only {supply} such room-slots exist while their teachers are free.")
+            pinned = pin_cells[needing].sum(axis=0)
+            if (pinned > rooms_here).any():
+                d, slot = np.argwhere(pinned > rooms_here)[0]
+                errors.append(f"❌ {pinned[d, slot]} {label} classes are pinned on {DAYS[d]} slot {slot} but only {rooms_here[d, slot]} rooms with at least {cap} seats exist.")
+
+    return errors, warnings
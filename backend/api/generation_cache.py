@@ -0,0 +1,51 @@
+"""Per-process LRU cache of generate_timetable() results, keyed by an input fingerprint.
+
+The fingerprint is computed from freshly loaded inputs, so a hit is only as fresh as the
+fingerprint is complete: an input it leaves out can hand back stale drafts. As a second
+line, the model signals in signals.py drop the entries of every department a changed row
+feeds into (for a teacher, every department whose subjects they teach), which also keeps
+memory from being held by inputs that are gone.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class GenerationCache:
+    def __init__(self):
+        self._entries = OrderedDict()  # (department_id, fingerprint) -> entry
+        self._lock = threading.Lock()
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'GENERATION_CACHE_SIZE', 32)
+
+    def get(self, department_id, fingerprint):
+        with self._lock:
+            entry = self._entries.get((department_id, fingerprint))
+            if entry is not None:
+                self._entries.move_to_end((department_id, fingerprint))
+            return entry
+
+    def put(self, department_id, fingerprint, entry):
+        with self._lock:
+            self._entries[(department_id, fingerprint)] = entry
+            self._entries.move_to_end((department_id, fingerprint))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, department_id=None):
+        """Drop one department's entries, or every entry when department_id is None."""
+        with self._lock:
+            if department_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == department_id]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+generation_cache = GenerationCache()
@@ -0,0 +1,162 @@
+"""Compact in-memory view of a timetable, shared by conflict detection, PDF export and slot editing.
+
+A timetable's slots are read with one values_list query into SlotRecords (ids only, with
+__slots__) and NumPy columns. Day × slot × resource occupancy counts are built from those
+columns on first use. Names are looked up afterwards, only for the ids a caller shows.
+Slots whose start time is not one of TIME_SLOTS (slot_index None) stay off the grid; their
+start times are kept so clashes() still compares them with each other.
+"""
+from collections import defaultdict
+from datetime import time
+
+import numpy as np
+
+from .models import TimetableSlot
+from .scheduler import DAYS, TIME_SLOTS, TIME_SLOT_ENDS, TIME_SLOT_INDEX, SLOTS_PER_DAY
+
+DAY_INDEX = {day: i for i, day in enumerate(DAYS)}
+_SLOT_OF_TIME = {time.fromisoformat(start): i for i, start in enumerate(TIME_SLOTS)}
+RESOURCES = ('teacher', 'room', 'batch')
+# Also counted: 'subject', 'parent_batch' (labs, by their parent; -1 for theory) and 'group'
+# (a main batch together with its sub-batches), for move validation and daily caps
+COLUMNS = RESOURCES + ('subject', 'parent_batch', 'group')
+
+_FIELDS = ('id', 'day', 'slot_index', 'teacher_id', 'room_id', 'batch_id', 'subject_id', 'batch__parent_batch_id', 'start_time')
+
+
+def slot_index(start_time):
+    """Index into TIME_SLOTS of a start time (datetime.time or 'HH:MM'), or -1 if it isn't one."""
+    if isinstance(start_time, str):
+        return TIME_SLOT_INDEX.get(start_time, -1)
+    return _SLOT_OF_TIME.get(start_time, -1)
+
+
+def slot_times(index):
+    """(start, end) datetime.time of a slot index."""
+    return time.fromisoformat(TIME_SLOTS[index]), time.fromisoformat(TIME_SLOT_ENDS[index])
+
+
+def names(model, ids):
+    """{id: name} for the given ids of a model with a name field (one query)."""
+    return dict(model.objects.filter(id__in=ids).values_list('id', 'name'))
+
+
+class SlotRecord:
+    """One timetable slot: ids plus day and slot indexes (-1 when off the DAYS × TIME_SLOTS grid)."""
+
+    __slots__ = ('id', 'day', 'slot', 'teacher_id', 'room_id', 'batch_id', 'subject_id', 'parent_batch_id')
+
+    def __init__(self, id, day, slot, teacher_id, room_id, batch_id, subject_id, parent_batch_id):
+        self.id = id
+        self.day = day
+        self.slot = slot
+        self.teacher_id = teacher_id
+        self.room_id = room_id
+        self.batch_id = batch_id
+        self.subject_id = subject_id
+        self.parent_batch_id = parent_batch_id
+
+
+class TimetableGrid:
+    """SlotRecords plus NumPy columns of their day, slot and resource ids, indexed by record position."""
+
+    def __init__(self, records):
+        self.records = records
+        n = len(records)
+        self.day = np.fromiter((r.day for r in records), np.int8, n)
+        self.slot = np.fromiter((r.slot for r in records), np.int8, n)
+        self.columns = {
+            kind: np.fromiter((getattr(r, f'{kind}_id') for r in records), np.int64, n) for kind in RESOURCES + ('subject',)
+        }
+        parents = np.fromiter((-1 if r.parent_batch_id is None else r.parent_batch_id for r in records), np.int64, n)
+        self.columns['parent_batch'] = parents
+        self.columns['group'] = np.where(parents >= 0, parents, self.columns['batch'])
+        self._occupancy = {}
+        self._day_totals = {}
+        self._dense = {}  # kind -> per record, index into occupancy ids (-1 off-grid)
+        self.off_grid_starts = {}  # record position -> start time, for slots off TIME_SLOTS
+
+    @classmethod
+    def load(cls, slots):
+        """Build a grid from a TimetableSlot queryset (already filtered as needed)."""
+        day_index = DAY_INDEX.get
+        records, off_grid_starts = [], {}
+        for pk, day, slot, teacher_id, room_id, batch_id, subject_id, parent_id, start in slots.values_list(*_FIELDS):
+            if slot is None:
+                off_grid_starts[len(records)] = start
+            records.append(SlotRecord(pk, day_index(day, -1), -1 if slot is None else slot, teacher_id, room_id, batch_id, subject_id, parent_id))
+        grid = cls(records)
+        grid.off_grid_starts = off_grid_starts
+        return grid
+
+    @classmethod
+    def for_timetable(cls, timetable_id):
+        return cls.load(TimetableSlot.objects.filter(timetable_id=timetable_id))
+
+    def occupancy(self, kind):
+        """Return (ids, counts) for one of COLUMNS.
+
+        ids are the sorted resource ids in this timetable; counts[day, slot, i] is how many
+        slots ids[i] has in that cell. Off-grid slots are not counted.
+        """
+        if kind not in self._occupancy:
+            on_grid = (self.day >= 0) & (self.slot >= 0)
+            ids, dense = np.unique(self.columns[kind][on_grid], return_inverse=True)
+            counts = np.zeros((len(DAYS), SLOTS_PER_DAY, len(ids)), np.uint16)
+            np.add.at(counts, (self.day[on_grid], self.slot[on_grid], dense), 1)
+            self._occupancy[kind] = ids, counts
+            self._dense[kind] = np.full(len(self.records), -1, np.int64)
+            self._dense[kind][on_grid] = dense
+        return self._occupancy[kind]
+
+    def count(self, kind, resource_id, day, slot):
+        """How many slots the resource has at (day index, slot index)."""
+        ids, counts = self.occupancy(kind)
+        i = np.searchsorted(ids, resource_id)
+        return int(counts[day, slot, i]) if i < len(ids) and ids[i] == resource_id else 0
+
+    def day_count(self, kind, resource_id, day):
+        """How many slots the resource has on a day index."""
+        ids, counts = self.occupancy(kind)
+        if kind not in self._day_totals:
+            self._day_totals[kind] = counts.sum(axis=1, dtype=np.int64)
+        i = np.searchsorted(ids, resource_id)
+        return int(self._day_totals[kind][day, i]) if i < len(ids) and ids[i] == resource_id else 0
+
+    def clashes(self, kind):
+        """Every cell where one resource has more than one slot. Returns [(day, slot, resource_id, [SlotRecord])].
+
+        Off-grid slots (see load) clash when they share a day and start time; their slot is -1.
+        """
+        ids, counts = self.occupancy(kind)
+        dense = self._dense[kind]
+        rows = np.flatnonzero(dense >= 0)
+        rows = rows[counts[self.day[rows], self.slot[rows], dense[rows]] > 1]
+        found = defaultdict(list)
+        for j in rows.tolist():
+            found[(int(self.day[j]), int(self.slot[j]), int(ids[dense[j]]))].append(self.records[j])
+        clashes = [(day, slot, resource_id, records) for (day, slot, resource_id), records in sorted(found.items())]
+
+        off_grid = defaultdict(list)
+        for j, start in self.off_grid_starts.items():
+            if self.day[j] >= 0:
+                off_grid[(int(self.day[j]), start, int(self.columns[kind][j]))].append(self.records[j])
+        clashes.extend(
+            (day, -1, resource_id, records) for (day, _, resource_id), records in sorted(off_grid.items()) if len(records) > 1
+        )
+        return clashes
+
+    def cells(self):
+        """Records laid out as SLOTS_PER_DAY rows of len(DAYS) lists, in load order; off-grid slots are left out."""
+        rows = [[[] for _ in DAYS] for _ in range(SLOTS_PER_DAY)]
+        for r in self.records:
+            if r.day >= 0 and r.slot >= 0:
+                rows[r.slot][r.day].append(r)
+        return rows
+
+    def ids(self, field):
+        """Distinct values of a record attribute, e.g. 'teacher_id'."""
+        return {getattr(r, field) for r in self.records}
+
+    def __len__(self):
+        return len(self.records)
@@ -0,0 +1,159 @@
+"""Background generation jobs.
+
+POST /api/generate/ only records a GenerationJob row and hands its id to a small
+thread pool inside the web process; the CP-SAT pipeline then runs outside the
+request. Job state lives in the database, so a restarted process picks up
+whatever was left queued (or was running in a process that has since died).
+
+A running job's worker stamps heartbeat_at every lease / 4 seconds. A RUNNING job
+whose heartbeat is older than GENERATION_JOB_LEASE seconds, on any host, or whose
+process on this host is gone, is orphaned: every submit and status poll requeues
+such jobs, so a dead worker never blocks its department for long.
+"""
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import GenerationJob
+from .scheduler import generate_timetable, generate_campus
+
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _lease_seconds():
+    return getattr(settings, 'GENERATION_JOB_LEASE', 60)
+
+
+def _get_executor():
+    """Return this process's job pool, creating it (and submitting everything queued) on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = getattr(settings, 'GENERATION_JOB_WORKERS', 1)
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='generation-job')
+            _requeue_orphaned_jobs()
+            for job_id in GenerationJob.objects.filter(status='QUEUED').values_list('id', flat=True):
+                _executor.submit(_run_job, job_id)
+    return _executor
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _requeue_orphaned_jobs():
+    """Put RUNNING jobs whose worker is gone back in the queue. Returns their ids.
+
+    A missed lease covers workers on other hosts and PIDs that have since been reused;
+    a dead process on this host is caught straight away.
+    """
+    host = socket.gethostname()
+    stale_before = timezone.now() - timedelta(seconds=_lease_seconds())
+    requeued = []
+    for job in GenerationJob.objects.filter(status='RUNNING').only('worker', 'started_at', 'heartbeat_at'):
+        beat = job.heartbeat_at or job.started_at
+        worker_host, _, pid = job.worker.rpartition(':')
+        gone = beat is None or beat < stale_before or (worker_host == host and pid.isdigit() and not _pid_alive(int(pid)))
+        if gone and GenerationJob.objects.filter(id=job.id, status='RUNNING', worker=job.worker).update(
+            status='QUEUED', worker='', started_at=None, heartbeat_at=None
+        ):
+            requeued.append(job.id)
+    return requeued
+
+
+def recover_orphaned_jobs():
+    """Requeue the jobs of dead workers and run them in this process's pool (starting it if needed)."""
+    executor = _get_executor()
+    for job_id in _requeue_orphaned_jobs():
+        executor.submit(_run_job, job_id)
+
+
+def submit_generation_job(department_id, options=None):
+    """Queue a generation job for the department. Returns the new job, or the one already in flight.
+
+    options are keyword arguments for generate_timetable() and are stored on the job. The
+    one_active_generation_job constraint makes this safe against concurrent requests: the
+    loser of a race gets an IntegrityError and returns the winner's job.
+    """
+    recover_orphaned_jobs()
+    active = GenerationJob.objects.filter(department_id=department_id, status__in=['QUEUED', 'RUNNING'])
+    existing = active.first()
+    if existing:
+        return existing
+
+    try:
+        with transaction.atomic():
+            job = GenerationJob.objects.create(department_id=department_id, options=options or {})
+    except IntegrityError:
+        return active.first()
+    executor = _get_executor()
+    transaction.on_commit(lambda: executor.submit(_run_job, job.id))
+    return job
+
+
+def submit_campus_job(options=None):
+    """Queue a campus-wide generation job (no department). Returns the new job, or the one already in flight.
+
+    options are keyword arguments for generate_campus(), including department_ids.
+    """
+    return submit_generation_job(None, options)
+
+
+def _heartbeat(job_id, stop):
+    """Stamp the job's heartbeat_at until `stop` is set, on this thread's own connection."""
+    try:
+        while not stop.wait(_lease_seconds() / 4):
+            GenerationJob.objects.filter(id=job_id, worker=WORKER_ID).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def _run_job(job_id):
+    close_old_connections()
+    try:
+        # Claim the job atomically so two processes recovering the same queue never both run it
+        now = timezone.now()
+        claimed = GenerationJob.objects.filter(id=job_id, status='QUEUED').update(
+            status='RUNNING', worker=WORKER_ID, started_at=now, heartbeat_at=now
+        )
+        if not claimed:
+            return
+
+        stop = threading.Event()
+        threading.Thread(target=_heartbeat, args=(job_id, stop), daemon=True, name=f'generation-job-{job_id}-heartbeat').start()
+        job = GenerationJob.objects.get(id=job_id)
+        try:
+            if job.department_id is None:
+                result = generate_campus(**job.options)
+            else:
+                result = generate_timetable(job.department_id, **job.options)
+        except Exception as e:
+            outcome = {'status': 'FAILED', 'error': f"Scheduler error: {str(e)}"}
+        else:
+            outcome = {'result': result, 'status': 'FAILED' if result['status'] == 'error' else 'DONE'}
+            if result['status'] == 'error':
+                outcome['error'] = result['messages'][0]
+        finally:
+            stop.set()
+        # Only while still ours: a job requeued after a missed lease belongs to its new worker
+        GenerationJob.objects.filter(id=job_id, status='RUNNING', worker=WORKER_ID).update(
+            finished_at=timezone.now(), **outcome
+        )
+    finally:
+        connection.close()
@@ -0,0 +1,67 @@
+"""Opt-in ways for list endpoints to hand out large results.
+
+Plain GETs keep returning one JSON array, which is what the frontend reads. A client can
+instead ask for cursor pages with ?page_size=N (following the 'next' links), or for the
+array streamed with ?stream=1: rows are read with queryset.iterator() and encoded a chunk
+at a time, so memory stays flat however many rows match.
+"""
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+STREAM_CHUNK_ROWS = 500
+
+
+def wants_stream(request):
+    return request.query_params.get('stream') in ('1', 'true') and not wants_pages(request)
+
+
+def wants_pages(request):
+    return OptInCursorPagination.page_size_query_param in request.query_params
+
+
+class OptInCursorPagination(CursorPagination):
+    """Cursor pages ordered by id, only when the request has ?page_size=N."""
+
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not wants_pages(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+def stream_json(serializer, queryset):
+    """Stream queryset as a JSON array, each row rendered by serializer (a single-object instance)."""
+    encoder = encoders.JSONEncoder(
+        ensure_ascii=not api_settings.UNICODE_JSON,
+        allow_nan=not api_settings.STRICT_JSON,
+        separators=(',', ':') if api_settings.COMPACT_JSON else None,
+    )
+
+    def chunks():
+        yield '['
+        separator, rows = '', []
+        for obj in queryset.iterator(chunk_size=STREAM_CHUNK_ROWS):
+            rows.append(encoder.encode(serializer.to_representation(obj)))
+            if len(rows) == STREAM_CHUNK_ROWS:
+                yield separator + ','.join(rows)
+                separator, rows = ',', []
+        if rows:
+            yield separator + ','.join(rows)
+        yield ']'
+
+    return StreamingHttpResponse(chunks(), content_type='application/json')
+
+
+class ListingMixin:
+    """ViewSet list() that streams on ?stream=1; paging is left to OptInCursorPagination."""
+
+    def list(self, request, *args, **kwargs):
+        if wants_stream(request):
+            return stream_json(self.get_serializer(), self.filter_queryset(self.get_queryset()))
+        return super().list(request, *args, **kwargs)
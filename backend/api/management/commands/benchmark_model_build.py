@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import CampusSpec, synthetic_campus
+from api.scheduler import _build_model
+
+
+class Command(BaseCommand):
+    help = 'Benchmark CP-SAT model build time against synthetic departments of increasing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batches', type=int, nargs='+', default=[2, 4, 8, 16, 30],
+                            help='Main batch counts to benchmark (each gets 2 lab sub-batches)')
+        parser.add_argument('--two-phase', action='store_true',
+                            help='Build the time-only model used by solver_mode=two_phase')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'batches':>8} {'variables':>10} {'constraints':>12} {'build (s)':>10} {'µs/var':>8}")
+        rows = []
+        for num_batches in options['batches']:
+            campus = synthetic_campus(CampusSpec(batches=num_batches))
+            started = time.perf_counter()
+            built = _build_model(campus.batches, campus.subjects, campus.teachers, campus.rooms, [], set(),
+                                 two_phase=options['two_phase'])
+            elapsed = time.perf_counter() - started
+            per_var = elapsed / len(built.shifts) * 1e6
+            num_constraints = len(built.model.Proto().constraints)
+            rows.append((len(built.shifts), per_var))
+            self.stdout.write(f"{num_batches:>8} {len(built.shifts):>10} {num_constraints:>12} {elapsed:>10.3f} {per_var:>8.2f}")
+
+        if len(rows) >= 2:
+            (small_vars, small_cost), (large_vars, large_cost) = rows[0], rows[-1]
+            self.stdout.write(
+                f"\n{large_vars / small_vars:.1f}× more variables → {large_cost / small_cost:.2f}× cost per variable "
+                f"(≈1.0 means build time scales linearly)"
+            )
@@ -0,0 +1,149 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+import numpy
+import ortools
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.benchmarks import PRESETS, CampusSpec, run_benchmark
+from api.scheduler import SOLVER_MODES
+
+PHASES = ('load', 'diagnostics', 'build', 'solve', 'persist')
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def _parse_overrides(pairs):
+    """{field: value} from 'field=value' strings, each value cast to the type of the field's default."""
+    overrides = {}
+    for pair in pairs:
+        field, _, value = pair.partition('=')
+        if field not in CampusSpec._fields:
+            raise CommandError(f"Unknown campus setting '{field}'. Known: {', '.join(CampusSpec._fields)}")
+        try:
+            overrides[field] = type(CampusSpec._field_defaults[field])(value)
+        except ValueError:
+            raise CommandError(f"Bad value for {field}: '{value}'")
+    return overrides
+
+
+class Command(BaseCommand):
+    help = ('Benchmark generate_timetable() on synthetic campuses in a throwaway database and save the '
+            'phase timings, model sizes and peak memory as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', nargs='+', default=['small', 'medium'], choices=sorted(PRESETS),
+                            help='Campus presets to run')
+        parser.add_argument('--set', nargs='+', default=[], metavar='FIELD=VALUE',
+                            help=f"Override campus settings of every preset ({', '.join(CampusSpec._fields)})")
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data')
+        parser.add_argument('--repeat', type=int, default=1, help='Runs per preset')
+        parser.add_argument('--variants', type=int, default=1, help='Variants generated per department')
+        parser.add_argument('--solver-mode', default='single', choices=SOLVER_MODES)
+        parser.add_argument('--time-limit', type=float, default=10, help='Solver seconds per variant')
+        parser.add_argument('--campus', action='store_true',
+                            help='Generate all departments together with generate_campus() instead of one by one')
+        parser.add_argument('--output', help='JSON file to write (default: benchmarks/scheduler-<commit>-<time>.json)')
+        parser.add_argument('--compare', help='Earlier JSON output to compare against, matched by run name')
+
+    def handle(self, *args, **options):
+        overrides = _parse_overrides(options['set'])
+        suffix = ','.join(options['set'])
+        runs = [(f"{name}[{suffix}]" if suffix else name, PRESETS[name]._replace(**overrides)) for name in options['preset']]
+        baseline, baseline_commit = {}, None
+        if options['compare']:
+            with open(options['compare']) as f:
+                earlier = json.load(f)
+            baseline = {run['name']: run for run in earlier['runs']}
+            baseline_commit = earlier.get('commit') or options['compare']
+
+        commit = _git('rev-parse', '--short', 'HEAD')
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': commit,
+            'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'ortools': ortools.__version__,
+                'numpy': numpy.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'database': connection.vendor,
+            },
+            'runs': [],
+        }
+
+        with self._throwaway_database():
+            self.stdout.write(
+                f"{'run':<28} {'#':>2} {'depts':>5} {'variables':>10} {'constraints':>11} "
+                + ' '.join(f'{phase:>11}' for phase in PHASES) + f" {'wall (s)':>9} {'peak MB':>8}  status"
+            )
+            for name, spec in runs:
+                for repeat in range(options['repeat']):
+                    result = run_benchmark(
+                        spec, seed=options['seed'], num_variants=options['variants'], solver_mode=options['solver_mode'],
+                        time_limit=options['time_limit'], campus=options['campus'],
+                    )
+                    result = {'name': name, 'repeat': repeat, **result}
+                    report['runs'].append(result)
+                    self.stdout.write(
+                        f"{name:<28} {repeat:>2} {spec.departments:>5} {result['variables']:>10} {result['constraints']:>11} "
+                        + ' '.join(f"{result['phases'].get(phase, 0):>11.3f}" for phase in PHASES)
+                        + f" {result['wall_seconds']:>9.3f} {result['peak_rss_mb']:>8.1f}  {result['status']}"
+                    )
+                    if name in baseline:
+                        self.stdout.write(self._comparison(baseline[name], result, baseline_commit))
+
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' / (
+            f"scheduler-{commit or 'unknown'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        ))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"📊 Results saved to {output}"))
+
+    @contextmanager
+    def _throwaway_database(self):
+        """Run the block in a fresh, migrated copy of the default database, dropped afterwards.
+
+        The synthetic rooms are shared by every department, so real data would skew the models.
+        SQLite's copy is a temporary file rather than the test runner's in-memory database, so
+        persist timings include real writes.
+        """
+        old_name = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as tmp:
+            if connection.vendor == 'sqlite':
+                connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'benchmark.sqlite3')
+            self.stdout.write("🗄️  Creating a throwaway database...")
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                yield
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    @staticmethod
+    def _comparison(before, after, label):
+        """One line of after/before ratios of the wall time and each phase (below 1.0 is faster)."""
+        def ratio(old, new):
+            return f"{new / old:.2f}×" if old else 'n/a'
+
+        parts = [f"wall {ratio(before['wall_seconds'], after['wall_seconds'])}"]
+        parts += [f"{phase} {ratio(before['phases'].get(phase, 0), after['phases'].get(phase, 0))}" for phase in PHASES]
+        parts.append(f"peak MB {ratio(before['peak_rss_mb'], after['peak_rss_mb'])}")
+        if before['variables'] != after['variables']:
+            parts.append(f"variables {before['variables']} → {after['variables']}")
+        return f"{'':<28}    vs {label}: " + ', '.join(parts)
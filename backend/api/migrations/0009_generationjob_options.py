@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='options',
+            field=models.JSONField(blank=True, default=dict, help_text='Keyword arguments passed to generate_timetable()'),
+        ),
+    ]
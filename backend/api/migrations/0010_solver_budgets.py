@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-17 18:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_generationjob_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='solver_time_budget',
+            field=models.PositiveIntegerField(blank=True, help_text='Max seconds the solver may spend per generation (empty: 30)', null=True),
+        ),
+        migrations.CreateModel(
+            name='SolverRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('solver_mode', models.CharField(max_length=20)),
+                ('num_variables', models.IntegerField()),
+                ('num_batches', models.IntegerField()),
+                ('num_teachers', models.IntegerField()),
+                ('time_limit', models.FloatField(help_text='Seconds each variant was allowed')),
+                ('wall_time', models.FloatField(help_text='Seconds until the slowest variant stopped')),
+                ('time_to_best', models.FloatField(blank=True, help_text='Seconds until the slowest variant found its final solution', null=True)),
+                ('status', models.CharField(help_text='Worst CP-SAT status across variants', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solver_runs', to='api.department')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
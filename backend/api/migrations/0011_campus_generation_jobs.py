@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-17 21:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_solver_budgets'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='generationjob',
+            name='department',
+            field=models.ForeignKey(blank=True, help_text='Empty for a campus-wide job (generate_campus)', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='generation_jobs', to='api.department'),
+        ),
+        migrations.AlterField(
+            model_name='generationjob',
+            name='options',
+            field=models.JSONField(blank=True, default=dict, help_text='Keyword arguments passed to generate_timetable() or generate_campus()'),
+        ),
+    ]
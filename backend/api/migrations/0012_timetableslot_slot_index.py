@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-17 22:05
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# scheduler.TIME_SLOTS as of this migration
+TIME_SLOTS = ["07:30", "08:30", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00"]
+
+
+def backfill_slot_index(apps, schema_editor):
+    TimetableSlot = apps.get_model('api', 'TimetableSlot')
+    for index, start in enumerate(TIME_SLOTS):
+        TimetableSlot.objects.filter(start_time=datetime.time.fromisoformat(start)).update(slot_index=index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_campus_generation_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timetableslot',
+            name='slot_index',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='0-7 position of start_time in the day; empty for off-grid times', null=True),
+        ),
+        migrations.RunPython(backfill_slot_index, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timetableslot',
+            name='timetable',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='api.generatedtimetable'),
+        ),
+        migrations.AddIndex(
+            model_name='timetableslot',
+            index=models.Index(fields=['timetable', 'day', 'slot_index'], name='slot_timetable_cell_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timetableslot',
+            index=models.Index(fields=['timetable', 'teacher'], name='slot_timetable_teacher_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timetableslot',
+            index=models.Index(fields=['timetable', 'batch'], name='slot_timetable_batch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timetableslot',
+            index=models.Index(fields=['timetable', 'room'], name='slot_timetable_room_idx'),
+        ),
+    ]
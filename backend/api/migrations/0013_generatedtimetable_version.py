@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-17 23:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_timetableslot_slot_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedtimetable',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='generatedtimetable',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:40
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_generatedtimetable_version'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='generationjob',
+            constraint=models.UniqueConstraint(django.db.models.functions.comparison.Coalesce('department', models.Value(0)), condition=models.Q(('status__in', ['QUEUED', 'RUNNING'])), name='one_active_generation_job'),
+        ),
+    ]
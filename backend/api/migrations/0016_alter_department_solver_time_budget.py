@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_generationjob_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='department',
+            name='solver_time_budget',
+            field=models.PositiveIntegerField(blank=True, help_text='Max seconds the solver may spend on each variant (empty: 30)', null=True),
+        ),
+    ]
@@ -1,10 +1,16 @@
 from django.db import models
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
 # 1. Department (No dependencies)
 class Department(models.Model):
     name = models.CharField(max_length=100)
+    solver_time_budget = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Max seconds the solver may spend on each variant (empty: 30)"
+    )
 
     def __str__(self): return self.name
 
@@ -88,17 +94,76 @@ class GeneratedTimetable(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="DRAFT")
     variant_number = models.IntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the slots or the names shown in them change; drives snapshot caching and ETags
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self): return f"{self.department.name} - Variant {self.variant_number} ({self.status})"
 
 
 # 8. TimetableSlot (Depends on everything)
 class TimetableSlot(models.Model):
-    timetable = models.ForeignKey(GeneratedTimetable, on_delete=models.CASCADE, related_name='slots')
+    # Indexed through the composites below, which all lead with timetable
+    timetable = models.ForeignKey(GeneratedTimetable, on_delete=models.CASCADE, related_name='slots', db_index=False)
     day = models.CharField(max_length=3)
     start_time = models.TimeField()
     end_time = models.TimeField()
+    slot_index = models.PositiveSmallIntegerField(null=True, blank=True, help_text="0-7 position of start_time in the day; empty for off-grid times")
     room = models.ForeignKey(Room, on_delete=models.CASCADE)
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
-    batch = models.ForeignKey(StudentBatch, on_delete=models.CASCADE)
\ No newline at end of file
+    batch = models.ForeignKey(StudentBatch, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timetable', 'day', 'slot_index'], name='slot_timetable_cell_idx'),
+            models.Index(fields=['timetable', 'teacher'], name='slot_timetable_teacher_idx'),
+            models.Index(fields=['timetable', 'batch'], name='slot_timetable_batch_idx'),
+            models.Index(fields=['timetable', 'room'], name='slot_timetable_room_idx'),
+        ]
+
+# 9. GenerationJob (Depends on Department)
+class GenerationJob(models.Model):
+    STATUS_CHOICES = [('QUEUED', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')]
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='generation_jobs',
+                                   null=True, blank=True, help_text="Empty for a campus-wide job (generate_campus)")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    options = models.JSONField(default=dict, blank=True, help_text="Keyword arguments passed to generate_timetable() or generate_campus()")
+    result = models.JSONField(default=dict, blank=True, help_text="generate_timetable() output once the job has run")
+    error = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='', help_text="host:pid of the process running the job")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last sign of life from the worker; a stale one gets the job requeued")
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # At most one queued or running job per department, and one campus-wide (department 0)
+            models.UniqueConstraint(
+                Coalesce('department', Value(0)), condition=Q(status__in=['QUEUED', 'RUNNING']),
+                name='one_active_generation_job',
+            ),
+        ]
+
+    def __str__(self): return f"Generation job {self.id} for {self.department.name if self.department else 'the campus'} ({self.status})"
+
+
+# 10. SolverRun (Depends on Department) — instance features and outcome of each generation
+class SolverRun(models.Model):
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='solver_runs')
+    solver_mode = models.CharField(max_length=20)
+    num_variables = models.IntegerField()
+    num_batches = models.IntegerField()
+    num_teachers = models.IntegerField()
+    time_limit = models.FloatField(help_text="Seconds each variant was allowed")
+    wall_time = models.FloatField(help_text="Seconds until the slowest variant stopped")
+    time_to_best = models.FloatField(null=True, blank=True, help_text="Seconds until the slowest variant found its final solution")
+    status = models.CharField(max_length=20, help_text="Worst CP-SAT status across variants")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self): return f"{self.department.name}: {self.num_variables} vars, {self.status} in {self.wall_time:.1f}s"
@@ -0,0 +1,176 @@
+"""Validation of slot moves and swaps against the rest of a timetable.
+
+MoveValidator reads a timetable's occupancy (TimetableGrid), teacher and room availability
+as weekly bit masks (availability.py) and the rules the generator enforces once. A proposed
+set of moves is then checked by looking up the counts of just the cells and days the moves
+touch, so each check costs the same however large the timetable is. The rules are the generator's hard constraints for a single slot: teacher,
+room and batch clashes (a main batch's theory never overlaps its sub-batches' labs),
+rooms held by other departments' published timetables, room kind and size, teacher
+unavailability and preferred hours, and the teacher, batch and subject per-day caps.
+"""
+from collections import Counter, namedtuple
+
+from .availability import cell_bit, cells as mask_cells, department_availability, room_masks, window_mask
+from .grid import DAY_INDEX, TimetableGrid, names
+from .models import StudentBatch, Teacher, Room, Subject, PinnedSlot
+from .scheduler import DAYS, TIME_SLOTS, SLOTS_PER_DAY, _published_elsewhere
+
+# A SlotRecord going to (day index, slot index) in room_id
+Move = namedtuple('Move', 'record day slot room_id')
+
+
+def _keys(record, room_id):
+    """(kind, resource id) of every grid column a slot of this record in room_id counts towards."""
+    keys = [
+        ('teacher', record.teacher_id), ('room', room_id), ('batch', record.batch_id),
+        ('subject', record.subject_id), ('group', record.parent_batch_id or record.batch_id),
+    ]
+    if record.parent_batch_id is not None:
+        keys.append(('parent_batch', record.parent_batch_id))
+    return keys
+
+
+class MoveValidator:
+    def __init__(self, timetable):
+        self.grid = grid = TimetableGrid.for_timetable(timetable.id)
+        self.records = {r.id: r for r in grid.records}
+        self.teachers = {
+            t.id: t for t in Teacher.objects.filter(id__in=grid.ids('teacher_id'))
+            .only('name', 'preferred_start_slot', 'preferred_end_slot', 'max_classes_per_day')
+        }
+        self.batches = {
+            b.id: b for b in StudentBatch.objects.filter(id__in=grid.ids('batch_id') | grid.ids('parent_batch_id'))
+            .only('name', 'size', 'parent_batch_id', 'max_classes_per_day')
+        }
+        self.rooms = {r.id: r for r in Room.objects.only('name', 'capacity', 'is_lab')}
+        self.subjects = names(Subject, grid.ids('subject_id'))
+        # Weekly usable cells (see availability.py); a teacher the department's cached masks
+        # don't know, e.g. one whose subject has since moved, falls back to their window
+        known = department_availability(timetable.department_id).teachers
+        self.teacher_masks = {
+            t.id: known.get(t.id, window_mask(t.preferred_start_slot, t.preferred_end_slot))
+            for t in self.teachers.values()
+        }
+        pins = list(PinnedSlot.objects.filter(subject_id__in=self.subjects).values_list('subject_id', 'day', 'slot_index'))
+        self.pinned = {(s_id, DAY_INDEX.get(day), slot) for s_id, day, slot in pins}
+        self.pins_per_day = Counter((s_id, DAY_INDEX.get(day)) for s_id, day, _ in pins)
+        self.room_masks = room_masks(self.rooms.values(), _published_elsewhere([timetable.department_id]))
+
+    def is_pinned(self, record):
+        return (record.subject_id, record.day, record.slot) in self.pinned
+
+    def swap(self, a, b):
+        """The two Moves of swapping records a and b: day, slot and room trade places."""
+        return [Move(a, b.day, b.slot, b.room_id), Move(b, a.day, a.slot, a.room_id)]
+
+    def replay(self, operations):
+        """Play ('move', slot_id, day, slot) and ('swap', slot_a_id, slot_b_id) operations in order,
+        each from where the earlier ones left things. Returns {slot id: Move} of every slot that
+        ends up somewhere other than where it is now.
+        """
+        place = {}
+
+        def current(slot_id):
+            r = self.records[slot_id]
+            return place.get(slot_id, (r.day, r.slot, r.room_id))
+
+        for operation in operations:
+            if operation[0] == 'move':
+                _, slot_id, day, slot = operation
+                place[slot_id] = (day, slot, current(slot_id)[2])
+            else:
+                _, a, b = operation
+                place[a], place[b] = current(b), current(a)
+
+        moves = {}
+        for slot_id, (day, slot, room_id) in place.items():
+            r = self.records[slot_id]
+            if (day, slot, room_id) != (r.day, r.slot, r.room_id):
+                moves[slot_id] = Move(r, day, slot, room_id)
+        return moves
+
+    def problems(self, moves):
+        """Why the moves, made together, would break the timetable: a list of messages, empty if legal."""
+        return list(dict.fromkeys(problem for found in self.check(moves) for problem in found))
+
+    def check(self, moves):
+        """For each of the moves, made together, the messages of the rules it breaks."""
+        cell_delta, day_delta = Counter(), Counter()
+        for m in moves:
+            r = m.record
+            if r.day >= 0 and r.slot >= 0:
+                for key in _keys(r, r.room_id):
+                    cell_delta[(*key, r.day, r.slot)] -= 1
+                    day_delta[(*key, r.day)] -= 1
+            for key in _keys(r, m.room_id):
+                cell_delta[(*key, m.day, m.slot)] += 1
+                day_delta[(*key, m.day)] += 1
+
+        def at(kind, resource_id, m):
+            return self.grid.count(kind, resource_id, m.day, m.slot) + cell_delta[(kind, resource_id, m.day, m.slot)]
+
+        def over(kind, resource_id, m, cap):
+            # Only days the moves add to: an existing overload elsewhere is not this move's doing
+            added = day_delta[(kind, resource_id, m.day)]
+            return added > 0 and self.grid.day_count(kind, resource_id, m.day) + added > cap
+
+        results = []
+        for m in moves:
+            r = m.record
+            found = []
+            results.append(found)
+            if not (0 <= m.day < len(DAYS) and 0 <= m.slot < SLOTS_PER_DAY):
+                found.append("Invalid target cell")
+                continue
+            cell = f"{DAYS[m.day]} {TIME_SLOTS[m.slot]}"
+            bit = cell_bit(m.day, m.slot)
+            teacher, batch, room = self.teachers[r.teacher_id], self.batches[r.batch_id], self.rooms[m.room_id]
+            group = self.batches[r.parent_batch_id or r.batch_id]
+            subject = self.subjects.get(r.subject_id, '')
+
+            if at('teacher', r.teacher_id, m) > 1:
+                found.append(f"Teacher '{teacher.name}' already has a class at {cell}")
+            if at('room', m.room_id, m) > 1 or not self.room_masks[m.room_id] & bit:
+                found.append(f"Room '{room.name}' is taken at {cell}")
+            if at('batch', r.batch_id, m) > 1:
+                found.append(f"Batch '{batch.name}' already has a class at {cell}")
+            if r.parent_batch_id is None and at('parent_batch', r.batch_id, m) > 0:
+                found.append(f"Batch '{batch.name}' has sub-batch labs at {cell}")
+            if r.parent_batch_id is not None and at('batch', r.parent_batch_id, m) > 0:
+                found.append(f"Batch '{group.name}' has a class at {cell} while '{batch.name}' would be in a lab")
+            if room.is_lab != (r.parent_batch_id is not None) or room.capacity < batch.size:
+                found.append(f"Room '{room.name}' does not suit '{batch.name}' ({batch.size} students)")
+            if not self.teacher_masks[r.teacher_id] & bit:
+                if teacher.preferred_start_slot <= m.slot < teacher.preferred_end_slot:
+                    found.append(f"Teacher '{teacher.name}' is unavailable at {cell}")
+                else:
+                    found.append(f"{cell} is outside teacher '{teacher.name}''s preferred hours")
+            if over('teacher', r.teacher_id, m, teacher.max_classes_per_day):
+                found.append(f"Teacher '{teacher.name}' would have more than {teacher.max_classes_per_day} classes on {DAYS[m.day]}")
+            if over('group', group.id, m, group.max_classes_per_day):
+                found.append(f"Batch '{group.name}' would have more than {group.max_classes_per_day} classes on {DAYS[m.day]}")
+            if over('subject', r.subject_id, m, max(1, self.pins_per_day[(r.subject_id, m.day)])):
+                found.append(f"'{subject}' would be taught twice on {DAYS[m.day]}")
+        return results
+
+    def targets(self, record):
+        """Where the record can go: [(day, slot)] cells it can move to keeping its room, and
+        the ids of slots of the same batch group it can swap with. Nothing when it is pinned.
+        """
+        if self.is_pinned(record):
+            return [], []
+        # Only cells the teacher and the room are free in can pass, so only those are checked in full
+        usable = self.teacher_masks[record.teacher_id] & self.room_masks[record.room_id]
+        cells = [
+            (day, slot) for day, slot in mask_cells(usable)
+            if (day, slot) != (record.day, record.slot)
+            and not self.problems([Move(record, day, slot, record.room_id)])
+        ]
+        group = record.parent_batch_id or record.batch_id
+        swaps = [
+            other.id for other in self.grid.records
+            if (other.parent_batch_id or other.batch_id) == group and other.id != record.id
+            and other.day >= 0 and other.slot >= 0 and (other.day, other.slot) != (record.day, record.slot)
+            and not self.is_pinned(other) and not self.problems(self.swap(record, other))
+        ]
+        return cells, swaps
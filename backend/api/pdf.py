@@ -0,0 +1,284 @@
+"""Timetable PDFs: rendering, an on-disk cache and pre-rendering on publish.
+
+Rendered files live under settings.PDF_CACHE_DIR/<timetable id>/, named by the
+timetable version and the batch/teacher filter, so a version bump (publish, slot
+edits, renames) makes older files unreachable; they are removed when the timetable
+is invalidated or a newer version is cached, and the whole directory is kept under
+PDF_CACHE_BYTES by dropping the least recently served files.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .grid import TimetableGrid, names
+from .models import GeneratedTimetable, TimetableSlot, StudentBatch, Teacher, Subject, Room
+from .pdf_render import PageLayout, render_pdf
+from .scheduler import DAYS, TIME_SLOTS, TIME_SLOT_ENDS
+
+logger = logging.getLogger(__name__)
+
+
+def page_layout(tt, records, subjects, teachers, rooms, *title_parts):
+    """PageLayout of the given SlotRecords of a timetable, headed by its department and title_parts."""
+    return PageLayout(
+        title_parts=[tt.department.name, *title_parts],
+        status_label=f"Variant {tt.variant_number}" if tt.status == 'DRAFT' else 'Published',
+        days=DAYS,
+        time_labels=[f"{start}-{end}" for start, end in zip(TIME_SLOTS, TIME_SLOT_ENDS)],
+        matrix=[
+            [[f"{subjects[r.subject_id]}\n{teachers[r.teacher_id]}\n{rooms[r.room_id]}" for r in cell] for cell in row]
+            for row in TimetableGrid(records).cells()
+        ],
+    )
+
+
+def render_timetable_pdf(tt, batch_id=None, teacher_id=None):
+    """PDF bytes of a timetable, optionally only one batch (with its sub-batches) or teacher.
+
+    Raises ImportError when reportlab is not installed.
+    """
+    slots = TimetableSlot.objects.filter(timetable=tt)
+    if batch_id:
+        slots = slots.filter(Q(batch_id=batch_id) | Q(batch__parent_batch_id=batch_id))
+    if teacher_id:
+        slots = slots.filter(teacher_id=teacher_id)
+
+    grid = TimetableGrid.load(slots)
+    title_parts = []
+    if batch_id:
+        title_parts += names(StudentBatch, [batch_id]).values()
+    if teacher_id:
+        title_parts += names(Teacher, [teacher_id]).values()
+    page = page_layout(
+        tt, grid.records, names(Subject, grid.ids('subject_id')), names(Teacher, grid.ids('teacher_id')),
+        names(Room, grid.ids('room_id')), *title_parts,
+    )
+    return render_pdf(page)
+
+
+class PdfCache:
+    """Rendered PDFs on disk, one directory per timetable, bounded by total size."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def root(self):
+        return Path(getattr(settings, 'PDF_CACHE_DIR', settings.BASE_DIR / 'pdf_cache'))
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, 'PDF_CACHE_BYTES', 256 * 1024 * 1024)
+
+    def path(self, timetable_id, version, batch_id=None, teacher_id=None):
+        return self.root / str(timetable_id) / f"v{version}-b{batch_id or 0}-t{teacher_id or 0}.pdf"
+
+    def get(self, timetable_id, version, batch_id=None, teacher_id=None):
+        """Path of the cached file, or None. A hit counts as a use for eviction."""
+        path = self.path(timetable_id, version, batch_id, teacher_id)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, timetable_id, version, batch_id, teacher_id, content):
+        """Store content and return its path."""
+        path = self.path(timetable_id, version, batch_id, teacher_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed so a concurrent reader never serves half a file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+        for old in path.parent.glob('v*.pdf'):
+            if int(old.name[1:old.name.index('-')]) < version:
+                old.unlink(missing_ok=True)
+        self._evict()
+        return path
+
+    def invalidate(self, timetable_id):
+        """Drop every cached PDF of a timetable."""
+        shutil.rmtree(self.root / str(timetable_id), ignore_errors=True)
+
+    def _evict(self):
+        with self._lock:
+            files = []
+            for path in self.root.glob('*/*.pdf'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+
+pdf_cache = PdfCache()
+
+
+def cached_timetable_pdf(tt, batch_id=None, teacher_id=None):
+    """Path of the timetable's PDF for this filter, rendering and caching it on a miss."""
+    path = pdf_cache.get(tt.id, tt.version, batch_id, teacher_id)
+    if path is None:
+        path = pdf_cache.put(tt.id, tt.version, batch_id, teacher_id, render_timetable_pdf(tt, batch_id, teacher_id))
+    return path
+
+
+# --- Every batch's and teacher's PDF at once: bundles and pre-rendering ---
+
+BundleTarget = namedtuple('BundleTarget', 'name batch_id teacher_id page')
+
+
+def bundle_targets(tt):
+    """A BundleTarget per top-level batch and per teacher of a timetable, from one load of its slots."""
+    grid = TimetableGrid.for_timetable(tt.id)
+    subjects = names(Subject, grid.ids('subject_id'))
+    teachers = names(Teacher, grid.ids('teacher_id'))
+    rooms = names(Room, grid.ids('room_id'))
+
+    # A batch's PDF includes its sub-batches, as in render_timetable_pdf
+    by_batch, by_teacher = defaultdict(list), defaultdict(list)
+    for r in grid.records:
+        by_batch[r.parent_batch_id or r.batch_id].append(r)
+        by_teacher[r.teacher_id].append(r)
+    batches = names(StudentBatch, by_batch)
+
+    targets = [
+        BundleTarget(f"batches/{slugify(batches[b])}-{b}.pdf", b, None, page_layout(tt, records, subjects, teachers, rooms, batches[b]))
+        for b, records in sorted(by_batch.items())
+    ]
+    targets += [
+        BundleTarget(f"teachers/{slugify(teachers[t])}-{t}.pdf", None, t, page_layout(tt, records, subjects, teachers, rooms, teachers[t]))
+        for t, records in sorted(by_teacher.items())
+    ]
+    return targets
+
+
+_render_pool = None  # (ProcessPoolExecutor, max_workers)
+_render_pool_lock = threading.Lock()
+
+
+def _get_render_pool():
+    """This process's pool of rendering processes (spawned: they import only pdf_render)."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            max_workers = getattr(settings, 'PDF_RENDER_PROCESSES', None) or os.cpu_count()
+            _render_pool = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('spawn')), max_workers
+        return _render_pool
+
+
+def render_targets(timetable_id, version, targets):
+    """Yield (target, PDF bytes) in order. Cached files are read back; the rest render in the
+    process pool, at most two per worker in flight, and are cached as they arrive.
+    """
+    pool, workers = _get_render_pool()
+    pending = deque()
+
+    def finish(target, path, future):
+        if path is not None:
+            return target, path.read_bytes()
+        content = future.result()
+        pdf_cache.put(timetable_id, version, target.batch_id, target.teacher_id, content)
+        return target, content
+
+    for target in targets:
+        path = pdf_cache.get(timetable_id, version, target.batch_id, target.teacher_id)
+        pending.append((target, path, None if path else pool.submit(render_pdf, target.page)))
+        if len(pending) >= 2 * workers:
+            yield finish(*pending.popleft())
+    while pending:
+        yield finish(*pending.popleft())
+
+
+class _ZipStream:
+    """Write-only, unseekable file for ZipFile; take() returns what was written since the last call."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def timetable_bundle(tt):
+    """Iterator of ZIP archive chunks holding every batch's and teacher's PDF of a timetable.
+
+    The slots are read here, up front; each PDF is added and its bytes handed out as soon
+    as it is rendered, so memory holds only the files in flight.
+    """
+    targets = bundle_targets(tt)
+
+    def chunks():
+        stream = _ZipStream()
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for target, content in render_targets(tt.id, tt.version, targets):
+                archive.writestr(target.name, content)
+                yield stream.take()
+        yield stream.take()
+
+    return chunks()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = getattr(settings, 'PDF_PRERENDER_WORKERS', 1)
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-prerender')
+    return _executor
+
+
+def submit_prerender(timetable_id):
+    """Render every batch's and teacher's PDF of a timetable into the cache, in the background."""
+    return _get_executor().submit(prerender, timetable_id)
+
+
+def prerender(timetable_id):
+    close_old_connections()
+    try:
+        # Version first: the slots read afterwards are at least that new
+        tt = GeneratedTimetable.objects.select_related('department').filter(id=timetable_id).first()
+        if tt is None:
+            return
+        for _ in render_targets(tt.id, tt.version, bundle_targets(tt)):
+            pass
+    except Exception:
+        logger.exception("Pre-rendering PDFs of timetable %s failed", timetable_id)
+    finally:
+        connection.close()
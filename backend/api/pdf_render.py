@@ -0,0 +1,114 @@
+"""reportlab layout of one timetable PDF.
+
+Kept free of Django imports so bulk exports can render in worker processes: a page is
+described by plain data (PageLayout) built in the web process from the timetable grid.
+"""
+import io
+from collections import namedtuple
+
+# title_parts: heading pieces; status_label: 'Published' or 'Variant N'; days: column
+# headings; time_labels: row headings; matrix[row][day]: "subject\nteacher\nroom" entries
+PageLayout = namedtuple('PageLayout', 'title_parts status_label days time_labels matrix')
+
+
+def render_pdf(page):
+    """PDF bytes of a PageLayout. Raises ImportError when reportlab is not installed."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    title_parts, status_label, days, time_labels, matrix = page
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), topMargin=0.5 * inch, bottomMargin=0.5 * inch)
+
+    styles = getSampleStyleSheet()
+
+    # Clean, readable styles
+    cell_style = ParagraphStyle(
+        'Cell', parent=styles['Normal'],
+        fontSize=7.5, leading=10, textColor=colors.HexColor('#1e293b'),
+        alignment=1  # CENTER
+    )
+    time_style = ParagraphStyle(
+        'TimeCell', parent=styles['Normal'],
+        fontSize=7.5, leading=10, textColor=colors.HexColor('#475569'),
+        alignment=1, fontName='Helvetica-Bold'
+    )
+    header_style = ParagraphStyle(
+        'Header', parent=styles['Normal'],
+        fontSize=9, leading=11, textColor=colors.white,
+        alignment=1, fontName='Helvetica-Bold'
+    )
+    title_style = ParagraphStyle(
+        'CustomTitle', parent=styles['Title'],
+        fontSize=16, leading=20, textColor=colors.HexColor('#0f172a'),
+        spaceAfter=4, alignment=1
+    )
+    subtitle_style = ParagraphStyle(
+        'Subtitle', parent=styles['Normal'],
+        fontSize=8, leading=10, textColor=colors.HexColor('#64748b'),
+        alignment=1
+    )
+
+    title = Paragraph(f"<b>{'  —  '.join(title_parts)}</b>", title_style)
+    subtitle = Paragraph(f"{status_label}  •  Generated by ATLAS", subtitle_style)
+
+    header_row = [Paragraph('<b>TIME</b>', header_style)] + [Paragraph(f'<b>{d}</b>', header_style) for d in days]
+
+    data = [header_row]
+    for i, row in enumerate(matrix):
+        cells = [Paragraph(f'<b>{time_labels[i]}</b>', time_style)]
+        for cell_entries in row:
+            if cell_entries:
+                formatted = []
+                for entry in cell_entries:
+                    parts = entry.split('\n')
+                    subj = f'<b>{parts[0]}</b>' if len(parts) > 0 else ''
+                    teacher = f'<br/><i><font color="#475569">{parts[1]}</font></i>' if len(parts) > 1 else ''
+                    room = f'<br/><font color="#64748b" size="6">{parts[2]}</font>' if len(parts) > 2 else ''
+                    formatted.append(f'{subj}{teacher}{room}')
+                cells.append(Paragraph('<br/>'.join(formatted), cell_style))
+            else:
+                cells.append(Paragraph('<font color="#cbd5e1">—</font>', cell_style))
+        data.append(cells)
+
+    col_widths = [80] + [130] * 5
+    table = Table(data, colWidths=col_widths)
+
+    # Clean teal header, white body, light alternating rows
+    teal = colors.HexColor('#0d9488')
+    teal_dark = colors.HexColor('#0f766e')
+    light_gray = colors.HexColor('#f8fafc')
+    border_color = colors.HexColor('#e2e8f0')
+
+    table.setStyle(TableStyle([
+        # Header row
+        ('BACKGROUND', (0, 0), (-1, 0), teal),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+
+        # Time column
+        ('BACKGROUND', (0, 1), (0, -1), colors.HexColor('#f1f5f9')),
+
+        # Alternating row backgrounds
+        ('ROWBACKGROUNDS', (1, 1), (-1, -1), [colors.white, light_gray]),
+
+        # Grid and borders
+        ('GRID', (0, 0), (-1, -1), 0.5, border_color),
+        ('LINEBELOW', (0, 0), (-1, 0), 1.5, teal_dark),
+        ('LINEAFTER', (0, 0), (0, -1), 1, colors.HexColor('#cbd5e1')),
+
+        # Alignment and padding
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+    ]))
+
+    elements = [title, subtitle, Spacer(1, 14), table]
+    doc.build(elements)
+    return buffer.getvalue()
@@ -1,14 +1,59 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
 from ortools.sat.python import cp_model
-from .models import Room, Teacher, Subject, StudentBatch, TimetableSlot, GeneratedTimetable, Department, PinnedSlot, TeacherUnavailability
+from .generation_cache import generation_cache
+from .snapshot_cache import bump_versions
+from .models import Room, Teacher, Subject, StudentBatch, TimetableSlot, GeneratedTimetable, Department, PinnedSlot, SolverRun
 
 
 DAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI']
 TIME_SLOTS = ["07:30", "08:30", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00"]
+TIME_SLOT_ENDS = ["08:30", "09:30", "11:00", "12:00", "13:00", "14:00", "15:00", "16:00"]
 SLOTS_PER_DAY = len(TIME_SLOTS)
+TIME_SLOT_INDEX = {t: i for i, t in enumerate(TIME_SLOTS)}
+DEFAULT_TIME_LIMIT = 30  # seconds per variant when the department sets no solver_time_budget
+MIN_TIME_LIMIT = 5
+ESTIMATOR_MIN_RUNS = 5  # past runs needed before time_limit='auto' trusts the history
+ESTIMATOR_NEIGHBOURS = 5
+ESTIMATOR_HISTORY = 500  # newest SolverRuns kept, and read, per solver mode
+ESTIMATOR_SAFETY = 1.5  # headroom over the slowest similar run's time-to-best
+EXPLAIN_TIME_LIMIT = 10  # seconds for extracting and shrinking an infeasibility core
+HINT_REPAIR_TIME_LIMIT = 5  # seconds for re-placing lectures displaced from a warm-start timetable
+REPAIR_TIME_LIMIT = 10  # seconds per neighbourhood when repairing a timetable in place
+REPAIR_MOVE_PENALTY = 100  # objective cost of moving a lecture; outweighs any slot-preference gain
+SOLVER_MODES = ('single', 'two_phase')
+VARIANT_CONFIGS = [
+    {'seed': 42, 'weight': 1},
+    {'seed': 137, 'weight': 2},
+    {'seed': 7919, 'weight': 3},
+]
+
+
+@contextmanager
+def _timed(timings, phase):
+    """Add the wall-clock seconds spent inside the block to timings[phase]."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = round(timings.get(phase, 0) + time.perf_counter() - started, 3)
+
 
+def run_diagnostics(department_id, batches, subjects, teachers, rooms, availability):
+    """Pre-solve diagnostics: detect obvious infeasibility before running the solver.
 
-def run_diagnostics(department_id, batches, subjects, teachers, rooms):
-    """Pre-solve diagnostics: detect obvious infeasibility before running the solver."""
+    Capacities are popcounts of the weekly masks in `availability` (an availability.Availability).
+    """
     issues = []
 
     main_batches = [b for b in batches if b.parent_batch is None]
@@ -21,19 +66,19 @@ def run_diagnostics(department_id, batches, subjects, teachers, rooms):
         batch_subjects = [s for s in subjects if s.batch_id == b.id]
         total = sum(s.weekly_lectures for s in batch_subjects)
         total_theory_slots_needed[b.id] = total
-        available = SLOTS_PER_DAY * len(DAYS)
+        available = availability.count('batch', b.id)
         if total > available:
-            issues.append(f"⚠️ Batch '{b.name}' needs {total} theory slots/week but only {available} slots exist (8 slots × 5 days).")
+            issues.append(f"⚠️ Batch '{b.name}' needs {total} theory slots/week but only {available} slots have one of its teachers available.")
 
     if len(main_batches) > len(theory_rooms):
         issues.append(f"⚠️ {len(main_batches)} batches need simultaneous theory classes but only {len(theory_rooms)} theory rooms available. Add more rooms or stagger schedules.")
 
     for t in teachers:
-        avail_slots = (t.preferred_end_slot - t.preferred_start_slot) * len(DAYS)
+        avail_slots = availability.count('teacher', t.id)
         teacher_subjects = [s for s in subjects if s.teacher_id == t.id]
         total_lectures = sum(s.weekly_lectures for s in teacher_subjects)
         if total_lectures > avail_slots:
-            issues.append(f"⚠️ Teacher '{t.name}' has {total_lectures} lectures/week but only {avail_slots} available slots (preference: slot {t.preferred_start_slot}–{t.preferred_end_slot}).")
+            issues.append(f"⚠️ Teacher '{t.name}' has {total_lectures} lectures/week but only {avail_slots} available slots (preference: slot {t.preferred_start_slot}–{t.preferred_end_slot}, less unavailability).")
         max_daily = t.max_classes_per_day * len(DAYS)
         if total_lectures > max_daily:
             issues.append(f"⚠️ Teacher '{t.name}' has {total_lectures} lectures/week but max {t.max_classes_per_day}/day × 5 days = {max_daily}.")
@@ -52,26 +97,116 @@ def run_diagnostics(department_id, batches, subjects, teachers, rooms):
     return issues
 
 
-def _build_and_solve(department_id, batches, subjects, teachers, rooms, pinned_slots, unavailability_set, variant_seed, variant_weight):
-    """Build and solve a single CP-SAT model. Returns (status_str, slot_data_list, diagnostics_list)."""
+def _room_classes(rooms):
+    """Group interchangeable rooms (same is_lab and capacity). Returns lists of rooms in canonical order.
+
+    The solver picks a class and C3 only counts how many rooms of it are in use, so it never
+    explores solutions that merely swap identical rooms; _assign_rooms hands out the actual
+    rooms of a class in this (name) order when the result is saved.
+    """
+    classes = {}
+    for r in sorted(rooms, key=lambda r: (r.is_lab, r.capacity, r.name, r.id)):
+        classes.setdefault((r.is_lab, r.capacity), []).append(r)
+    return list(classes.values())
+
+
+class ShiftIndex:
+    """Lookup tables over the shift variables, filled once while they are created.
+
+    Every constraint block reads its candidates from here instead of rescanning
+    ``shifts``, so model build time stays linear in the number of variables.
+    """
+
+    def __init__(self):
+        self.by_subject = defaultdict(list)          # subject_id -> vars
+        self.by_subject_day = defaultdict(list)      # (subject_id, day) -> vars
+        self.by_subject_slot = defaultdict(list)     # (subject_id, day, slot) -> vars
+        self.by_teacher_day = defaultdict(list)      # (teacher_id, day) -> vars
+        self.by_teacher_slot = defaultdict(list)     # (teacher_id, day, slot) -> vars
+        self.by_room_slot = defaultdict(list)        # (room_class, day, slot) -> vars
+        self.by_batch_slot = defaultdict(list)       # (batch_id, day, slot) -> vars
+        self.by_parent_slot = defaultdict(list)      # (parent_batch_id, day, slot) -> vars of its sub-batches
+        self.by_group_day = defaultdict(list)        # (main_batch_id, day) -> vars of the batch and its sub-batches
+        self.by_group_slot = defaultdict(list)       # (main_batch_id, day, slot) -> same, per slot
+
+    def add(self, key, var, parent_id=None):
+        t_id, s_id, b_id, rc, day, slot = key
+        group_id = parent_id if parent_id is not None else b_id
+        self.by_subject[s_id].append(var)
+        self.by_subject_day[(s_id, day)].append(var)
+        self.by_subject_slot[(s_id, day, slot)].append(var)
+        self.by_teacher_day[(t_id, day)].append(var)
+        self.by_teacher_slot[(t_id, day, slot)].append(var)
+        if rc is not None:
+            self.by_room_slot[(rc, day, slot)].append(var)
+        self.by_batch_slot[(b_id, day, slot)].append(var)
+        if parent_id is not None:
+            self.by_parent_slot[(parent_id, day, slot)].append(var)
+        self.by_group_day[(group_id, day)].append(var)
+        self.by_group_slot[(group_id, day, slot)].append(var)
+
+
+class ScheduleModel:
+    """A built CP-SAT model plus the variable bookkeeping that variants, hints and result extraction need."""
+
+    def __init__(self, model, shifts, gap_terms, indicators, guards):
+        self.model = model
+        self.shifts = shifts            # shift key -> BoolVar
+        self.gap_terms = gap_terms      # [(has_class literal, O2 coefficient)]
+        self.indicators = indicators    # [(literal, source vars)]: literal is true iff any source is
+        self.guards = guards            # [(literal, description)]: enforces one constraint group, fixed true
+
+
+def _build_model(batches, subjects, teachers, rooms, pinned_slots, unavailability_set, two_phase=False, reserved=None, availability=None):
+    """Build the variables and constraints shared by every variant. Returns a ScheduleModel.
+
+    Shift keys are (teacher, subject, batch, room_class, day, slot), where room_class indexes
+    _room_classes(rooms). The model has no objective yet; each variant swaps its own in with
+    _set_variant_objective. With two_phase=True the model only decides times: the room class is
+    None and C3 becomes per-cell room-capacity counts, leaving the rooms to _assign_rooms.
+    `reserved` maps (day, start_time) to room ids held elsewhere (see _booked_rooms); C3 only
+    counts the rooms left free in each cell. Variables only exist in cells the teacher's mask in
+    `availability` allows; it is built from the other inputs when not given.
+
+    Each constraint group (one teacher's C7 cap, one pin, ...) is enforced by its own guard
+    literal. Guards are fixed to true, so presolve drops them for normal solves;
+    _explain_infeasibility frees them and solves under assumptions to find a conflicting set.
+    """
+    from .availability import Availability
+
     model = cp_model.CpModel()
+    reserved = reserved or {}
+    availability = availability or Availability(teachers, subjects, unavailability_set)
+
+    guards = []
+
+    def guard(kind, message, **ids):
+        literal = model.NewBoolVar(f'guard_{len(guards)}')
+        guards.append((literal, {'type': kind, 'message': message, **ids}))
+        return literal
 
     main_batches = [b for b in batches if b.parent_batch is None]
+    sub_batches = [b for b in batches if b.parent_batch is not None]
     lab_subjects = [s for s in subjects if s.batch and s.batch.parent_batch]
-    theory_subjects = [s for s in subjects if s.batch and not s.batch.parent_batch]
 
     lab_groups_by_parent = {}
     for s in lab_subjects:
         parent_id = s.batch.parent_batch_id
         lab_groups_by_parent.setdefault(parent_id, {}).setdefault(s.batch.id, []).append(s)
 
-    # Build pinned lookup: (subject_id, day, slot) -> True
-    pinned_lookup = set()
-    for p in pinned_slots:
-        pinned_lookup.add((p.subject_id, p.day, p.slot_index))
+    room_classes = _room_classes(rooms)
+
+    # Distinct room capacities per room kind (lab / theory), smallest first. A class fits every
+    # room from the first tier at or above its batch size, so the compatible room sets are nested.
+    capacity_tiers = {
+        is_lab: [rc[0].capacity for rc in room_classes if rc[0].is_lab == is_lab] for is_lab in (False, True)
+    }
+    by_tier_slot = defaultdict(list)  # (is_lab, tier, day, slot) -> vars, two-phase only
 
     # 2. Create Variables
     shifts = {}
+    index = ShiftIndex()
+    indicators = []
     for s in subjects:
         target_batch = s.batch
         if not target_batch:
@@ -80,21 +215,27 @@ def _build_and_solve(department_id, batches, subjects, teachers, rooms, pinned_s
         if not t:
             continue
         is_lab_subject = target_batch.parent_batch is not None
-        for r in rooms:
-            if target_batch.size > r.capacity:
-                continue
-            if is_lab_subject and not r.is_lab:
-                continue
-            if not is_lab_subject and r.is_lab:
-                continue
+        parent_id = target_batch.parent_batch_id if is_lab_subject else None
+        compatible_classes = [
+            i for i, rc in enumerate(room_classes)
+            if target_batch.size <= rc[0].capacity and rc[0].is_lab == is_lab_subject
+        ]
+        if not compatible_classes:
+            continue
+        room_keys = [None] if two_phase else compatible_classes
+        tier = bisect_left(capacity_tiers[is_lab_subject], target_batch.size)
+        usable = availability.mask('teacher', t.id)
+        for rc in room_keys:
             for d_idx, day in enumerate(DAYS):
                 for slot in range(SLOTS_PER_DAY):
-                    if slot < t.preferred_start_slot or slot >= t.preferred_end_slot:
-                        continue
-                    if (t.id, day, slot) in unavailability_set:
+                    if not usable >> (d_idx * SLOTS_PER_DAY + slot) & 1:
                         continue
-                    key = (t.id, s.id, target_batch.id, r.id, day, slot)
-                    shifts[key] = model.NewBoolVar(f'shift_{key}')
+                    key = (t.id, s.id, target_batch.id, rc, day, slot)
+                    var = model.NewBoolVar(f'shift_{key}')
+                    shifts[key] = var
+                    index.add(key, var, parent_id)
+                    if two_phase:
+                        by_tier_slot[(is_lab_subject, tier, day, slot)].append(var)
 
     # 3. Hard Constraints
 
@@ -102,70 +243,102 @@ def _build_and_solve(department_id, batches, subjects, teachers, rooms, pinned_s
     for s in subjects:
         if not s.batch or not s.teacher:
             continue
-        candidates = []
-        for r in rooms:
-            if s.batch.size > r.capacity:
-                continue
-            for day in DAYS:
-                for slot in range(SLOTS_PER_DAY):
-                    t = s.teacher
-                    if slot < t.preferred_start_slot or slot >= t.preferred_end_slot:
-                        continue
-                    key = (t.id, s.id, s.batch.id, r.id, day, slot)
-                    if key in shifts:
-                        candidates.append(shifts[key])
+        candidates = index.by_subject.get(s.id)
         if candidates:
-            model.Add(sum(candidates) == s.weekly_lectures)
+            g = guard('weekly_lectures', f"'{s.name}' ({s.batch.name}) needs {s.weekly_lectures} lectures/week", subject_id=s.id)
+            model.Add(sum(candidates) == s.weekly_lectures).OnlyEnforceIf(g)
 
     # C2: Teacher Conflict
     for t in teachers:
+        g = None
         for day in DAYS:
             for slot in range(SLOTS_PER_DAY):
-                moves = [var for k, var in shifts.items()
-                         if k[0] == t.id and k[4] == day and k[5] == slot]
+                moves = index.by_teacher_slot.get((t.id, day, slot))
                 if moves:
-                    model.Add(sum(moves) <= 1)
+                    if g is None:
+                        g = guard('teacher_clash', f"Teacher '{t.name}' teaches one class at a time", teacher_id=t.id)
+                    model.Add(sum(moves) <= 1).OnlyEnforceIf(g)
 
     # C3: Room Conflict
-    for r in rooms:
-        for day in DAYS:
-            for slot in range(SLOTS_PER_DAY):
-                moves = [var for k, var in shifts.items() if k[3] == r.id and k[4] == day and k[5] == slot]
-                if moves:
-                    model.Add(sum(moves) <= 1)
+    if two_phase:
+        # Per cell and room kind, the classes needing at least tier k must fit in the rooms of
+        # capacity >= tier k. With nested room sets this Hall condition is exactly what makes a
+        # conflict-free room matching possible afterwards.
+        room_by_id = {r.id: r for r in rooms}
+        for is_lab, caps in capacity_tiers.items():
+            rooms_at_least = [
+                sum(len(rc) for rc in room_classes if rc[0].is_lab == is_lab and rc[0].capacity >= cap) for cap in caps
+            ]
+            held_elsewhere = any(
+                r_id in room_by_id and room_by_id[r_id].is_lab == is_lab for held in reserved.values() for r_id in held
+            )
+            tier_guards = {}
+            for day in DAYS:
+                for slot in range(SLOTS_PER_DAY):
+                    held = [
+                        room_by_id[r_id].capacity for r_id in reserved.get((day, TIME_SLOTS[slot]), ())
+                        if r_id in room_by_id and room_by_id[r_id].is_lab == is_lab
+                    ]
+                    needing_tier = []
+                    for tier in reversed(range(len(caps))):
+                        tier_vars = by_tier_slot.get((is_lab, tier, day, slot))
+                        if tier_vars:
+                            needing_tier.extend(tier_vars)
+                            if tier not in tier_guards:
+                                tier_guards[tier] = guard(
+                                    'room_capacity',
+                                    f"Only {rooms_at_least[tier]} {'lab' if is_lab else 'theory'} room(s) with at least {caps[tier]} seats"
+                                    + (", some of them held by other departments" if held_elsewhere else ""),
+                                    is_lab=is_lab, capacity=caps[tier],
+                                )
+                            free = rooms_at_least[tier] - sum(cap >= caps[tier] for cap in held)
+                            model.Add(sum(needing_tier) <= free).OnlyEnforceIf(tier_guards[tier])
+    else:
+        # Identical rooms form one class: at most as many classes per cell as the class has rooms
+        for rc, class_rooms in enumerate(room_classes):
+            class_ids = {r.id for r in class_rooms}
+            g = None
+            for day in DAYS:
+                for slot in range(SLOTS_PER_DAY):
+                    moves = index.by_room_slot.get((rc, day, slot))
+                    if moves:
+                        if g is None:
+                            held_elsewhere = any(class_ids & held for held in reserved.values())
+                            g = guard(
+                                'room_capacity',
+                                f"Only {len(class_rooms)} {'lab' if class_rooms[0].is_lab else 'theory'} room(s) with {class_rooms[0].capacity} seats"
+                                + (", some of them held by other departments" if held_elsewhere else ""),
+                                room_ids=[r.id for r in class_rooms],
+                            )
+                        free = len(class_ids - reserved.get((day, TIME_SLOTS[slot]), set()))
+                        model.Add(sum(moves) <= free).OnlyEnforceIf(g)
 
     # C4: Batch/Student Conflict
-    for b in main_batches:
+    for b in main_batches + sub_batches:
+        g = None
         for day in DAYS:
             for slot in range(SLOTS_PER_DAY):
-                moves = [var for k, var in shifts.items()
-                         if k[2] == b.id and k[4] == day and k[5] == slot]
+                moves = index.by_batch_slot.get((b.id, day, slot))
                 if moves:
-                    model.Add(sum(moves) <= 1)
-
-    sub_batches = [b for b in batches if b.parent_batch is not None]
-    for b in sub_batches:
-        for day in DAYS:
-            for slot in range(SLOTS_PER_DAY):
-                moves = [var for k, var in shifts.items()
-                         if k[2] == b.id and k[4] == day and k[5] == slot]
-                if moves:
-                    model.Add(sum(moves) <= 1)
+                    if g is None:
+                        g = guard('batch_clash', f"Batch '{b.name}' attends one class at a time", batch_id=b.id)
+                    model.Add(sum(moves) <= 1).OnlyEnforceIf(g)
 
     # Parent-child exclusion
     for mb in main_batches:
-        sub_ids = [sb.id for sb in batches if sb.parent_batch_id == mb.id]
+        g = None
         for day in DAYS:
             for slot in range(SLOTS_PER_DAY):
-                theory_vars = [var for k, var in shifts.items()
-                               if k[2] == mb.id and k[4] == day and k[5] == slot]
-                lab_vars = [var for k, var in shifts.items()
-                            if k[2] in sub_ids and k[4] == day and k[5] == slot]
+                theory_vars = index.by_batch_slot.get((mb.id, day, slot))
+                lab_vars = index.by_parent_slot.get((mb.id, day, slot))
                 if theory_vars and lab_vars:
+                    if g is None:
+                        g = guard('theory_lab_exclusion', f"Batch '{mb.name}' has no theory while its sub-batches are in labs", batch_id=mb.id)
                     has_theory = model.NewBoolVar(f'theory_{mb.id}_{day}_{slot}')
                     model.Add(sum(theory_vars) >= 1).OnlyEnforceIf(has_theory)
                     model.Add(sum(theory_vars) == 0).OnlyEnforceIf(has_theory.Not())
-                    model.Add(sum(lab_vars) == 0).OnlyEnforceIf(has_theory)
+                    model.Add(sum(lab_vars) == 0).OnlyEnforceIf([has_theory, g])
+                    indicators.append((has_theory, theory_vars))
 
     # C5: At most one lecture per subject per day (relaxed for pinned subjects)
     # Count how many pins each subject has per day
@@ -177,120 +350,574 @@ def _build_and_solve(department_id, batches, subjects, teachers, rooms, pinned_s
     for s in subjects:
         if not s.batch or not s.teacher:
             continue
+        g = None
         for day in DAYS:
-            day_vars = [var for k, var in shifts.items() if k[1] == s.id and k[2] == s.batch.id and k[4] == day]
+            day_vars = index.by_subject_day.get((s.id, day))
             if day_vars:
+                if g is None:
+                    g = guard('once_per_day', f"'{s.name}' ({s.batch.name}) is taught at most once per day (more only where pinned)", subject_id=s.id)
                 # Allow more than 1 if there are multiple pins on this day for this subject
                 max_on_day = max(1, pins_per_subject_day.get((s.id, day), 0))
-                model.Add(sum(day_vars) <= max_on_day)
+                model.Add(sum(day_vars) <= max_on_day).OnlyEnforceIf(g)
 
     # C6: Lab synchronization
     for parent_id, sub_batch_labs in lab_groups_by_parent.items():
         sub_batch_ids = list(sub_batch_labs.keys())
         if len(sub_batch_ids) < 2:
             continue
+        parent = next(iter(sub_batch_labs.values()))[0].batch.parent_batch
+        g = None
         for day in DAYS:
             for slot in range(SLOTS_PER_DAY):
                 sub_vars = {}
                 for sb_id in sub_batch_ids:
-                    sv = [var for k, var in shifts.items()
-                          if k[2] == sb_id and k[4] == day and k[5] == slot]
+                    sv = index.by_batch_slot.get((sb_id, day, slot))
                     if sv:
                         sub_vars[sb_id] = sv
                 if len(sub_vars) < 2:
                     continue
+                if g is None:
+                    g = guard('lab_sync', f"Lab sub-batches of '{parent.name}' hold their labs at the same time", batch_id=parent_id)
                 lab_here = model.NewBoolVar(f'lab_{parent_id}_{day}_{slot}')
                 for sb_id, sv in sub_vars.items():
-                    model.Add(sum(sv) == 1).OnlyEnforceIf(lab_here)
-                    model.Add(sum(sv) == 0).OnlyEnforceIf(lab_here.Not())
+                    model.Add(sum(sv) == 1).OnlyEnforceIf([lab_here, g])
+                    model.Add(sum(sv) == 0).OnlyEnforceIf([lab_here.Not(), g])
+                indicators.append((lab_here, [var for sv in sub_vars.values() for var in sv]))
 
     # C7: Max classes per day — Teacher
     for t in teachers:
+        g = None
         for day in DAYS:
-            day_vars = [var for k, var in shifts.items() if k[0] == t.id and k[4] == day]
+            day_vars = index.by_teacher_day.get((t.id, day))
             if day_vars:
-                model.Add(sum(day_vars) <= t.max_classes_per_day)
+                if g is None:
+                    g = guard('teacher_daily_cap', f"Teacher '{t.name}' teaches at most {t.max_classes_per_day} classes/day", teacher_id=t.id)
+                model.Add(sum(day_vars) <= t.max_classes_per_day).OnlyEnforceIf(g)
 
     # C8: Max classes per day — Batch (main batches including their sub-batch labs)
     for mb in main_batches:
-        batch_ids = [mb.id] + [sb.id for sb in batches if sb.parent_batch_id == mb.id]
+        g = None
         for day in DAYS:
-            day_vars = [var for k, var in shifts.items() if k[2] in batch_ids and k[4] == day]
+            day_vars = index.by_group_day.get((mb.id, day))
             if day_vars:
-                model.Add(sum(day_vars) <= mb.max_classes_per_day)
+                if g is None:
+                    g = guard('batch_daily_cap', f"Batch '{mb.name}' has at most {mb.max_classes_per_day} classes/day, labs included", batch_id=mb.id)
+                model.Add(sum(day_vars) <= mb.max_classes_per_day).OnlyEnforceIf(g)
 
     # C9: Pinned Slots — force specific subjects to specific day/slot
+    subjects_by_id = {s.id: s for s in subjects}
     for p in pinned_slots:
-        s = next((sub for sub in subjects if sub.id == p.subject_id), None)
+        s = subjects_by_id.get(p.subject_id)
         if not s or not s.batch or not s.teacher:
             continue
-        pin_vars = [var for k, var in shifts.items()
-                    if k[1] == s.id and k[2] == s.batch.id and k[4] == p.day and k[5] == p.slot_index]
+        pin_vars = index.by_subject_slot.get((s.id, p.day, p.slot_index))
         if pin_vars:
-            model.Add(sum(pin_vars) == 1)
-
-    # 4. Optimization
-    obj_terms = []
-
-    # O1: Prefer earlier slots (with variant weight for diversity)
-    for k, var in shifts.items():
-        slot_idx = k[5]
-        obj_terms.append(slot_idx * variant_weight * var)
+            g = guard('pin', f"'{s.name}' ({s.batch.name}) is pinned to {p.day} slot {p.slot_index}", pin_id=p.id, subject_id=s.id)
+            model.Add(sum(pin_vars) == 1).OnlyEnforceIf(g)
 
-    # O2: Minimize gaps
+    # O2 indicators: one "batch has a class" literal per (main batch, day, slot), weighted into every objective
+    gap_terms = []
     for mb in main_batches:
-        batch_ids = [mb.id] + [sb.id for sb in batches if sb.parent_batch_id == mb.id]
         for day in DAYS:
-            day_vars_by_slot = {}
             for slot in range(SLOTS_PER_DAY):
-                slot_vars = [var for k, var in shifts.items() if k[2] in batch_ids and k[4] == day and k[5] == slot]
+                slot_vars = index.by_group_slot.get((mb.id, day, slot))
                 if slot_vars:
                     has_class = model.NewBoolVar(f'has_{mb.id}_{day}_{slot}')
                     model.Add(sum(slot_vars) >= 1).OnlyEnforceIf(has_class)
                     model.Add(sum(slot_vars) == 0).OnlyEnforceIf(has_class.Not())
-                    day_vars_by_slot[slot] = has_class
-            for slot, has_var in day_vars_by_slot.items():
-                obj_terms.append(slot * 2 * has_var)
+                    gap_terms.append((has_class, slot * 2))
+                    indicators.append((has_class, slot_vars))
+
+    # Every group is on unless _explain_infeasibility frees its guard
+    variables = model.Proto().variables
+    for literal, _ in guards:
+        variables[literal.Index()].domain[0] = 1
+
+    return ScheduleModel(model, shifts, gap_terms, indicators, guards)
 
-    model.Minimize(sum(obj_terms))
 
+def _set_variant_objective(model, shifts, gap_terms, variant_weight):
+    """Write a variant's objective into a model that has none yet (a fresh build or Clone()).
+
+    Coefficients go straight into the proto: going through LinearExpr for every
+    shift variable costs more than the solver's own presolve on large models.
+    """
+    objective = model.Proto().objective
+
+    # 4. Optimization
+    # O1: Prefer earlier slots (with variant weight for diversity)
+    objective.vars.extend(var.Index() for var in shifts.values())
+    objective.coeffs.extend(key[5] * variant_weight for key in shifts)
+
+    # O2: Minimize gaps
+    objective.vars.extend(has_class.Index() for has_class, _ in gap_terms)
+    objective.coeffs.extend(coeff for _, coeff in gap_terms)
+
+
+def _load_inputs(department_id):
+    """Read a department's scheduling inputs. Returns (batches, subjects, teachers, rooms, pinned_slots, unavailability_set).
+
+    unavailability_set covers teachers of other departments who teach its subjects as well.
+    """
+    from .availability import load_unavailability
+    batches = list(StudentBatch.objects.filter(department_id=department_id).select_related('parent_batch'))
+    subjects = list(Subject.objects.filter(department_id=department_id).select_related('batch__parent_batch', 'teacher'))
+    teachers = list(Teacher.objects.filter(department_id=department_id))
+    rooms = list(Room.objects.all())
+    pinned_slots = list(PinnedSlot.objects.filter(department_id=department_id))
+    unavailability_set = load_unavailability(teachers, subjects)
+    return batches, subjects, teachers, rooms, pinned_slots, unavailability_set
+
+
+def _booked_rooms(timetables):
+    """Rooms used by the slots of `timetables` (a queryset). Returns {(day, 'HH:MM'): set of room ids}."""
+    booked = defaultdict(set)
+    slots = TimetableSlot.objects.filter(timetable__in=timetables, slot_index__isnull=False)
+    for day, slot, room_id in slots.values_list('day', 'slot_index', 'room_id'):
+        booked[(day, TIME_SLOTS[slot])].add(room_id)
+    return booked
+
+
+def _published_elsewhere(department_ids):
+    """Rooms booked by the PUBLISHED timetables of every department not in department_ids."""
+    return _booked_rooms(
+        GeneratedTimetable.objects.filter(status='PUBLISHED').exclude(department_id__in=department_ids)
+    )
+
+
+def _input_fingerprint(batches, subjects, teachers, rooms, pinned_slots, unavailability_set, reserved, settings):
+    """Stable hash of everything generate_timetable() reads; equal fingerprints give equivalent results.
+
+    Teachers of other departments who teach its subjects are hashed too: the model applies
+    their window and daily cap as it does its own teachers'.
+    """
+    teachers = {t.id: t for t in teachers}
+    teachers.update((s.teacher_id, s.teacher) for s in subjects if s.teacher_id and s.teacher_id not in teachers)
+    payload = {
+        'batches': sorted((b.id, b.name, b.size, b.parent_batch_id, b.max_classes_per_day) for b in batches),
+        'subjects': sorted((s.id, s.name, s.weekly_lectures, s.batch_id, s.teacher_id) for s in subjects),
+        'teachers': sorted(
+            (t.id, t.name, t.preferred_start_slot, t.preferred_end_slot, t.max_classes_per_day) for t in teachers.values()
+        ),
+        'rooms': sorted((r.id, r.name, r.capacity, r.is_lab) for r in rooms),
+        'pins': sorted((p.subject_id, p.day, p.slot_index) for p in pinned_slots),
+        'unavailable': sorted(unavailability_set),
+        'reserved': sorted((cell, sorted(room_ids)) for cell, room_ids in reserved.items() if room_ids),
+        'settings': settings,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _draft_versions(dept, timetable_ids):
+    """{timetable id: version} of those of the ids that are still the department's drafts."""
+    return dict(
+        GeneratedTimetable.objects.filter(id__in=timetable_ids, department=dept, status='DRAFT').values_list('id', 'version')
+    )
+
+
+def _cached_generation(dept, fingerprint, timings):
+    """Return the cached result for this fingerprint, or None on a miss.
+
+    The cached drafts are handed back only as they were written: if any was deleted, published
+    or edited since (its version moved on), the cached variants are written again as new drafts.
+    """
+    entry = generation_cache.get(dept.id, fingerprint)
+    if entry is None:
+        return None
+    result = dict(entry['result'])
+    if _draft_versions(dept, result['timetable_ids']) != entry['versions']:
+        with _timed(timings, 'persist'):
+            result['timetable_ids'] = _persist_variants(dept, entry['variants'])
+        entry = {**entry, 'result': result, 'versions': _draft_versions(dept, result['timetable_ids'])}
+        generation_cache.put(dept.id, fingerprint, entry)
+    result['messages'] = result['messages'] + ["⚡ Inputs unchanged since the last run: returned the same variants without re-solving."]
+    result['timings'] = timings
+    result['cached'] = True
+    return result
+
+
+def _load_warm_start(department_id, warm_start_from):
+    """Find the timetable to warm-start from ('published' or a timetable id). Returns (timetable, slot rows)."""
+    timetables = GeneratedTimetable.objects.filter(department_id=department_id)
+    if warm_start_from == 'published':
+        tt = timetables.filter(status='PUBLISHED').order_by('-created_at').first()
+    else:
+        tt = timetables.filter(id=warm_start_from).first()
+    if not tt:
+        return None, []
+    rows = list(tt.slots.values_list('teacher_id', 'subject_id', 'batch_id', 'room_id', 'day', 'slot_index'))
+    return tt, rows
+
+
+def _slot_keys(built, rows, rooms, two_phase=False):
+    """Map (teacher, subject, batch, room, day, slot_index) rows to shift keys; None where no variable exists any more."""
+    class_of_room = {r.id: i for i, rc in enumerate(_room_classes(rooms)) for r in rc}
+    keys = []
+    for t_id, s_id, b_id, room_id, day, slot in rows:
+        rc = None if two_phase else class_of_room.get(room_id)
+        key = (t_id, s_id, b_id, rc, day, slot)
+        keys.append(key if key in built.shifts else None)
+    return keys
+
+
+def _miscounted_subjects(keys, subjects):
+    """Subjects whose lectures among `keys` no longer add up to weekly_lectures."""
+    lectures = defaultdict(int)
+    for key in keys:
+        lectures[key[1]] += 1
+    return [s for s in subjects if s.batch and s.teacher and lectures[s.id] != s.weekly_lectures]
+
+
+def _add_solution_hints(built, rows, subjects, batches, rooms, two_phase=False):
+    """Hint the model with a previous timetable's slots. Returns how many slots still map to a shift variable.
+
+    Slots whose teacher, subject, batch, room kind or time are no longer allowed simply
+    drop out. If that leaves some subject with the wrong number of lectures, a short
+    feasibility solve re-places the lectures of the affected teachers and batches while
+    every other kept slot stays fixed. Either way the hint is a complete assignment
+    (shifts and indicator literals), which the solver can start from directly.
+    """
+    keys = _slot_keys(built, rows, rooms, two_phase)
+    hinted = {key for key in keys if key is not None}
+    kept = sum(key is not None for key in keys)
+    affected = _miscounted_subjects(hinted, subjects)
+
+    hint_vars = list(built.shifts.values()) + [literal for literal, _ in built.indicators]
+    hint_values = None
+    if affected:
+        group_of = {b.id: b.parent_batch_id or b.id for b in batches}
+        teacher_ids = {s.teacher_id for s in affected}
+        group_ids = {group_of[s.batch_id] for s in affected}
+        repair = built.model.Clone()
+        for key in hinted:
+            if key[0] not in teacher_ids and group_of[key[2]] not in group_ids:
+                repair.Add(built.shifts[key] == 1)
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = HINT_REPAIR_TIME_LIMIT
+        status = solver.Solve(repair)
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+            hint_values = [solver.Value(var) for var in hint_vars]
+
+    if hint_values is None:
+        hinted_vars = {built.shifts[key].Index() for key in hinted}
+        hint_values = [1 if key in hinted else 0 for key in built.shifts]
+        hint_values.extend(
+            int(any(var.Index() in hinted_vars for var in sources)) for _, sources in built.indicators
+        )
+
+    hint = built.model.Proto().solution_hint
+    hint.vars.extend(var.Index() for var in hint_vars)
+    hint.values.extend(hint_values)
+    return kept
+
+
+class _SolveMonitor(cp_model.CpSolverSolutionCallback):
+    """Record when the objective last improved; optionally stop the search after a quiet window
+    or once `cancel` (a threading.Event shared between variants) is set.
+
+    Both are checked from a watcher thread rather than from the callback, which only runs
+    when a new solution arrives and so can't notice that none has for a while.
+    """
+
+    def __init__(self, solver, no_improvement_seconds=None, cancel=None):
+        super().__init__()
+        self.solver = solver
+        self.no_improvement_seconds = no_improvement_seconds
+        self.cancel = cancel
+        self.started = time.perf_counter()
+        self.best = None
+        self.time_to_best = None
+        self.stopped_early = False
+        self.cancelled = False
+        self._done = threading.Event()
+
+    def on_solution_callback(self):
+        objective = self.ObjectiveValue()
+        if self.best is None or objective < self.best:
+            self.best = objective
+            self.time_to_best = time.perf_counter() - self.started
+
+    def _watch(self):
+        while not self._done.wait(0.1):
+            if self.cancel is not None and self.cancel.is_set():
+                self.cancelled = True
+                self.solver.StopSearch()
+                return
+            if (self.no_improvement_seconds and self.time_to_best is not None
+                    and time.perf_counter() - self.started - self.time_to_best >= self.no_improvement_seconds):
+                self.stopped_early = True
+                self.solver.StopSearch()
+                return
+
+    def __enter__(self):
+        self._watcher = None
+        if self.no_improvement_seconds or self.cancel is not None:
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        if self._watcher:
+            self._watcher.join()
+
+
+def _solve_model(model, shifts, variant_seed, num_workers=None, time_limit=DEFAULT_TIME_LIMIT,
+                 relative_gap=None, no_improvement_seconds=None, cancel=None):
+    """Solve a model that already carries its objective. Returns (status_str, slot_data_list, stats).
+
+    The search stops at time_limit seconds, once the objective is within relative_gap of the
+    best bound, after no_improvement_seconds without a better solution, or when `cancel` is
+    set, whichever comes first.
+    """
     # 5. Solve
     solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 30
+    solver.parameters.max_time_in_seconds = time_limit
     solver.parameters.random_seed = variant_seed
+    if num_workers:
+        solver.parameters.num_workers = num_workers
+    if relative_gap is not None:
+        solver.parameters.relative_gap_limit = relative_gap
+    if len(model.Proto().solution_hint.vars):
+        # Otherwise presolve may drop the hinted solution and the search has to repair it first
+        solver.parameters.keep_all_feasible_solutions_in_presolve = True
 
-    status = solver.Solve(model)
+    with _SolveMonitor(solver, no_improvement_seconds, cancel) as monitor:
+        status = solver.Solve(model, monitor)
+    stats = {
+        'status': 'CANCELLED' if monitor.cancelled and status == cp_model.UNKNOWN else solver.StatusName(status),
+        'wall_time': round(solver.WallTime(), 3),
+        'time_to_best': round(monitor.time_to_best, 3) if monitor.time_to_best is not None else None,
+        'stopped_early': monitor.stopped_early,
+    }
 
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
         slot_data = []
         for key, var in shifts.items():
             if solver.Value(var) == 1:
-                t_id, s_id, b_id, r_id, day, slot_num = key
-                start_str = TIME_SLOTS[slot_num]
-                if slot_num == 1:
-                    end_str = "09:30"
-                else:
-                    h, m = map(int, start_str.split(':'))
-                    end_str = f"{h + 1:02d}:{m:02d}"
+                t_id, s_id, b_id, rc, day, slot_num = key
                 slot_data.append({
-                    'day': day, 'start_time': start_str, 'end_time': end_str,
-                    'room_id': r_id, 'teacher_id': t_id, 'subject_id': s_id, 'batch_id': b_id,
+                    'day': day, 'slot_index': slot_num, 'start_time': TIME_SLOTS[slot_num], 'end_time': TIME_SLOT_ENDS[slot_num],
+                    'room_class': rc, 'teacher_id': t_id, 'subject_id': s_id, 'batch_id': b_id,
                 })
-        return 'success', slot_data, []
+        stats['objective'] = solver.ObjectiveValue()
+        stats['best_bound'] = solver.BestObjectiveBound()
+        return 'success', slot_data, stats
     else:
-        return 'infeasible', [], []
+        return 'infeasible', [], stats
 
 
-def generate_timetable(department_id, num_variants=3):
-    """Generate multiple timetable variants. Returns a dict with status, messages, and timetable_ids."""
+def _explain_infeasibility(built, time_limit=EXPLAIN_TIME_LIMIT):
+    """Find a small set of constraint groups that cannot hold together. Returns (descriptions, minimal) or None.
 
-    batches = list(StudentBatch.objects.filter(department_id=department_id))
-    subjects = list(Subject.objects.filter(department_id=department_id))
-    teachers = list(Teacher.objects.filter(department_id=department_id))
-    rooms = list(Room.objects.all())
-    pinned_slots = list(PinnedSlot.objects.filter(department_id=department_id))
-    unavailabilities = list(TeacherUnavailability.objects.filter(teacher__department_id=department_id))
-    unavailability_set = set((u.teacher_id, u.day, u.slot_index) for u in unavailabilities)
+    Frees every guard literal, solves under all of them as assumptions and reads back the
+    core CP-SAT used to prove infeasibility. The core is then shrunk by dropping one group
+    at a time and re-solving; it is minimal when every drop was decided within the time
+    limit. None means the conflict lies outside the guarded groups (e.g. availability alone).
+    """
+    deadline = time.perf_counter() + time_limit
+    model = built.model.Clone()
+    model.ClearHints()
+    variables = model.Proto().variables
+    for literal, _ in built.guards:
+        variables[literal.Index()].domain[0] = 0
+    by_index = {literal.Index(): (literal, info) for literal, info in built.guards}
+
+    def core(assumed):
+        """Indices of a sufficient subset of `assumed` if infeasible, False if feasible, None if undecided."""
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return None
+        model.ClearAssumptions()
+        model.AddAssumptions([by_index[i][0] for i in assumed])
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = remaining
+        solver.parameters.num_workers = 1  # cores are only reported by the single-worker search
+        status = solver.Solve(model)
+        if status == cp_model.INFEASIBLE:
+            return set(solver.SufficientAssumptionsForInfeasibility())
+        return False if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None
+
+    conflict = core(list(by_index))
+    if not conflict:
+        return None
+    conflict = sorted(conflict)
+    minimal = True
+    i = 0
+    while i < len(conflict):
+        trial = conflict[:i] + conflict[i + 1:]
+        smaller = core(trial)
+        if smaller:
+            conflict = [j for j in trial if j in smaller]
+        else:
+            minimal = minimal and smaller is False
+            i += 1
+    return [by_index[i][1] for i in conflict], minimal
+
+
+def _assign_rooms(slot_data, batches, room_classes, occupied=None):
+    """Replace each slot's solver room class with a concrete room_id, in place.
+
+    Single-phase slots carry the class the solver picked, and its rooms are handed out in
+    canonical order. Two-phase slots carry None: room sets are nested by capacity, so placing
+    the largest batches first, each in the smallest free room that fits, always succeeds when
+    the phase-1 capacity counts hold. `occupied` maps (day, start_time) to room ids already
+    taken by slots that keep their room. Returns False if some cell could not be matched.
+    """
+    batch_by_id = {b.id: b for b in batches}
+    rooms_by_kind = {
+        is_lab: [r for rc in room_classes if rc[0].is_lab == is_lab for r in rc] for is_lab in (False, True)
+    }
+
+    by_cell = defaultdict(list)
+    for sd in slot_data:
+        by_cell[(sd['day'], sd['start_time'])].append(sd)
+
+    for cell_key, cell in by_cell.items():
+        used = set(occupied.get(cell_key, ())) if occupied else set()
+        for sd in sorted(cell, key=lambda sd: -batch_by_id[sd['batch_id']].size):
+            batch = batch_by_id[sd['batch_id']]
+            rc = sd.pop('room_class')
+            candidates = room_classes[rc] if rc is not None else rooms_by_kind[batch.parent_batch_id is not None]
+            room = next((r for r in candidates if r.id not in used and r.capacity >= batch.size), None)
+            if room is None:
+                return False
+            used.add(room.id)
+            sd['room_id'] = room.id
+    return True
+
+
+def _persist_variants(dept, results):
+    """Replace the department's DRAFT timetables with the successful variants. Returns the new timetable ids.
+
+    Everything happens in one transaction, so a failure leaves the old drafts in place rather
+    than a half-written set. Slots are deleted and inserted with a handful of bulk statements
+    instead of one query per row.
+    """
+    created_ids = []
+    with transaction.atomic():
+        # Delete old DRAFTs (keep PUBLISHED); slots first, as one DELETE, instead of via the cascade
+        drafts = GeneratedTimetable.objects.filter(department=dept, status='DRAFT')
+        TimetableSlot.objects.filter(timetable__in=drafts).delete()
+        drafts.delete()
+
+        new_slots = []
+        for i, (status, slot_data, _) in enumerate(results):
+            if status == 'success':
+                tt = GeneratedTimetable.objects.create(
+                    department=dept, status='DRAFT', variant_number=i + 1
+                )
+                new_slots.extend(TimetableSlot(timetable=tt, **sd) for sd in slot_data)
+                created_ids.append(tt.id)
+        TimetableSlot.objects.bulk_create(new_slots, batch_size=500)
+    return created_ids
+
+
+def _solve_variants(built, configs, num_workers=None, **stop_criteria):
+    """Solve all variant configs at the same time on one built model. Returns one result per config, in order.
+
+    Each variant gets its own copy of the model with only the objective and solver
+    parameters swapped. The solve itself runs in C++ with the GIL released, so a thread
+    per variant keeps every core busy and wall-clock time is roughly that of the slowest
+    variant. Search workers are split across variants instead of oversubscribing the CPU.
+    Variants share their constraints, so the first one to prove infeasibility stops the rest.
+    num_workers caps the search workers of all variants together (default: every core).
+    """
+    if not configs:
+        return []
+    cores = num_workers or os.cpu_count() or 1
+    pool_size = max(1, min(len(configs), cores))
+    workers_per_variant = max(1, cores // len(configs))
+
+    cancel = threading.Event()
+
+    def solve(cfg):
+        if cancel.is_set():
+            return 'infeasible', [], {'status': 'CANCELLED', 'wall_time': 0.0, 'time_to_best': None, 'stopped_early': False}
+        variant_model = built.model.Clone()
+        _set_variant_objective(variant_model, built.shifts, built.gap_terms, cfg['weight'])
+        result = _solve_model(variant_model, built.shifts, cfg['seed'], workers_per_variant, cancel=cancel, **stop_criteria)
+        if result[2]['status'] == 'INFEASIBLE':
+            cancel.set()
+        return result
+
+    with ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='cp-sat-variant') as pool:
+        return list(pool.map(solve, configs))
+
+
+def estimate_time_limit(solver_mode, num_variables, num_batches, num_teachers):
+    """Pick a per-variant time limit from past SolverRuns of similar size, or None without enough history.
+
+    Similarity is distance in log space over (variables, batches, teachers). Each of the nearest
+    runs' time-to-best is scaled linearly to this model's variable count, and the slowest one,
+    with ESTIMATOR_SAFETY headroom, is the estimate.
+    """
+    runs = list(
+        SolverRun.objects.filter(solver_mode=solver_mode, time_to_best__isnull=False)
+        .order_by('-created_at', '-id')
+        .values_list('num_variables', 'num_batches', 'num_teachers', 'time_to_best')[:ESTIMATOR_HISTORY]
+    )
+    if len(runs) < ESTIMATOR_MIN_RUNS:
+        return None
+    features = (num_variables, num_batches, num_teachers)
+
+    def distance(run):
+        return sum((math.log1p(a) - math.log1p(b)) ** 2 for a, b in zip(run[:3], features))
+
+    nearest = sorted(runs, key=distance)[:ESTIMATOR_NEIGHBOURS]
+    needed = max(time_to_best * num_variables / max(n_vars, 1) for n_vars, _, _, time_to_best in nearest)
+    return max(MIN_TIME_LIMIT, math.ceil(needed * ESTIMATOR_SAFETY))
+
+
+def _record_solver_run(dept, solver_mode, built, batches, teachers, time_limit, results):
+    """Store this generation's instance features and outcome for estimate_time_limit().
+
+    Only the newest ESTIMATOR_HISTORY runs of each solver mode are kept; older ones are deleted.
+    """
+    stats = [result[2] for result in results]
+    if not stats:
+        return
+    rank = {'OPTIMAL': 0, 'FEASIBLE': 1}
+    times_to_best = [st['time_to_best'] for st in stats if st['time_to_best'] is not None]
+    SolverRun.objects.create(
+        department=dept,
+        solver_mode=solver_mode,
+        num_variables=len(built.shifts),
+        num_batches=len(batches),
+        num_teachers=len(teachers),
+        time_limit=time_limit,
+        wall_time=max(st['wall_time'] for st in stats),
+        time_to_best=max(times_to_best) if times_to_best else None,
+        status=max((st['status'] for st in stats), key=lambda name: rank.get(name, 2)),
+    )
+    stale = SolverRun.objects.filter(solver_mode=solver_mode).order_by('-created_at', '-id').values_list('id', flat=True)[ESTIMATOR_HISTORY:]
+    SolverRun.objects.filter(id__in=list(stale)).delete()
+
+
+def generate_timetable(department_id, num_variants=3, solver_mode='single', warm_start_from='published',
+                       time_limit='auto', relative_gap=None, no_improvement_seconds=None, reserved=None, num_workers=None):
+    """Generate multiple timetable variants. Returns a dict with status, messages, timetable_ids and phase timings.
+
+    solver_mode is one of SOLVER_MODES: 'single' decides time and room class together, 'two_phase'
+    decides times first and then matches rooms per cell (far fewer variables, same objective).
+    warm_start_from is 'published', a timetable id (e.g. a draft) or None; that timetable's slots
+    are passed to CP-SAT as solution hints.
+    time_limit is seconds per variant, or 'auto' to estimate it from past runs; either way it is
+    capped by the department's solver_time_budget. relative_gap and no_improvement_seconds stop
+    a variant early once it is that close to the bound or has stopped improving.
+    Rooms booked by other departments' published timetables are never used; `reserved`
+    ((day, start_time) -> room ids, as from _booked_rooms) replaces that set, which is how
+    generate_campus hands each department its share. num_workers caps the search workers.
+    """
+    two_phase = solver_mode == 'two_phase'
+    timings = {}
+
+    with _timed(timings, 'load'):
+        batches, subjects, teachers, rooms, pinned_slots, unavailability_set = _load_inputs(department_id)
+        # Read before the old drafts are deleted, since a draft can be the warm-start source
+        warm_tt, warm_rows = _load_warm_start(department_id, warm_start_from) if warm_start_from else (None, [])
+        if reserved is None:
+            reserved = _published_elsewhere([department_id])
 
     if not teachers or not subjects or not batches:
         return {
@@ -299,48 +926,466 @@ def generate_timetable(department_id, num_variants=3):
             'timetable_ids': []
         }
 
+    dept = Department.objects.get(id=department_id)
+
+    # Same inputs and settings as an earlier run: hand back its variants instead of solving again
+    with _timed(timings, 'fingerprint'):
+        fingerprint = _input_fingerprint(
+            batches, subjects, teachers, rooms, pinned_slots, unavailability_set, reserved,
+            [num_variants, solver_mode, warm_start_from, warm_tt.id if warm_tt else None,
+             time_limit, relative_gap, no_improvement_seconds, dept.solver_time_budget],
+        )
+    cached = _cached_generation(dept, fingerprint, timings)
+    if cached:
+        return cached
+
     # Pre-solve diagnostics
-    diagnostics = run_diagnostics(department_id, batches, subjects, teachers, rooms)
+    from .availability import Availability
+    from .feasibility import check_feasibility
+    with _timed(timings, 'diagnostics'):
+        availability = Availability(teachers, subjects, unavailability_set)
+        diagnostics = run_diagnostics(department_id, batches, subjects, teachers, rooms, availability)
+        proofs, warnings = check_feasibility(
+            batches, subjects, teachers, rooms, pinned_slots, unavailability_set, availability, reserved,
+        )
+        diagnostics.extend(warnings)
+        # Rooms held elsewhere alone? Then another share of the rooms may still fit (see generate_campus)
+        held_rooms = bool(proofs) and any(reserved.values()) and not check_feasibility(
+            batches, subjects, teachers, rooms, pinned_slots, unavailability_set, availability,
+        )[0]
+    if proofs:
+        # Each proof is a necessary condition of the model failing, so solving can only end infeasible
+        if held_rooms:
+            proofs.append("❌ With every room free these checks pass: rooms booked by other departments leave too few for this department.")
+        return {
+            'status': 'infeasible',
+            'messages': diagnostics + proofs + ["❌ These constraints can't all be met, so the solver was skipped and the existing drafts were kept. Fix the items above and generate again."],
+            'timetable_ids': [],
+            'timings': timings,
+            'warm_start': None,
+            'solver': None,
+            'conflict': {'minimal': False, 'constraints': [{'type': 'room_capacity', 'message': proofs[-1]}]} if held_rooms else None,
+        }
 
-    dept = Department.objects.get(id=department_id)
-    # Delete old DRAFTs (keep PUBLISHED)
-    GeneratedTimetable.objects.filter(department=dept, status='DRAFT').delete()
+    configs = VARIANT_CONFIGS[:min(num_variants, len(VARIANT_CONFIGS))]
 
-    variant_configs = [
-        {'seed': 42, 'weight': 1},
-        {'seed': 137, 'weight': 2},
-        {'seed': 7919, 'weight': 3},
-    ]
+    # Variables and constraints are identical for every variant, so the model is built once
+    with _timed(timings, 'build'):
+        built = _build_model(
+            batches, subjects, teachers, rooms, pinned_slots, unavailability_set,
+            two_phase=two_phase, reserved=reserved, availability=availability,
+        )
+        warm_start = None
+        if warm_tt:
+            kept = _add_solution_hints(built, warm_rows, subjects, batches, rooms, two_phase=two_phase)
+            warm_start = {'timetable_id': warm_tt.id, 'hints_kept': kept, 'hints_total': len(warm_rows)}
+    budget = dept.solver_time_budget or DEFAULT_TIME_LIMIT
+    if time_limit == 'auto':
+        estimate = estimate_time_limit(solver_mode, len(built.shifts), len(batches), len(teachers))
+        limit, limit_source = (min(budget, estimate), 'estimate') if estimate else (budget, 'budget')
+    else:
+        limit, limit_source = min(budget, time_limit), 'request'
+    with _timed(timings, 'solve'):
+        results = _solve_variants(
+            built, configs, num_workers, time_limit=limit, relative_gap=relative_gap, no_improvement_seconds=no_improvement_seconds
+        )
+    _record_solver_run(dept, solver_mode, built, batches, teachers, limit, results)
+    solver = {
+        'time_limit': limit,
+        'time_limit_source': limit_source,
+        'relative_gap': relative_gap,
+        'no_improvement_seconds': no_improvement_seconds,
+        'variables': len(built.shifts),
+        'constraints': len(built.model.Proto().constraints),
+        'variants': [stats for _, _, stats in results],
+    }
+    with _timed(timings, 'rooms'):
+        room_classes = _room_classes(rooms)
+        results = [
+            (status, slot_data, stats) if status != 'success' or _assign_rooms(slot_data, batches, room_classes, reserved)
+            else ('infeasible', [], stats)
+            for status, slot_data, stats in results
+        ]
 
-    created_ids = []
-    all_failed = True
+    with _timed(timings, 'persist'):
+        created_ids = _persist_variants(dept, results)
+    all_failed = not created_ids
 
-    for i in range(min(num_variants, len(variant_configs))):
-        cfg = variant_configs[i]
-        status, slot_data, _ = _build_and_solve(
-            department_id, batches, subjects, teachers, rooms, pinned_slots, unavailability_set,
-            variant_seed=cfg['seed'], variant_weight=cfg['weight']
+    warm_start_messages = []
+    if warm_start:
+        source = "published timetable" if warm_tt.status == 'PUBLISHED' else f"draft variant {warm_tt.variant_number}"
+        warm_start_messages.append(
+            f"♻️ Warm-started from the {source}: {warm_start['hints_kept']} of {warm_start['hints_total']} previous assignments kept as hints."
         )
 
-        if status == 'success':
-            all_failed = False
-            tt = GeneratedTimetable.objects.create(
-                department=dept, status='DRAFT', variant_number=i + 1
-            )
-            for sd in slot_data:
-                TimetableSlot.objects.create(timetable=tt, **sd)
-            created_ids.append(tt.id)
+    conflict = None
+    if all_failed and any(stats['status'] == 'INFEASIBLE' for stats in solver['variants']):
+        with _timed(timings, 'explain'):
+            explanation = _explain_infeasibility(built)
+        if explanation:
+            constraints, minimal = explanation
+            conflict = {'minimal': minimal, 'constraints': constraints}
 
     if all_failed:
-        diagnostics.append("❌ Solver could not find a feasible schedule for any variant. Review the diagnostics above and adjust constraints.")
+        if conflict:
+            diagnostics.append(
+                "❌ Within teachers' available hours, these constraints contradict each other"
+                + (" (drop any one and the rest can be met):" if conflict['minimal'] else ":")
+            )
+            diagnostics.extend(f"   • {c['message']}" for c in conflict['constraints'])
+        elif any(stats['status'] == 'UNKNOWN' for stats in solver['variants']):
+            diagnostics.append(f"⏱️ No schedule was found within the {limit:g}s time limit. Raise time_limit or the department's solver budget.")
+        else:
+            diagnostics.append("❌ Solver could not find a feasible schedule for any variant. Review the diagnostics above and adjust constraints.")
         return {
             'status': 'infeasible',
-            'messages': diagnostics,
-            'timetable_ids': []
+            'messages': diagnostics + warm_start_messages,
+            'timetable_ids': [],
+            'timings': timings,
+            'warm_start': warm_start,
+            'solver': solver,
+            'conflict': conflict,
+        }
+
+    result = {
+        'status': 'success',
+        'messages': (diagnostics if diagnostics else [f"✅ Generated {len(created_ids)} timetable variant(s) successfully!"]) + warm_start_messages,
+        'timetable_ids': created_ids,
+        'timings': timings,
+        'warm_start': warm_start,
+        'solver': solver,
+        'conflict': None,
+        'cached': False,
+    }
+    generation_cache.put(dept.id, fingerprint, {
+        'result': result, 'variants': results, 'versions': _draft_versions(dept, created_ids),
+    })
+    return result
+
+
+def _room_demand(department_ids):
+    """Per department and room kind (is_lab): weekly lectures, batch groups and the cells groups are pinned to.
+
+    A theory group is one main batch; a lab group is all sub-batches of one parent, which hold
+    their labs at the same time and so need their rooms in the same cell. Groups map a group
+    id to its batch sizes, largest first; pinned maps (day, start_time) to group ids.
+    """
+    demand = {
+        d_id: {is_lab: {'lectures': 0, 'groups': defaultdict(list), 'pinned': defaultdict(set)} for is_lab in (False, True)}
+        for d_id in department_ids
+    }
+    batches = StudentBatch.objects.filter(department_id__in=department_ids)
+    for b_id, d_id, parent_id, size in batches.values_list('id', 'department_id', 'parent_batch_id', 'size'):
+        demand[d_id][parent_id is not None]['groups'][parent_id or b_id].append(size)
+    subjects = Subject.objects.filter(department_id__in=department_ids, batch__isnull=False, teacher__isnull=False)
+    for d_id, parent_id, lectures in subjects.values_list('department_id', 'batch__parent_batch_id', 'weekly_lectures'):
+        demand[d_id][parent_id is not None]['lectures'] += lectures
+    pins = PinnedSlot.objects.filter(department_id__in=department_ids, subject__batch__isnull=False)
+    for d_id, day, slot, b_id, parent_id in pins.values_list('department_id', 'day', 'slot_index', 'subject__batch_id', 'subject__batch__parent_batch_id'):
+        if 0 <= slot < SLOTS_PER_DAY:
+            demand[d_id][parent_id is not None]['pinned'][(day, TIME_SLOTS[slot])].add(parent_id or b_id)
+    for kinds in demand.values():
+        for kind in kinds.values():
+            kind['groups'] = dict(sorted(
+                ((group_id, sorted(sizes, reverse=True)) for group_id, sizes in kind['groups'].items()),
+                key=lambda item: item[1], reverse=True,
+            ))
+    return demand
+
+
+def _seat(sizes, free):
+    """Pick the smallest free room for each size, largest size first. Returns the rooms, or None if one doesn't fit."""
+    picked = []
+    for size in sizes:
+        room = next((r for r in free if r.capacity >= size and r not in picked), None)
+        if room is None:
+            return None
+        picked.append(room)
+    return picked
+
+
+def _room_quotas(demand, rooms, reserved):
+    """Split the free rooms of every cell between departments. Returns {department_id: rooms held by the others}.
+
+    Cell by cell, groups pinned to the cell are seated first. The remaining rooms of each kind
+    go out one batch group at a time (see _room_demand) to the department with the highest
+    weekly lectures / (room-cells already given + 1) that still has a group which fits in what
+    is left (D'Hondt apportionment). Over the week each department's share follows its demand,
+    and no cell gives a department more rooms than it has batches to put in them. Rooms left
+    over once every group is seated are held for all departments, so no two shares overlap.
+    """
+    given = Counter()                      # (department_id, is_lab) -> room-cells so far
+    allotted = {d_id: defaultdict(set) for d_id in demand}
+    spare = defaultdict(set)               # cell -> rooms given to no department
+    for day in DAYS:
+        for start in TIME_SLOTS:
+            cell = (day, start)
+            for is_lab in (False, True):
+                free = sorted(
+                    (r for r in rooms if r.is_lab == is_lab and r.id not in reserved.get(cell, ())),
+                    key=lambda r: (r.capacity, r.name, r.id),
+                )
+                unseated = {d_id: dict(kinds[is_lab]['groups']) for d_id, kinds in demand.items() if kinds[is_lab]['lectures']}
+
+                def give(d_id, group_id):
+                    nonlocal free
+                    seated = _seat(unseated[d_id].pop(group_id), free)
+                    if seated:
+                        given[(d_id, is_lab)] += len(seated)
+                        allotted[d_id][cell].update(r.id for r in seated)
+                        free = [r for r in free if r not in seated]
+
+                for d_id in unseated:
+                    for group_id in demand[d_id][is_lab]['pinned'].get(cell, ()):
+                        if group_id in unseated[d_id]:
+                            give(d_id, group_id)
+                unseated = {d_id: groups for d_id, groups in unseated.items() if groups}
+                while free and unseated:
+                    winner = max(unseated, key=lambda d_id: demand[d_id][is_lab]['lectures'] / (given[(d_id, is_lab)] + 1))
+                    give(winner, next(iter(unseated[winner])))
+                    if not unseated[winner]:
+                        del unseated[winner]
+                spare[cell].update(r.id for r in free)
+
+    quotas = {}
+    for d_id in demand:
+        held = defaultdict(set, {cell: set(room_ids) for cell, room_ids in reserved.items()})
+        for cell, room_ids in spare.items():
+            held[cell] |= room_ids
+        for other_id, cells in allotted.items():
+            if other_id != d_id:
+                for cell, room_ids in cells.items():
+                    held[cell] |= room_ids
+        quotas[d_id] = held
+    return quotas
+
+
+def generate_campus(department_ids=None, **options):
+    """Generate every department's variants at once without any two of them sharing a room. Returns a dict.
+
+    Rooms held by the published timetables of departments outside the run are reserved. The
+    rest are split per cell with _room_quotas, so each department is still its own model and
+    the departments are solved in parallel; every room of a cell is in at most one share, so
+    any mix of their variants can be published. A department that fails for lack of rooms in
+    its share is then re-solved, one at a time, against the rooms the others actually used.
+    `options` are passed on to generate_timetable().
+    """
+    timings = {}
+    with _timed(timings, 'load'):
+        departments = Department.objects.order_by('id')
+        if department_ids is not None:
+            departments = departments.filter(id__in=department_ids)
+        departments = list(departments)
+        ids = [d.id for d in departments]
+        rooms = list(Room.objects.all())
+        external = _published_elsewhere(ids)
+
+    if not departments:
+        return {'status': 'error', 'messages': ["No departments to schedule."], 'timetable_ids': [], 'departments': {}}
+
+    with _timed(timings, 'quotas'):
+        quotas = _room_quotas(_room_demand(ids), rooms, external)
+
+    cores = os.cpu_count() or 1
+    pool_size = max(1, min(len(departments), cores))
+
+    def run(dept, reserved, num_workers):
+        try:
+            return generate_timetable(dept.id, reserved=reserved, num_workers=num_workers, **options)
+        finally:
+            connection.close()
+
+    with _timed(timings, 'solve'):
+        with ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='campus-department') as pool:
+            futures = [pool.submit(run, dept, quotas[dept.id], max(1, cores // pool_size)) for dept in departments]
+            results = {dept.id: future.result() for dept, future in zip(departments, futures)}
+
+    # The proof or the conflict explanation tells whether a larger room share could help
+    def room_bound(result):
+        if result['status'] != 'infeasible':
+            return False
+        conflict = result.get('conflict')
+        if conflict:
+            return any(c['type'] == 'room_capacity' for c in conflict['constraints'])
+        return bool(result.get('solver'))  # a solver proof without an explanation may be the rooms
+
+    retried = []
+    with _timed(timings, 'retry'):
+        for dept in departments:
+            if room_bound(results[dept.id]):
+                others = GeneratedTimetable.objects.filter(department_id__in=[i for i in ids if i != dept.id], status='DRAFT')
+                reserved = _booked_rooms(others)
+                for cell, room_ids in external.items():
+                    reserved[cell] |= room_ids
+                results[dept.id] = generate_timetable(dept.id, reserved=reserved, **options)
+                retried.append(dept)
+
+    messages = []
+    for dept in departments:
+        result = results[dept.id]
+        if result['status'] == 'success':
+            messages.append(f"✅ {dept.name}: {len(result['timetable_ids'])} variant(s).")
+        else:
+            reason = next((m for m in result['messages'] if m.startswith(('❌', '⏱️'))), result['status'])
+            messages.append(f"❌ {dept.name}: {reason}")
+    messages.extend(
+        f"♻️ {dept.name} did not fit its share of the rooms and was re-solved against the rooms the others left free."
+        for dept in retried
+    )
+    succeeded = [d_id for d_id, result in results.items() if result['status'] == 'success']
+    return {
+        'status': 'success' if len(succeeded) == len(departments) else 'partial' if succeeded else 'infeasible',
+        'messages': messages,
+        'timetable_ids': [tt_id for d_id in ids for tt_id in results[d_id]['timetable_ids']],
+        'departments': {d_id: results[d_id] for d_id in ids},
+        'timings': timings,
+    }
+
+
+def repair_timetable(timetable_id, teacher_ids=(), batch_ids=(), room_ids=()):
+    """Re-place only the lectures touched by changed inputs, keeping every other slot where it is.
+
+    The neighbourhood starts from the given teachers, batches and rooms, plus the owners of any
+    slot that is no longer allowed or of any subject whose lecture count no longer matches.
+    Slots outside it are fixed; inside it the variant's objective is re-optimised with a
+    penalty on every lecture that moves. If that is infeasible the neighbourhood widens to the
+    teachers and batches sharing subjects with it, then to the whole timetable. Slots are
+    updated in place. Returns a dict with status, messages, slot move counts and phase timings.
+    """
+    timings = {}
+
+    with _timed(timings, 'load'):
+        tt = GeneratedTimetable.objects.get(id=timetable_id)
+        batches, subjects, teachers, rooms, pinned_slots, unavailability_set = _load_inputs(tt.department_id)
+        slots = list(tt.slots.all())
+        reserved = _published_elsewhere([tt.department_id])
+
+    with _timed(timings, 'build'):
+        built = _build_model(batches, subjects, teachers, rooms, pinned_slots, unavailability_set, reserved=reserved)
+        room_classes = _room_classes(rooms)
+        class_of_room = {r.id: i for i, rc in enumerate(room_classes) for r in rc}
+        group_of = {b.id: b.parent_batch_id or b.id for b in batches}
+        keys = _slot_keys(built, [(sl.teacher_id, sl.subject_id, sl.batch_id, sl.room_id, sl.day, sl.slot_index) for sl in slots], rooms)
+        # A room or teacher booked twice in one cell (e.g. after manual edits), or a room another
+        # department has since published a timetable in, is broken as well
+        booked = set()
+        for i, sl in enumerate(slots):
+            room_cell, teacher_cell = ('room', sl.room_id, sl.day, sl.start_time), ('teacher', sl.teacher_id, sl.day, sl.start_time)
+            if room_cell in booked or teacher_cell in booked or sl.room_id in reserved.get((sl.day, sl.start_time.strftime("%H:%M")), ()):
+                keys[i] = None
+            booked.update((room_cell, teacher_cell))
+        previous = {key for key in keys if key is not None}
+
+        seed_teachers = set(teacher_ids)
+        seed_groups = {group_of.get(b_id, b_id) for b_id in batch_ids}
+        seed_classes = {class_of_room[r_id] for r_id in room_ids if r_id in class_of_room}
+        for sl, key in zip(slots, keys):
+            if key is None:
+                seed_teachers.add(sl.teacher_id)
+                seed_groups.add(group_of.get(sl.batch_id, sl.batch_id))
+        for s in _miscounted_subjects(previous, subjects):
+            seed_teachers.add(s.teacher_id)
+            seed_groups.add(group_of[s.batch_id])
+
+    if not (seed_teachers or seed_groups or seed_classes):
+        return {
+            'status': 'success',
+            'messages': [f"✅ Variant {tt.variant_number} already satisfies the current constraints; nothing to repair."],
+            'timetable_id': tt.id,
+            'slots_moved': 0, 'slots_added': 0, 'slots_removed': 0, 'slots_unchanged': len(slots),
+            'neighbourhood': None,
+            'timings': timings,
         }
 
+    def in_neighbourhood(key, hood):
+        return hood is None or key[0] in hood[0] or group_of[key[2]] in hood[1] or key[3] in hood[2]
+
+    affected = (seed_teachers, seed_groups, seed_classes)
+    widened = (
+        seed_teachers | {s.teacher_id for s in subjects if s.teacher_id and group_of.get(s.batch_id) in seed_groups},
+        seed_groups | {group_of[s.batch_id] for s in subjects if s.batch_id and s.teacher_id in seed_teachers},
+        seed_classes | {key[3] for key in previous if in_neighbourhood(key, affected)},
+    )
+    neighbourhoods = [('affected', affected), ('widened', widened), ('full', None)]
+
+    cfg = VARIANT_CONFIGS[min(max(tt.variant_number, 1), len(VARIANT_CONFIGS)) - 1]
+    status, slot_data = 'infeasible', []
+    with _timed(timings, 'solve'):
+        for level, hood in neighbourhoods:
+            model = built.model.Clone()
+            free = set()
+            for key in previous:
+                if in_neighbourhood(key, hood):
+                    free.add(key)
+                else:
+                    model.Add(built.shifts[key] == 1)
+            _set_variant_objective(model, built.shifts, built.gap_terms, cfg['weight'])
+            # O1 terms come first, in shift order: staying put is worth more than any slot preference
+            objective = model.Proto().objective
+            for i, key in enumerate(built.shifts):
+                if key in free:
+                    objective.coeffs[i] -= REPAIR_MOVE_PENALTY
+            status, slot_data, _ = _solve_model(model, built.shifts, cfg['seed'], time_limit=REPAIR_TIME_LIMIT)
+            if status == 'success':
+                break
+
+    if status == 'success':
+        with _timed(timings, 'rooms'):
+            solution = {
+                (sd['teacher_id'], sd['subject_id'], sd['batch_id'], sd['room_class'], sd['day'], sd['slot_index']): sd
+                for sd in slot_data
+            }
+            unchanged, dropped, matched = [], [], set()
+            for sl, key in zip(slots, keys):
+                if key in solution and key not in matched:
+                    matched.add(key)
+                    unchanged.append(sl)
+                else:
+                    dropped.append(sl)
+            new_data = [sd for key, sd in solution.items() if key not in matched]
+            # Slots that stay keep their room; new ones take whatever is free in their room class
+            occupied = defaultdict(set, {cell: set(room_ids) for cell, room_ids in reserved.items()})
+            for sl in unchanged:
+                occupied[(sl.day, sl.start_time.strftime("%H:%M"))].add(sl.room_id)
+            if not _assign_rooms(new_data, batches, room_classes, occupied):
+                status = 'infeasible'
+
+    if status != 'success':
+        return {
+            'status': 'infeasible',
+            'messages': ["❌ Could not repair this timetable even with every slot free. Review the constraints or regenerate."],
+            'timetable_id': tt.id,
+            'timings': timings,
+        }
+
+    with _timed(timings, 'persist'):
+        with transaction.atomic():
+            TimetableSlot.objects.filter(id__in=[sl.id for sl in dropped]).delete()
+            TimetableSlot.objects.bulk_create([TimetableSlot(timetable=tt, **sd) for sd in new_data])
+            bump_versions([tt.id])
+
+    # A lecture that left one cell and landed in another counts once, as moved
+    added_by_subject = Counter(sd['subject_id'] for sd in new_data)
+    moved = sum(min(n, added_by_subject[s_id]) for s_id, n in Counter(sl.subject_id for sl in dropped).items())
+
+    messages = [f"✅ Repaired variant {tt.variant_number}: {moved} slot(s) moved, {len(unchanged)} unchanged."]
+    if level == 'widened':
+        messages.insert(0, "⚠️ The affected slots could not be re-placed on their own; the repair was widened to teachers and batches sharing their subjects.")
+    elif level == 'full':
+        messages.insert(0, "⚠️ The affected slots could not be re-placed on their own; the whole timetable was re-optimised.")
     return {
         'status': 'success',
-        'messages': diagnostics if diagnostics else [f"✅ Generated {len(created_ids)} timetable variant(s) successfully!"],
-        'timetable_ids': created_ids
+        'messages': messages,
+        'timetable_id': tt.id,
+        'slots_moved': moved,
+        'slots_added': len(new_data) - moved,
+        'slots_removed': len(dropped) - moved,
+        'slots_unchanged': len(unchanged),
+        'neighbourhood': {
+            'level': level,
+            'teacher_ids': sorted(hood[0]) if hood else None,
+            'batch_ids': sorted(hood[1]) if hood else None,
+            'free_slots': len(free),
+        },
+        'timings': timings,
     }
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Room, Teacher, Subject, StudentBatch, Department, GeneratedTimetable, TimetableSlot, PinnedSlot, TeacherUnavailability
+from .models import Room, Teacher, Subject, StudentBatch, Department, GeneratedTimetable, TimetableSlot, PinnedSlot, TeacherUnavailability, GenerationJob
+from .grid import slot_index
 
 class RoomSerializer(serializers.ModelSerializer):
     class Meta:
@@ -57,6 +58,7 @@ class GeneratedTimetableSerializer(serializers.ModelSerializer):
     class Meta:
         model = GeneratedTimetable
         fields = '__all__'
+        read_only_fields = ['version', 'updated_at']
 
 class TimetableSlotSerializer(serializers.ModelSerializer):
     room_name = serializers.CharField(source='room.name', read_only=True)
@@ -67,10 +69,33 @@ class TimetableSlotSerializer(serializers.ModelSerializer):
     class Meta:
         model = TimetableSlot
         fields = '__all__'
+        read_only_fields = ['slot_index']
+
+    def validate(self, attrs):
+        # Kept in step with start_time so cell lookups can use the (timetable, day, slot_index) index
+        if 'start_time' in attrs:
+            index = slot_index(attrs['start_time'])
+            attrs['slot_index'] = index if index >= 0 else None
+        return attrs
 
 class TeacherUnavailabilitySerializer(serializers.ModelSerializer):
     teacher_name = serializers.CharField(source='teacher.name', read_only=True)
 
     class Meta:
         model = TeacherUnavailability
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class GenerationJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.IntegerField(source='id', read_only=True)
+    messages = serializers.SerializerMethodField()
+    timetable_ids = serializers.SerializerMethodField()
+
+    class Meta:
+        model = GenerationJob
+        fields = ['job_id', 'department', 'status', 'options', 'messages', 'timetable_ids', 'error', 'result', 'created_at', 'started_at', 'finished_at']
+
+    def get_messages(self, obj):
+        return obj.result.get('messages', [])
+
+    def get_timetable_ids(self, obj):
+        return obj.result.get('timetable_ids', [])
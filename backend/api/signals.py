@@ -0,0 +1,82 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .availability import availability_cache
+from .generation_cache import generation_cache
+from .models import Department, StudentBatch, Teacher, TeacherUnavailability, Subject, Room, PinnedSlot, TimetableSlot, GeneratedTimetable
+from .pdf import pdf_cache
+from .snapshot_cache import bump_versions
+
+
+@receiver([post_save, post_delete], sender=Department)
+def invalidate_department(sender, instance, **kwargs):
+    generation_cache.invalidate(instance.id)
+
+
+@receiver([post_save, post_delete], sender=StudentBatch)
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=PinnedSlot)
+def invalidate_owning_department(sender, instance, **kwargs):
+    generation_cache.invalidate(instance.department_id)
+
+
+def _teacher_departments(teacher_id):
+    """Ids of the teacher's own department and of every department whose subjects they teach."""
+    ids = set(Subject.objects.filter(teacher_id=teacher_id).values_list('department_id', flat=True))
+    ids.update(Teacher.objects.filter(id=teacher_id).values_list('department_id', flat=True))
+    ids.discard(None)
+    return ids
+
+
+# A teacher's window, daily cap and blocks shape every department they teach for. On delete
+# the subjects lose their teacher (SET_NULL) without signals, so look them up beforehand.
+@receiver(post_save, sender=Teacher)
+@receiver(pre_delete, sender=Teacher)
+def invalidate_teacher_departments(sender, instance, **kwargs):
+    for department_id in _teacher_departments(instance.id):
+        generation_cache.invalidate(department_id)
+
+
+@receiver([post_save, post_delete], sender=TeacherUnavailability)
+def invalidate_unavailability_departments(sender, instance, **kwargs):
+    for department_id in _teacher_departments(instance.teacher_id):
+        generation_cache.invalidate(department_id)
+
+
+# A department's availability masks include teachers of other departments who teach its
+# subjects, so a change to any of these drops every department's masks
+@receiver([post_save, post_delete], sender=Department)
+@receiver([post_save, post_delete], sender=StudentBatch)
+@receiver([post_save, post_delete], sender=Teacher)
+@receiver([post_save, post_delete], sender=Subject)
+@receiver([post_save, post_delete], sender=TeacherUnavailability)
+def invalidate_availability(sender, instance, **kwargs):
+    availability_cache.invalidate()
+
+
+# Rooms are shared by every department
+@receiver([post_save, post_delete], sender=Room)
+def invalidate_all(sender, instance, **kwargs):
+    generation_cache.invalidate()
+
+
+# Slot payloads show teacher, room, subject and batch names: a change to one (or its
+# deletion, which cascades to slots) makes every timetable showing it a new version
+@receiver(post_save, sender=StudentBatch)
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=Subject)
+@receiver(post_save, sender=Room)
+@receiver(pre_delete, sender=StudentBatch)
+@receiver(pre_delete, sender=Teacher)
+@receiver(pre_delete, sender=Subject)
+@receiver(pre_delete, sender=Room)
+def bump_showing_timetables(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    field = {StudentBatch: 'batch_id', Teacher: 'teacher_id', Subject: 'subject_id', Room: 'room_id'}[sender]
+    bump_versions(TimetableSlot.objects.filter(**{field: instance.id}).values('timetable_id'))
+
+
+@receiver(post_delete, sender=GeneratedTimetable)
+def drop_cached_pdfs(sender, instance, **kwargs):
+    pdf_cache.invalidate(instance.id)
@@ -0,0 +1,67 @@
+"""Per-process cache of serialized slot lists of published timetables, keyed by (timetable, version, filter).
+
+GeneratedTimetable.version goes up whenever a timetable's slots, or a name shown in them,
+change (bump_versions below), so a key can never serve stale slots: an edit just makes the
+old version's entries unreachable and they are evicted. The cache holds rendered JSON bytes
+and is bounded by their total size, least recently used evicted first.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import GeneratedTimetable
+
+
+def bump_versions(timetable_ids):
+    """Advance version and updated_at of the given timetables (one UPDATE)."""
+    GeneratedTimetable.objects.filter(id__in=timetable_ids).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+class SnapshotCache:
+    def __init__(self):
+        self._entries = OrderedDict()  # (timetable_id, version, filter) -> JSON bytes
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, 'SNAPSHOT_CACHE_BYTES', 16 * 1024 * 1024)
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        timetable_id, version = key[:2]
+        with self._lock:
+            # Older versions of the same timetable can never be asked for again
+            for old in [k for k in self._entries if (k[0] == timetable_id and k[1] < version) or k == key]:
+                self._size -= len(self._entries.pop(old))
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._size -= len(self._entries.popitem(last=False)[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def size(self):
+        """Bytes held."""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+snapshot_cache = SnapshotCache()
@@ -1,3 +1,1419 @@
-from django.test import TestCase
+import datetime
+import importlib
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from unittest import skipUnless
+from unittest.mock import Mock, patch
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .benchmarks import CampusSpec, build_campus, run_benchmark, synthetic_campus
+from .availability import Availability, availability_cache, department_availability
+from .jobs import WORKER_ID, _run_job, submit_generation_job
+from .models import Department, StudentBatch, Teacher, Subject, Room, GeneratedTimetable, GenerationJob, TimetableSlot, PinnedSlot, TeacherUnavailability, SolverRun
+from .grid import TimetableGrid, slot_times
+from .pdf import pdf_cache, prerender, render_timetable_pdf
+from .generation_cache import generation_cache
+from .scheduler import (
+    DAYS, DEFAULT_TIME_LIMIT, MIN_TIME_LIMIT, SLOTS_PER_DAY, TIME_SLOTS, VARIANT_CONFIGS, _SolveMonitor, _add_solution_hints, _assign_rooms, _build_model, _load_inputs, _load_warm_start,
+    _record_solver_run, _room_classes, _room_demand, _room_quotas, _set_variant_objective, _slot_keys, _solve_model, _solve_variants, estimate_time_limit,
+    generate_campus, generate_timetable, repair_timetable,
+)
+from .serializers import TimetableSlotSerializer
+from .snapshot_cache import bump_versions, snapshot_cache
+from .urls import router
+from .views import TimetableSlotViewSet
+
+
+def make_timetable():
+    """A one-department timetable with a lab sub-batch and three slots. Returns (timetable, objects dict)."""
+    dept = Department.objects.create(name="Test Dept")
+    batch = StudentBatch.objects.create(name="SY A", size=60, department=dept)
+    lab = StudentBatch.objects.create(name="SY A - Lab A", size=30, department=dept, parent_batch=batch)
+    teacher = Teacher.objects.create(name="T One", department=dept)
+    subject = Subject.objects.create(name="Maths", weekly_lectures=3, department=dept, batch=batch, teacher=teacher)
+    room = Room.objects.create(name="R101", capacity=60)
+    tt = GeneratedTimetable.objects.create(department=dept)
+    for day, slot, start, end in [('MON', 0, "07:30", "08:30"), ('MON', 2, "10:00", "11:00"), ('TUE', 1, "08:30", "09:30")]:
+        TimetableSlot.objects.create(
+            timetable=tt, day=day, slot_index=slot, start_time=start, end_time=end,
+            room=room, teacher=teacher, subject=subject, batch=batch,
+        )
+    return tt, {'dept': dept, 'batch': batch, 'lab': lab, 'teacher': teacher, 'subject': subject, 'room': room}
+
+
+def make_department(name="Gen", subjects=2, lectures=2, rooms=1):
+    """A small schedulable department: one 60-student batch, `subjects` theory subjects of `lectures`
+    a week, each with a teacher of its own, and `rooms` theory rooms. Returns an objects dict."""
+    dept = Department.objects.create(name=name)
+    batch = StudentBatch.objects.create(name=f"{name} A", size=60, department=dept)
+    teachers = [Teacher.objects.create(name=f"{name} T{i + 1}", department=dept) for i in range(subjects)]
+    return {
+        'dept': dept, 'batch': batch, 'teachers': teachers,
+        'subjects': [
+            Subject.objects.create(name=f"S{i + 1}", weekly_lectures=lectures, department=dept, batch=batch, teacher=t)
+            for i, t in enumerate(teachers)
+        ],
+        'rooms': [Room.objects.create(name=f"{name} R{i + 1}", capacity=60) for i in range(rooms)],
+    }
+
+
+def generate(department, **options):
+    """generate_timetable() with test-sized defaults: one variant, no warm start, a 5s limit."""
+    return generate_timetable(department.id, **{'num_variants': 1, 'warm_start_from': None, 'time_limit': 5, **options})
+
+
+@skipUnless(connection.vendor == 'sqlite', "plans are asserted in SQLite's EXPLAIN QUERY PLAN format")
+class TimetableSlotQueryPlanTests(TestCase):
+    """The hot slot filters are answered from the composite (timetable, ...) indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tt, cls.objs = make_timetable()
+        cls.staff = User.objects.create_user('admin', password='x', is_staff=True)
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f"USING INDEX {index_name}", plan)
+
+    def test_cell_lookup(self):
+        self.assertUsesIndex(
+            TimetableSlot.objects.filter(timetable=self.tt, day='MON', slot_index=2), 'slot_timetable_cell_idx'
+        )
+
+    def test_teacher_filter(self):
+        self.assertUsesIndex(
+            TimetableSlot.objects.filter(timetable=self.tt, teacher=self.objs['teacher']), 'slot_timetable_teacher_idx'
+        )
+
+    def test_batch_filter(self):
+        ids = [self.objs['batch'].id, self.objs['lab'].id]
+        self.assertUsesIndex(TimetableSlot.objects.filter(timetable=self.tt, batch_id__in=ids), 'slot_timetable_batch_idx')
+
+    def test_room_filter(self):
+        self.assertUsesIndex(
+            TimetableSlot.objects.filter(timetable=self.tt, room=self.objs['room']), 'slot_timetable_room_idx'
+        )
+
+    def slot_viewset_queryset(self, **params):
+        request = Request(APIRequestFactory().get('/api/slots/', params))
+        request.user = self.staff
+        return TimetableSlotViewSet(request=request, format_kwarg=None).get_queryset()
+
+    def test_viewset_batch_and_teacher_filters(self):
+        qs = self.slot_viewset_queryset(timetable=self.tt.id, batch=self.objs['batch'].id)
+        self.assertUsesIndex(qs, 'slot_timetable_batch_idx')
+        qs = self.slot_viewset_queryset(timetable=self.tt.id, teacher=self.objs['teacher'].id)
+        self.assertUsesIndex(qs, 'slot_timetable_teacher_idx')
+
+
+class SlotIndexTests(TestCase):
+    """slot_index follows start_time on every write path."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tt, cls.objs = make_timetable()
+
+    def test_serializer_derives_slot_index(self):
+        slot = self.tt.slots.get(day='MON', slot_index=0)
+        serializer = TimetableSlotSerializer(slot, data={'start_time': "12:00", 'end_time': "13:00"}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.save().slot_index, 4)
+
+        serializer = TimetableSlotSerializer(slot, data={'start_time': "16:30", 'end_time': "17:30"}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertIsNone(serializer.save().slot_index)
+
+    def test_swap_and_move_update_slot_index(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('admin', password='x', is_staff=True))
+        a = self.tt.slots.get(day='MON', slot_index=0)
+        b = self.tt.slots.get(day='TUE', slot_index=1)
+
+        response = client.post('/api/slots/swap/', {'slot_a_id': a.id, 'slot_b_id': b.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        a.refresh_from_db()
+        self.assertEqual((a.day, a.slot_index, a.start_time), ('TUE', 1, datetime.time(8, 30)))
+
+        response = client.post('/api/slots/swap/', {'slot_id': a.id, 'target_day': 'FRI', 'target_slot_index': 7}, format='json')
+        self.assertEqual(response.status_code, 200)
+        a.refresh_from_db()
+        self.assertEqual((a.day, a.slot_index, a.start_time), ('FRI', 7, datetime.time(15, 0)))
+
+    def test_backfill_migration(self):
+        TimetableSlot.objects.update(slot_index=None)
+        migration = importlib.import_module('api.migrations.0012_timetableslot_slot_index')
+        migration.backfill_slot_index(apps, None)
+        self.assertEqual(
+            sorted(self.tt.slots.values_list('start_time', 'slot_index')),
+            [(datetime.time(7, 30), 0), (datetime.time(8, 30), 1), (datetime.time(10, 0), 2)],
+        )
+
+
+class PublishedSnapshotTests(TestCase):
+    """Published slot lists are served from the snapshot cache with ETags, and go stale on edits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tt, cls.objs = make_timetable()
+        GeneratedTimetable.objects.filter(id=cls.tt.id).update(status='PUBLISHED')
+        cls.staff = User.objects.create_user('admin', password='x', is_staff=True)
+        cls.faculty = User.objects.create_user('faculty', password='x')
+
+    def setUp(self):
+        snapshot_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.faculty)
+        self.url = f"/api/slots/?department={self.objs['dept'].id}&batch={self.objs['batch'].id}"
+
+    def test_repeat_loads_use_cache_and_etag(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.json()), 3)
+        self.assertIn('Last-Modified', first)
+
+        # Cached: only the version lookup hits the database
+        with self.assertNumQueries(1):
+            again = self.client.get(self.url)
+        self.assertEqual(again.content, first.content)
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], first['ETag'])
+
+    def test_edits_change_version(self):
+        etag = self.client.get(self.url)['ETag']
+
+        admin = APIClient()
+        admin.force_authenticate(self.staff)
+        a, b = self.tt.slots.order_by('id')[:2]
+        admin.post('/api/slots/swap/', {'slot_a_id': a.id, 'slot_b_id': b.id}, format='json')
+        after_swap = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after_swap.status_code, 200)
+        self.assertNotEqual(after_swap['ETag'], etag)
+
+        Teacher.objects.filter(id=self.objs['teacher'].id).first().save()
+        after_rename = self.client.get(self.url, HTTP_IF_NONE_MATCH=after_swap['ETag'])
+        self.assertEqual(after_rename.status_code, 200)
+
+    def test_drafts_are_not_cached(self):
+        GeneratedTimetable.objects.filter(id=self.tt.id).update(status='DRAFT')
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(f"/api/slots/?timetable={self.tt.id}")
+        self.assertEqual(len(response.json()), 3)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(len(snapshot_cache), 0)
+
+
+class QueryBudgetMixin:
+    """assertQueryBudget fails when a GET's query count grows with the number of rows it returns."""
+
+    def count_queries(self, client, url):
+        """(queries, rows) of one GET returning a JSON list."""
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries), len(response.json())
+
+    def assertQueryBudget(self, client, url, grow, budget=None):
+        """GET url after each of two grow() calls; the second must return more rows for the same queries."""
+        grow()
+        queries, rows = self.count_queries(client, url)
+        grow()
+        more_queries, more_rows = self.count_queries(client, url)
+        self.assertGreater(more_rows, rows, f"{url} returned no more rows after grow()")
+        self.assertEqual(
+            more_queries, queries, f"{url}: {queries} queries for {rows} rows but {more_queries} for {more_rows}"
+        )
+        if budget is not None:
+            self.assertLessEqual(more_queries, budget, url)
+
+
+class EndpointQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every router endpoint lists in a constant number of queries."""
+
+    def setUp(self):
+        snapshot_cache.clear()
+        self.staff = APIClient()
+        self.staff.force_authenticate(User.objects.create_user('admin', password='x', is_staff=True))
+        self.departments = []
+
+    def grow(self):
+        """Add a department with one of everything: batch, lab, teacher, subject, room, published timetable, slots, pin, unavailability."""
+        tt, objs = make_timetable()
+        GeneratedTimetable.objects.filter(id=tt.id).update(status='PUBLISHED')
+        PinnedSlot.objects.create(subject=objs['subject'], department=objs['dept'], day='WED', slot_index=3)
+        TeacherUnavailability.objects.create(teacher=objs['teacher'], day='THU', slot_index=5)
+        self.departments.append(objs)
+
+    def test_router_list_endpoints(self):
+        prefixes = [prefix for prefix, viewset, basename in router.registry]
+        self.assertIn('slots', prefixes)
+        for prefix in prefixes:
+            with self.subTest(prefix):
+                self.assertQueryBudget(self.staff, f"/api/{prefix}/", self.grow, budget=2)
+
+    def test_filtered_slot_lists(self):
+        faculty = APIClient()
+        faculty.force_authenticate(User.objects.create_user('faculty', password='x'))
+        self.grow()
+        dept = self.departments[0]
+        # Staff read the uncached path, faculty the published snapshot; both grow with more slots
+        for client in (self.staff, faculty):
+            for query in (f"batch={dept['batch'].id}", f"teacher={dept['teacher'].id}", f"room={dept['room'].id}"):
+                with self.subTest(query=query, staff=client is self.staff):
+                    snapshot_cache.clear()
+                    url = f"/api/slots/?department={dept['dept'].id}&{query}"
+                    self.assertQueryBudget(client, url, lambda: self.add_slot(dept), budget=3)
+
+    def add_slot(self, objs):
+        tt = GeneratedTimetable.objects.get(department=objs['dept'])
+        TimetableSlot.objects.create(
+            timetable=tt, day='FRI', slot_index=0, start_time="07:30", end_time="08:30",
+            room=objs['room'], teacher=objs['teacher'], subject=objs['subject'], batch=objs['lab'],
+        )
+        snapshot_cache.clear()
+
+
+class LargeListingTests(TestCase):
+    """Opt-in cursor pages and streamed JSON return the same rows as the plain list."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tt, cls.objs = make_timetable()
+        for day in ('WED', 'THU', 'FRI'):
+            for slot in range(SLOTS_PER_DAY):
+                start, end = slot_times(slot)
+                TimetableSlot.objects.create(
+                    timetable=cls.tt, day=day, slot_index=slot, start_time=start, end_time=end, room=cls.objs['room'],
+                    teacher=cls.objs['teacher'], subject=cls.objs['subject'], batch=cls.objs['lab'],
+                )
+        cls.staff = User.objects.create_user('admin', password='x', is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.url = f"/api/slots/?timetable={self.tt.id}"
+        self.plain = self.client.get(self.url).json()
+
+    def test_cursor_pages(self):
+        rows, url = [], f"{self.url}&page_size=10"
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 10)
+            rows += page['results']
+            url = page['next']
+        self.assertEqual(rows, sorted(self.plain, key=lambda row: row['id']))
+
+    def test_stream(self):
+        with patch('api.listing.STREAM_CHUNK_ROWS', 4):
+            response = self.client.get(f"{self.url}&stream=1")
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(json.loads(b''.join(chunks)), self.plain)
+
+        empty = self.client.get("/api/slots/?timetable=0&stream=1")
+        self.assertEqual(json.loads(b''.join(empty.streaming_content)), [])
+
+
+class PdfCacheTests(TestCase):
+    """PDFs are rendered once per timetable version and filter, and pre-rendered on publish."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tt, cls.objs = make_timetable()
+        cls.staff = User.objects.create_user('admin', password='x', is_staff=True)
+        cls.token = Token.objects.create(user=cls.staff)
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.enterContext(override_settings(PDF_CACHE_DIR=cache_dir))
+        self.client = APIClient()
+        self.url = f"/api/timetables/{self.tt.id}/pdf/?token={self.token.key}&batch={self.objs['batch'].id}"
+
+    def download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_second_download_is_served_from_disk(self):
+        with patch('api.pdf.render_timetable_pdf', wraps=render_timetable_pdf) as render:
+            first = self.download()
+            self.assertEqual(self.download(), first)
+        self.assertEqual(render.call_count, 1)
+        self.assertTrue(first.startswith(b'%PDF'))
+
+    def test_swap_invalidates(self):
+        self.download()
+        admin = APIClient()
+        admin.force_authenticate(self.staff)
+        a, b = self.tt.slots.order_by('id')[:2]
+        admin.post('/api/slots/swap/', {'slot_a_id': a.id, 'slot_b_id': b.id}, format='json')
+        self.assertFalse(pdf_cache.path(self.tt.id, 1, self.objs['batch'].id).exists())
+        with patch('api.pdf.render_timetable_pdf', wraps=render_timetable_pdf) as render:
+            self.download()
+        self.assertEqual(render.call_count, 1)
+
+    def test_publish_prerenders_batches_and_teachers(self):
+        admin = APIClient()
+        admin.force_authenticate(self.staff)
+        with patch('api.views.submit_prerender') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                admin.post(f"/api/timetables/{self.tt.id}/approve/")
+        submit.assert_called_once_with(self.tt.id)
+
+        prerender(self.tt.id)
+        tt = GeneratedTimetable.objects.get(id=self.tt.id)
+        self.assertIsNotNone(pdf_cache.get(tt.id, tt.version, batch_id=self.objs['batch'].id))
+        self.assertIsNotNone(pdf_cache.get(tt.id, tt.version, teacher_id=self.objs['teacher'].id))
+
+    def test_bundle_zips_every_batch_and_teacher(self):
+        response = self.client.get(f"/api/timetables/{self.tt.id}/pdf/bundle/?token={self.token.key}")
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(
+            archive.namelist(),
+            [f"batches/sy-a-{self.objs['batch'].id}.pdf", f"teachers/t-one-{self.objs['teacher'].id}.pdf"],
+        )
+        self.assertTrue(archive.read(archive.namelist()[0]).startswith(b'%PDF'))
+        # Rendered once, reused by single downloads
+        self.assertIsNotNone(pdf_cache.get(self.tt.id, self.tt.version, teacher_id=self.objs['teacher'].id))
+
+        faculty = Token.objects.create(user=User.objects.create_user('faculty', password='x'))
+        response = self.client.get(f"/api/timetables/{self.tt.id}/pdf/bundle/?token={faculty.key}")
+        self.assertEqual(response.status_code, 403)
+
+
+class MoveValidationTests(TestCase):
+    """swap_slots refuses moves that break a generation rule, and slot targets lists the legal ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tt, cls.objs = make_timetable()
+        Teacher.objects.filter(id=cls.objs['teacher'].id).update(preferred_end_slot=6)
+        TeacherUnavailability.objects.create(teacher=cls.objs['teacher'], day='WED', slot_index=3)
+        lab_teacher = Teacher.objects.create(name="T Two", department=cls.objs['dept'])
+        lab_subject = Subject.objects.create(name="Lab", weekly_lectures=1, department=cls.objs['dept'], batch=cls.objs['lab'], teacher=lab_teacher)
+        lab_room = Room.objects.create(name="L1", capacity=30, is_lab=True)
+        TimetableSlot.objects.create(
+            timetable=cls.tt, day='THU', slot_index=2, start_time="10:00", end_time="11:00",
+            room=lab_room, teacher=lab_teacher, subject=lab_subject, batch=cls.objs['lab'],
+        )
+        cls.staff = User.objects.create_user('admin', password='x', is_staff=True)
+
+    def setUp(self):
+        availability_cache.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        self.slot = self.tt.slots.get(day='MON', slot_index=0)
+
+    def move(self, day, index, **extra):
+        return self.client.post('/api/slots/swap/', {'slot_id': self.slot.id, 'target_day': day, 'target_slot_index': index, **extra}, format='json')
+
+    def test_rejects_clashes_and_rules(self):
+        response = self.move('TUE', 1)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("Teacher 'T One' already has a class at TUE 08:30", response.data['problems'])
+        self.assertIn("'Maths' would be taught twice on TUE", response.data['problems'])
+
+        self.assertIn("unavailable", self.move('WED', 3).data['error'])
+        self.assertIn("preferred hours", self.move('FRI', 7).data['error'])
+        self.assertIn("sub-batch labs", self.move('THU', 2).data['error'])
+        self.assertEqual(self.tt.slots.get(id=self.slot.id).day, 'MON')
+
+        self.assertEqual(self.move('TUE', 1, force=True).status_code, 200)
+
+    def test_availability_masks(self):
+        teacher = self.objs['teacher']
+        availability = department_availability(self.objs['dept'].id)
+        # Slots 0-5 on five days, less WED 3
+        self.assertEqual(availability.count('teacher', teacher.id), 29)
+        self.assertEqual(availability.count('teacher', teacher.id, day=2), 5)
+        self.assertFalse(availability.free('teacher', teacher.id, 2, 3))
+        self.assertEqual(availability.count('batch', self.objs['batch'].id), 29)
+        with self.assertNumQueries(0):
+            self.assertIs(department_availability(self.objs['dept'].id), availability)
+
+        TeacherUnavailability.objects.create(teacher=teacher, day='FRI', slot_index=0)
+        self.assertEqual(department_availability(self.objs['dept'].id).count('teacher', teacher.id), 28)
+        self.assertIn("unavailable", self.move('FRI', 0).data['error'])
+
+    def test_generator_and_moves_share_masks(self):
+        # A subject taught by another department's teacher: both sides see that teacher's blocks
+        guest = Teacher.objects.create(name="Guest", department=Department.objects.create(name="Elsewhere"))
+        TeacherUnavailability.objects.create(teacher=guest, day='MON', slot_index=1)
+        Subject.objects.create(name="Guest Talk", weekly_lectures=1, department=self.objs['dept'], batch=self.objs['batch'], teacher=guest)
+
+        _, subjects, teachers, _, _, unavailability_set = _load_inputs(self.objs['dept'].id)
+        self.assertIn((guest.id, 'MON', 1), unavailability_set)
+        generator = Availability(teachers, subjects, unavailability_set)
+        moves = department_availability(self.objs['dept'].id)
+        self.assertEqual(generator.teachers, moves.teachers)
+        self.assertEqual(generator.batches, moves.batches)
+        self.assertFalse(moves.free('teacher', guest.id, 0, 1))
+
+    def test_targets(self):
+        response = self.client.get(f'/api/slots/{self.slot.id}/targets/')
+        cells = {(c['day'], c['slot_index']) for c in response.data['cells']}
+        # Within slots 0-5: the rest of Monday but its other Maths slot, every free day but
+        # WED 3 (unavailable) and THU 2 (labs); Tuesday already has Maths
+        expected = {('MON', i) for i in (1, 3, 4, 5)} | {(d, i) for d in ('WED', 'THU', 'FRI') for i in range(6)}
+        self.assertEqual(cells, expected - {('WED', 3), ('THU', 2)})
+        self.assertEqual(sorted(response.data['swap_slot_ids']), sorted(self.tt.slots.filter(batch=self.objs['batch']).exclude(id=self.slot.id).values_list('id', flat=True)))
+
+        for day, index in cells:
+            response = self.move(day, index)
+            self.assertEqual(response.status_code, 200, (day, index, response.data))
+            self.move('MON', 0, force=True)
+
+    def batch(self, *moves, **extra):
+        return self.client.post(f'/api/timetables/{self.tt.id}/moves/', {'moves': list(moves), **extra}, format='json')
+
+    def test_batch_moves_are_checked_against_the_final_state(self):
+        tuesday = self.tt.slots.get(day='TUE', slot_index=1)
+        # Moving Monday's slot onto Tuesday's cell is a clash on its own, but not once Tuesday's slot has left
+        response = self.batch(
+            {'slot_id': tuesday.id, 'target_day': 'WED', 'target_slot_index': 0},
+            {'slot_id': self.slot.id, 'target_day': 'TUE', 'target_slot_index': 1},
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok', 'ok'])
+        self.assertEqual(len(response.data['slots']), 2)
+        self.slot.refresh_from_db()
+        self.assertEqual((self.slot.day, self.slot.slot_index, self.slot.start_time), ('TUE', 1, datetime.time(8, 30)))
+
+    def test_batch_is_all_or_nothing(self):
+        before = list(self.tt.slots.order_by('id').values_list('day', 'slot_index'))
+        response = self.batch(
+            {'slot_id': self.tt.slots.get(day='TUE').id, 'target_day': 'FRI', 'target_slot_index': 0},
+            {'slot_a_id': self.slot.id, 'slot_b_id': self.tt.slots.get(day='THU').id},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok', 'rejected'])
+        self.assertEqual(list(self.tt.slots.order_by('id').values_list('day', 'slot_index')), before)
+
+        response = self.batch({'slot_id': self.slot.id, 'target_day': 'SUN', 'target_slot_index': 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_queries_do_not_grow_with_moves(self):
+        def queries(*moves):
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.batch(*moves).status_code, 200)
+            return len(captured)
+
+        department_availability(self.objs['dept'].id)
+        one = queries({'slot_id': self.slot.id, 'target_day': 'WED', 'target_slot_index': 1})
+        others = self.tt.slots.exclude(id=self.slot.id).filter(batch=self.objs['batch']).order_by('id')
+        many = queries(
+            {'slot_id': self.slot.id, 'target_day': 'WED', 'target_slot_index': 2},
+            *[{'slot_id': s.id, 'target_day': day, 'target_slot_index': 1} for s, day in zip(others, ('THU', 'FRI'))],
+            {'slot_id': self.slot.id, 'target_day': 'WED', 'target_slot_index': 0},
+        )
+        self.assertEqual(many, one)
+
+
+class ConflictDetectionTests(TestCase):
+    """/conflicts/ reports every teacher, room and batch with two classes in one cell, on or off the grid."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tt, cls.objs = make_timetable()
+        cls.staff = User.objects.create_user('conflicts-admin', password='x', is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def add(self, day, start, end, **fields):
+        values = {key: self.objs[key] for key in ('room', 'teacher', 'subject', 'batch')}
+        values.update(fields)
+        slot = TIME_SLOTS.index(start) if start in TIME_SLOTS else None
+        return TimetableSlot.objects.create(timetable=self.tt, day=day, slot_index=slot, start_time=start, end_time=end, **values)
+
+    def conflicts(self):
+        response = self.client.get(f'/api/timetables/{self.tt.id}/conflicts/')
+        self.assertEqual(response.status_code, 200)
+        return [(c['type'], c['day'], c['slot_index'], sorted(c['slot_ids'])) for c in response.data['conflicts']]
+
+    def test_clean_timetable(self):
+        self.assertEqual(self.conflicts(), [])
+
+    def test_teacher_room_and_batch_clashes(self):
+        monday = self.tt.slots.get(day='MON', slot_index=0)
+        other_batch = StudentBatch.objects.create(name="SY B", size=60, department=self.objs['dept'])
+        other_teacher = Teacher.objects.create(name="T Two", department=self.objs['dept'])
+        other_room = Room.objects.create(name="R102", capacity=60)
+        # Same teacher, own room and batch: a teacher clash only
+        teacher = self.add('MON', "07:30", "08:30", room=other_room, batch=other_batch)
+        # Same room on Tuesday, other teacher and batch: a room clash only
+        tuesday = self.tt.slots.get(day='TUE', slot_index=1)
+        room = self.add('TUE', "08:30", "09:30", teacher=other_teacher, batch=other_batch)
+        # Same batch on Monday at 10:00, other teacher and room: a batch clash only
+        ten = self.tt.slots.get(day='MON', slot_index=2)
+        batch = self.add('MON', "10:00", "11:00", teacher=other_teacher, room=other_room)
+
+        self.assertEqual(self.conflicts(), [
+            ('teacher', 'MON', 0, sorted([monday.id, teacher.id])),
+            ('batch', 'MON', 2, sorted([ten.id, batch.id])),
+            ('room', 'TUE', 1, sorted([tuesday.id, room.id])),
+        ])
+
+    def test_off_grid_slots(self):
+        # 09:00 is not a TIME_SLOTS start: two classes of one teacher there still clash
+        first = self.add('WED', "09:00", "10:00")
+        second = self.add('WED', "09:00", "10:00", batch=self.objs['lab'], room=Room.objects.create(name="L1", capacity=30, is_lab=True))
+        self.add('WED', "09:30", "10:30", batch=StudentBatch.objects.create(name="SY C", size=60, department=self.objs['dept']),
+                 teacher=Teacher.objects.create(name="T Three", department=self.objs['dept']), room=Room.objects.create(name="R103", capacity=60))
+        self.assertIsNone(first.slot_index)
+        self.assertEqual(self.conflicts(), [('teacher', 'WED', -1, sorted([first.id, second.id]))])
+
+    def test_campus_sized_timetable(self):
+        # 5,000 slots over 125 batches, teachers and rooms: the grid loads and finds every
+        # clash in milliseconds, holding a few hundred bytes per slot
+        dept = self.objs['dept']
+        batches = StudentBatch.objects.bulk_create([StudentBatch(name=f"B{i}", size=60, department=dept) for i in range(125)])
+        teachers = Teacher.objects.bulk_create([Teacher(name=f"T{i}", department=dept) for i in range(125)])
+        rooms = Room.objects.bulk_create([Room(name=f"R{i}", capacity=60) for i in range(125)])
+        tt = GeneratedTimetable.objects.create(department=dept)
+        slots = []
+        for i in range(5000):
+            day, slot = divmod(i % 40, SLOTS_PER_DAY)
+            start, end = slot_times(slot)
+            # Teachers shift by one against batches and rooms, so slots 0 and 1 share a teacher's cell
+            slots.append(TimetableSlot(
+                timetable=tt, day=DAYS[day], slot_index=slot, start_time=start, end_time=end, subject=self.objs['subject'],
+                batch=batches[i // 40], room=rooms[i // 40], teacher=teachers[(i + 40 * (i == 1)) // 40],
+            ))
+        TimetableSlot.objects.bulk_create(slots)
+
+        def load():
+            grid = TimetableGrid.for_timetable(tt.id)
+            return grid, {kind: grid.clashes(kind) for kind in ('teacher', 'room', 'batch')}
+
+        started = time.perf_counter()
+        grid, clashes = load()
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        load()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(len(grid), 5000)
+        self.assertEqual({kind: len(found) for kind, found in clashes.items()}, {'teacher': 1, 'room': 0, 'batch': 0})
+        self.assertEqual(sorted(r.batch_id for r in clashes['teacher'][0][3]), [batches[0].id, batches[1].id])
+        self.assertLess(elapsed, 0.25)
+        self.assertLess(peak, 4 * 2 ** 20)
+
+
+class BenchmarkTests(TestCase):
+    """run_benchmark builds a seeded synthetic campus, generates it and removes it again."""
+
+    def test_synthetic_campus_run(self):
+        spec = CampusSpec(departments=2, batches=1, theory_subjects=3, lab_subjects=1, pins=1, unavailability=0.1)
+        result = run_benchmark(spec, seed=3, time_limit=5)
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(len(result['departments']), 2)
+        self.assertEqual(result['variables'], sum(d['variables'] for d in result['departments']))
+        self.assertGreater(result['constraints'], 0)
+        self.assertTrue({'load', 'diagnostics', 'build', 'solve', 'persist'} <= set(result['phases']))
+        self.assertGreater(result['peak_rss_mb'], 0)
+        json.dumps(result)
+        self.assertFalse(Department.objects.exists() or Room.objects.exists() or GeneratedTimetable.objects.exists())
+
+        # Same spec and seed, same instance
+        self.assertEqual(run_benchmark(spec, seed=3, time_limit=5)['variables'], result['variables'])
+
+    def test_saved_campus_matches_the_generator(self):
+        spec = CampusSpec(batches=2, pins=2, unavailability=0.1)
+        campus = synthetic_campus(spec, seed=5)
+        build_campus(spec, seed=5)
+
+        def by_name(subjects):
+            return sorted((s.batch.name, s.name, s.teacher.name) for s in subjects)
+
+        self.assertEqual(by_name(Subject.objects.select_related('batch', 'teacher')), by_name(campus.subjects))
+        self.assertEqual(
+            sorted((b.name, b.parent_batch.name if b.parent_batch else None) for b in StudentBatch.objects.all()),
+            sorted((b.name, b.parent_batch.name if b.parent_batch else None) for b in campus.batches),
+        )
+        self.assertEqual(TeacherUnavailability.objects.count(), len(campus.unavailability))
+        self.assertEqual(
+            sorted((p.subject.batch.name, p.subject.name, p.day, p.slot_index) for p in PinnedSlot.objects.all()),
+            sorted((p.subject.batch.name, p.subject.name, p.day, p.slot_index) for p in campus.pins),
+        )
+
+
+class GenerationJobTests(TestCase):
+    """At most one queued or running generation job per department, and one campus-wide, even under races."""
+
+    @patch('api.jobs._get_executor')
+    def test_one_active_job(self, executor):
+        dept = Department.objects.create(name="Jobs")
+        job = submit_generation_job(dept.id)
+        self.assertEqual(submit_generation_job(dept.id).id, job.id)
+        self.assertEqual(submit_generation_job(None).id, submit_generation_job(None).id)
+
+        # A request that passed the in-flight check just before another created its job
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            GenerationJob.objects.create(department=dept)
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            GenerationJob.objects.create(department=None)
+        with patch('api.jobs.GenerationJob.objects.filter') as in_flight:
+            in_flight.return_value.first.side_effect = [None, job]
+            self.assertEqual(submit_generation_job(dept.id).id, job.id)
+
+        GenerationJob.objects.filter(id=job.id).update(status='DONE')
+        self.assertNotEqual(submit_generation_job(dept.id).id, job.id)
+
+
+class GenerationJobRunTests(TestCase):
+    """_run_job stores the outcome of the job; jobs of dead workers are requeued on submit and poll."""
+
+    def setUp(self):
+        generation_cache.invalidate()
+        self.objs = make_department("Jobs")
+
+    def job(self, **fields):
+        options = {'num_variants': 1, 'warm_start_from': None, 'time_limit': 5}
+        return GenerationJob.objects.create(department=self.objs['dept'], options=options, **fields)
+
+    def test_done(self):
+        job = self.job()
+        _run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
+        self.assertEqual(job.result['status'], 'success')
+        self.assertTrue(GeneratedTimetable.objects.filter(id__in=job.result['timetable_ids'], status='DRAFT').exists())
+        self.assertEqual(job.error, '')
+        self.assertEqual(job.worker, WORKER_ID)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed(self):
+        job = self.job()
+        with patch('api.jobs.generate_timetable', side_effect=RuntimeError("solver crashed")):
+            _run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.result), ('FAILED', "Scheduler error: solver crashed", {}))
+
+        job = self.job()
+        with patch('api.jobs.generate_timetable', return_value={'status': 'error', 'messages': ["❌ No batches."]}):
+            _run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.result['status']), ('FAILED', "❌ No batches.", 'error'))
+
+    def test_claimed_job_keeps_its_worker(self):
+        # Already running elsewhere: not claimed a second time
+        job = self.job(status='RUNNING', worker='elsewhere:1')
+        _run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), ('RUNNING', 'elsewhere:1'))
+
+        # Requeued after a missed lease and claimed by another worker mid-run: the late result is dropped
+        job.delete()
+        job = self.job()
+
+        def reclaimed(*args, **kwargs):
+            GenerationJob.objects.filter(id=job.id).update(worker='elsewhere:2')
+            return {'status': 'success', 'messages': [], 'timetable_ids': []}
+
+        with patch('api.jobs.generate_timetable', side_effect=reclaimed):
+            _run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.result), ('RUNNING', 'elsewhere:2', {}))
+
+    @override_settings(GENERATION_JOB_LEASE=60)
+    @patch('api.jobs._get_executor')
+    def test_orphaned_jobs_are_requeued(self, executor):
+        now = timezone.now()
+        stale = self.job(status='RUNNING', worker='other-host:4242', started_at=now, heartbeat_at=now - datetime.timedelta(minutes=5))
+        other = make_department("Busy")['dept']
+        alive = GenerationJob.objects.create(department=other, status='RUNNING', worker='other-host:4242', started_at=now, heartbeat_at=now)
+
+        # A new request for the stuck department gets the requeued job, now handed to the pool
+        self.assertEqual(submit_generation_job(self.objs['dept'].id).id, stale.id)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.worker, stale.heartbeat_at), ('QUEUED', '', None))
+        executor.return_value.submit.assert_called_once_with(_run_job, stale.id)
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, 'RUNNING')
+
+        # On this host a dead process is caught without waiting for the lease; so is a poll
+        dead = GenerationJob.objects.filter(id=alive.id)
+        dead.update(worker=f"{WORKER_ID.rpartition(':')[0]}:999999999")
+        staff = User.objects.create_user('jobs-admin', password='x', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        response = client.get(f'/api/generate/jobs/{alive.id}/')
+        self.assertEqual(response.data['status'], 'QUEUED')
+
+
+class ParallelVariantTests(TestCase):
+    """Variants are solved side by side on one model, split the search workers and come back in order."""
+
+    def setUp(self):
+        generation_cache.invalidate()
+        self.objs = make_department("Variants", subjects=3, lectures=3, rooms=1)
+
+    def test_results_keep_config_order_and_split_workers(self):
+        built = _build_model(*_load_inputs(self.objs['dept'].id))
+        calls = []
+
+        def solve(model, shifts, seed, num_workers, **kwargs):
+            calls.append((seed, num_workers))
+            time.sleep(0.3 if seed == VARIANT_CONFIGS[0]['seed'] else 0)  # the first variant finishes last
+            status, slot_data, stats = _solve_model(model, shifts, seed, num_workers, **kwargs)
+            return status, slot_data, {**stats, 'seed': seed}
+
+        with patch('api.scheduler._solve_model', side_effect=solve):
+            results = _solve_variants(built, VARIANT_CONFIGS, num_workers=6, time_limit=5)
+            self.assertEqual(sorted(calls), [(42, 2), (137, 2), (7919, 2)])
+            self.assertEqual([stats['seed'] for _, _, stats in results], [42, 137, 7919])
+
+            # Fewer cores than variants: one search worker each
+            calls.clear()
+            _solve_variants(built, VARIANT_CONFIGS, num_workers=2, time_limit=5)
+            self.assertEqual(sorted(calls), [(42, 1), (137, 1), (7919, 1)])
+
+    def test_variants_are_numbered_in_order_and_differ(self):
+        result = generate(self.objs['dept'], num_variants=3)
+        self.assertEqual([v['status'] for v in result['solver']['variants']], ['OPTIMAL'] * 3)
+        timetables = [GeneratedTimetable.objects.get(id=tt_id) for tt_id in result['timetable_ids']]
+        self.assertEqual([tt.variant_number for tt in timetables], [1, 2, 3])
+        layouts = {
+            tuple(sorted(tt.slots.values_list('subject_id', 'day', 'slot_index'))) for tt in timetables
+        }
+        self.assertEqual(len(layouts), 3)
+
+    def test_model_is_built_once_per_generation(self):
+        with patch('api.scheduler._build_model', wraps=_build_model) as build, \
+                patch('api.scheduler._set_variant_objective', wraps=_set_variant_objective) as objective:
+            result = generate(self.objs['dept'], num_variants=3)
+        self.assertEqual(len(result['timetable_ids']), 3)
+        build.assert_called_once()
+        # Each variant only swaps the objective into its copy of that model
+        self.assertEqual(objective.call_count, 3)
+        self.assertEqual(sorted(call.args[3] for call in objective.call_args_list), [1, 2, 3])
+
+
+class PersistVariantsTests(TestCase):
+    """Variants replace the old drafts in one transaction: a failed write keeps the old drafts whole."""
+
+    def test_failure_rolls_back_every_variant(self):
+        generation_cache.invalidate()
+        objs = make_department("Persist", subjects=3, lectures=2, rooms=2)
+        old_ids = generate(objs['dept'], num_variants=2)['timetable_ids']
+        self.assertEqual(len(old_ids), 2)
+        old_slots = sorted(TimetableSlot.objects.filter(timetable_id__in=old_ids).values_list('id', flat=True))
+
+        generation_cache.invalidate()
+        with patch.object(TimetableSlot.objects, 'bulk_create', side_effect=DatabaseError("disk full")):
+            with self.assertRaises(DatabaseError):
+                generate(objs['dept'], num_variants=2)
+
+        self.assertEqual(sorted(GeneratedTimetable.objects.filter(department=objs['dept']).values_list('id', flat=True)), sorted(old_ids))
+        self.assertEqual(sorted(TimetableSlot.objects.filter(timetable__department=objs['dept']).values_list('id', flat=True)), old_slots)
+
+
+class GenerationCacheTests(TestCase):
+    """Unchanged inputs return the cached variants; edited or deleted drafts are written again."""
+
+    def setUp(self):
+        generation_cache.invalidate()
+        self.objs = make_department()
+
+    def test_hit_returns_the_same_drafts(self):
+        first = generate(self.objs['dept'])
+        self.assertFalse(first['cached'])
+        second = generate(self.objs['dept'])
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['timetable_ids'], first['timetable_ids'])
+        self.assertNotIn('solve', second['timings'])
+
+    def test_edited_drafts_are_rewritten(self):
+        first = generate(self.objs['dept'])
+        slots = list(GeneratedTimetable.objects.get(id=first['timetable_ids'][0]).slots.values_list('day', 'slot_index'))
+        bump_versions(first['timetable_ids'])  # what a forced swap, a batch move or a repair does
+
+        second = generate(self.objs['dept'])
+        self.assertTrue(second['cached'])
+        self.assertNotEqual(second['timetable_ids'], first['timetable_ids'])
+        self.assertFalse(GeneratedTimetable.objects.filter(id__in=first['timetable_ids']).exists())
+        fresh = GeneratedTimetable.objects.get(id=second['timetable_ids'][0])
+        self.assertEqual(sorted(fresh.slots.values_list('day', 'slot_index')), sorted(slots))
+        # ...and the rewritten drafts are a hit as they are
+        self.assertEqual(generate(self.objs['dept'])['timetable_ids'], second['timetable_ids'])
+
+    def test_deleted_drafts_are_rewritten(self):
+        first = generate(self.objs['dept'])
+        GeneratedTimetable.objects.filter(id__in=first['timetable_ids']).delete()
+        second = generate(self.objs['dept'])
+        self.assertTrue(second['cached'])
+        self.assertTrue(GeneratedTimetable.objects.filter(id__in=second['timetable_ids'], status='DRAFT').exists())
+
+    def test_model_changes_drop_the_department_entries(self):
+        other = make_department("Other")
+        generate(self.objs['dept'])
+        generate(other['dept'])
+        self.assertEqual(len(generation_cache), 2)
+
+        teacher = self.objs['teachers'][0]
+        teacher.max_classes_per_day = 3
+        teacher.save()
+        self.assertEqual(len(generation_cache), 1)
+        self.assertFalse(generate(self.objs['dept'])['cached'])
+        self.assertTrue(generate(other['dept'])['cached'])
+
+        Room.objects.create(name="New", capacity=60)  # rooms are shared, so every entry goes
+        self.assertEqual(len(generation_cache), 0)
+
+    def test_guest_teacher_changes_miss(self):
+        # A subject taught by another department's teacher
+        guest = Teacher.objects.create(name="Guest", department=Department.objects.create(name="Elsewhere"))
+        Subject.objects.filter(id=self.objs['subjects'][0].id).update(teacher=guest)
+        generate(self.objs['dept'])
+
+        # Saving the teacher drops the entries of the departments they teach for...
+        guest.preferred_end_slot = 4
+        guest.save()
+        self.assertEqual(len(generation_cache), 0)
+        generate(self.objs['dept'])
+        TeacherUnavailability.objects.create(teacher=guest, day='MON', slot_index=0)
+        self.assertEqual(len(generation_cache), 0)
+
+        # ...and without the signal the fingerprint still tells the inputs apart
+        generate(self.objs['dept'])
+        Teacher.objects.filter(id=guest.id).update(preferred_start_slot=2)
+        result = generate(self.objs['dept'])
+        self.assertFalse(result['cached'])
+        slots = TimetableSlot.objects.filter(timetable_id__in=result['timetable_ids'], teacher=guest)
+        self.assertTrue(slots.exists())
+        self.assertTrue(all(2 <= i < 4 for i in slots.values_list('slot_index', flat=True)))
+
+
+class FeasibilityCheckTests(TestCase):
+    """Each pre-solve check on its own proves a department infeasible, skipping the solver; a
+    department that passes them all is solved."""
+
+    def setUp(self):
+        generation_cache.invalidate()
+        self.dept = Department.objects.create(name="Proofs")
+
+    def batch(self, name, size=60, **fields):
+        return StudentBatch.objects.create(name=name, size=size, department=self.dept, **fields)
+
+    def subject(self, batch, lectures, teacher=None, **teacher_fields):
+        teacher = teacher or Teacher.objects.create(name=f"T{Teacher.objects.count() + 1}", department=self.dept, **teacher_fields)
+        return Subject.objects.create(name=f"S{Subject.objects.count() + 1}", weekly_lectures=lectures, department=self.dept, batch=batch, teacher=teacher)
+
+    def assertProof(self, expected):
+        result = generate(self.dept)
+        self.assertEqual(result['status'], 'infeasible')
+        self.assertIsNone(result['solver'])
+        self.assertNotIn('solve', result['timings'])
+        proofs = [m for m in result['messages'] if m.startswith('❌') and "can't all be met" not in m]
+        self.assertEqual(len(proofs), 1, proofs)
+        self.assertIn(expected, proofs[0])
+
+    def test_subject_hours(self):
+        Room.objects.create(name="R", capacity=60)
+        batch = self.batch("A")
+        self.subject(batch, 6)
+        self.subject(batch, 1)  # so the batch as a whole has room for more than one lecture a day
+        self.assertProof("needs 6 lectures/week but at most 5 fit")
+
+    def test_teacher_load(self):
+        Room.objects.create(name="R", capacity=60)
+        teacher = Teacher.objects.create(name="Busy", department=self.dept, max_classes_per_day=1)
+        self.subject(self.batch("A"), 3, teacher)
+        self.subject(self.batch("B"), 3, teacher)
+        self.assertProof("Teacher 'Busy' has 6 lectures/week but at most 5 fit")
+
+    def test_batch_load(self):
+        Room.objects.create(name="R", capacity=60)
+        Room.objects.create(name="L", capacity=30, is_lab=True)
+        main = self.batch("A", max_classes_per_day=2)
+        lab = self.batch("A - Lab", size=30, parent_batch=main)
+        self.subject(main, 5)
+        self.subject(lab, 3)
+        self.subject(lab, 3)
+        self.assertProof("Batch 'A' (with its lab sub-batches) has 11 lectures/week but at most 10 fit")
+
+    def test_hall_bound(self):
+        Room.objects.create(name="R1", capacity=60)
+        Room.objects.create(name="R2", capacity=60)
+        batch = self.batch("A")
+        # Both teachers only teach in the first slot of the day
+        self.subject(batch, 3, preferred_end_slot=1)
+        self.subject(batch, 3, preferred_end_slot=1)
+        self.assertProof("need 6 lectures/week but those teachers are free for at most 5")
+
+    def test_room_capacity(self):
+        Room.objects.create(name="Big", capacity=75)
+        for i in range(3):
+            Room.objects.create(name=f"R{i}", capacity=60)
+        self.subject(self.batch("A", size=70), 5, preferred_end_slot=1)
+        self.subject(self.batch("B", size=70), 5, preferred_end_slot=1)
+        self.assertProof("10 theory lectures/week need a room with at least 75 seats but only 5 such room-slots exist")
+
+    def test_rooms_held_elsewhere(self):
+        room = Room.objects.create(name="R", capacity=60)
+        batch = self.batch("A")
+        self.subject(batch, 3)
+        self.subject(batch, 2)
+        # Another department holds the only room in all but four cells
+        open_cells = {('MON', 0), ('TUE', 0), ('WED', 0), ('THU', 0)}
+        reserved = {(day, start): {room.id} for day in DAYS for i, start in enumerate(TIME_SLOTS) if (day, i) not in open_cells}
+        result = generate(self.dept, reserved=reserved)
+        self.assertEqual(result['status'], 'infeasible')
+        self.assertIsNone(result['solver'])
+        self.assertIn("❌ 5 theory lectures/week need a room with at least 60 seats but only 4 such room-slots exist while their teachers are free.", result['messages'])
+        self.assertEqual([c['type'] for c in result['conflict']['constraints']], ['room_capacity'])
+        # With the room free the same department is solved
+        self.assertEqual(generate(self.dept)['status'], 'success')
+
+    def test_feasible_department_is_solved(self):
+        objs = make_department("Fine", subjects=3, lectures=3)
+        result = generate(objs['dept'])
+        self.assertEqual(result['status'], 'success')
+        self.assertIsNotNone(result['solver'])
+        self.assertFalse([m for m in result['messages'] if m.startswith('❌')])
+
+
+class SolveStopTests(TestCase):
+    """A quiet window after the last improvement stops the search; the time limit follows past runs."""
+
+    def watch(self, improve):
+        """Run a _SolveMonitor with a 0.3s window over a stub solver for up to 2s. Returns (monitor, solver)."""
+        solver = Mock()
+        monitor = _SolveMonitor(solver, no_improvement_seconds=0.3)
+        monitor.ObjectiveValue = Mock(return_value=10)
+        with monitor:
+            if improve:
+                monitor.on_solution_callback()
+            deadline = time.perf_counter() + 2
+            while not solver.StopSearch.called and time.perf_counter() < deadline:
+                time.sleep(0.05)
+        return monitor, solver
+
+    def test_quiet_window_stops_the_search(self):
+        monitor, solver = self.watch(improve=True)
+        self.assertTrue(monitor.stopped_early)
+        self.assertFalse(monitor.cancelled)
+        solver.StopSearch.assert_called_once()
+        self.assertLess(monitor.time_to_best, 0.3)
+
+    def test_window_waits_for_a_first_solution(self):
+        monitor, solver = self.watch(improve=False)
+        self.assertFalse(monitor.stopped_early)
+        solver.StopSearch.assert_not_called()
+
+    def add_runs(self, dept, times_to_best, num_variables=100, solver_mode='single'):
+        SolverRun.objects.bulk_create([
+            SolverRun(department=dept, solver_mode=solver_mode, num_variables=num_variables, num_batches=1, num_teachers=2,
+                      time_limit=30, wall_time=t or 30, time_to_best=t, status='OPTIMAL')
+            for t in times_to_best
+        ])
+
+    def test_estimate_needs_history(self):
+        dept = Department.objects.create(name="History")
+        self.add_runs(dept, [2] * 4)
+        self.add_runs(dept, [2] * 5, solver_mode='two_phase')
+        self.add_runs(dept, [None] * 5)
+        self.assertIsNone(estimate_time_limit('single', 100, 1, 2))
+
+    def test_estimate_scales_the_slowest_neighbour(self):
+        dept = Department.objects.create(name="History")
+        self.add_runs(dept, [1, 1, 1, 1, 4])
+        # The slowest neighbour's time-to-best, scaled to twice the variables, with 1.5x headroom
+        self.assertEqual(estimate_time_limit('single', 200, 1, 2), 12)
+        self.assertEqual(estimate_time_limit('single', 50, 1, 2), MIN_TIME_LIMIT)
+
+    @patch('api.scheduler.ESTIMATOR_HISTORY', 3)
+    def test_recording_trims_old_runs(self):
+        dept = Department.objects.create(name="History")
+        self.add_runs(dept, [1] * 4)
+        self.add_runs(dept, [1] * 2, solver_mode='two_phase')
+        stats = {'status': 'OPTIMAL', 'wall_time': 2, 'time_to_best': 1}
+        _record_solver_run(dept, 'single', Mock(shifts={}), [], [], 30, [(None, None, stats)])
+
+        self.assertEqual(SolverRun.objects.filter(solver_mode='single').count(), 3)
+        self.assertEqual(SolverRun.objects.filter(solver_mode='single').first().wall_time, 2)
+        self.assertEqual(SolverRun.objects.filter(solver_mode='two_phase').count(), 2)
+
+    def test_auto_limit_falls_back_to_the_budget(self):
+        generation_cache.invalidate()
+        objs = make_department("Auto")
+        result = generate(objs['dept'], time_limit='auto')
+        self.assertEqual((result['solver']['time_limit'], result['solver']['time_limit_source']), (DEFAULT_TIME_LIMIT, 'budget'))
+        self.assertEqual(SolverRun.objects.filter(department=objs['dept']).count(), 1)
+
+        Department.objects.filter(id=objs['dept'].id).update(solver_time_budget=20)
+        variables = result['solver']['variables']
+        self.add_runs(objs['dept'], [2] * 5, num_variables=variables)
+        generation_cache.invalidate()
+        result = generate(objs['dept'], time_limit='auto')
+        self.assertEqual((result['solver']['time_limit'], result['solver']['time_limit_source']), (MIN_TIME_LIMIT, 'estimate'))
+
+        self.add_runs(objs['dept'], [20] * 5, num_variables=variables)
+        generation_cache.invalidate()
+        result = generate(objs['dept'], time_limit='auto')
+        self.assertEqual((result['solver']['time_limit'], result['solver']['time_limit_source']), (20, 'estimate'))
+
+
+class InfeasibilityExplanationTests(TestCase):
+    """A model the solver proves infeasible is explained by a minimal conflicting set of guards,
+    and the proof stops the sibling variants."""
+
+    def setUp(self):
+        generation_cache.invalidate()
+        # Two subjects of one batch pinned to the same cell. The pre-solve checks would catch
+        # it, so they are bypassed where the solver's own proof is under test.
+        self.objs = make_department("Pins", rooms=2)
+        for s in self.objs['subjects']:
+            PinnedSlot.objects.create(subject=s, department=self.objs['dept'], day='MON', slot_index=0)
+
+    def test_minimal_conflict(self):
+        with patch('api.feasibility.check_feasibility', return_value=([], [])):
+            result = generate(self.objs['dept'])
+        self.assertEqual(result['status'], 'infeasible')
+        conflict = result['conflict']
+        self.assertTrue(conflict['minimal'])
+        self.assertEqual(sorted(c['type'] for c in conflict['constraints']), ['batch_clash', 'pin', 'pin'])
+        self.assertEqual(
+            {c['subject_id'] for c in conflict['constraints'] if c['type'] == 'pin'}, {s.id for s in self.objs['subjects']}
+        )
+        self.assertIn("   • Batch 'Pins A' attends one class at a time", result['messages'])
+
+    def test_proof_cancels_sibling_variants(self):
+        inputs = _load_inputs(self.objs['dept'].id)
+        built = _build_model(*inputs)
+        # One search worker runs the variants one after another, so the first proves it alone
+        results = _solve_variants(built, VARIANT_CONFIGS, num_workers=1, time_limit=5)
+        self.assertEqual([stats['status'] for _, _, stats in results], ['INFEASIBLE', 'CANCELLED', 'CANCELLED'])
+
+    def test_cancel_stops_a_running_search(self):
+        campus = synthetic_campus(CampusSpec(batches=16))
+        built = _build_model(campus.batches, campus.subjects, campus.teachers, campus.rooms, [], set())
+        model = built.model.Clone()
+        _set_variant_objective(model, built.shifts, built.gap_terms, 1)
+        cancel = threading.Event()
+        threading.Timer(0.5, cancel.set).start()
+        status, slots, stats = _solve_model(model, built.shifts, 42, num_workers=1, time_limit=30, cancel=cancel)
+        self.assertEqual(stats['status'], 'CANCELLED')
+        self.assertLess(stats['wall_time'], 5)
+
+
+class RoomClassTests(TestCase):
+    """Rooms of one kind and capacity form a class: the solver picks classes, _assign_rooms the rooms."""
+
+    def test_identical_rooms_share_a_class(self):
+        rooms = [Room.objects.create(name=name, capacity=cap, is_lab=lab) for name, cap, lab in [
+            ("R2", 60, False), ("R1", 60, False), ("Big", 75, False), ("L1", 60, True),
+        ]]
+        self.assertEqual([[r.name for r in rc] for rc in _room_classes(rooms)], [["R1", "R2"], ["Big"], ["L1"]])
+
+    def test_model_size_does_not_grow_with_interchangeable_rooms(self):
+        objs = make_department("Classes", rooms=1)
+        one = _build_model(*_load_inputs(objs['dept'].id))
+        for i in range(3):
+            Room.objects.create(name=f"Classes Extra {i}", capacity=60)
+        four = _build_model(*_load_inputs(objs['dept'].id))
+        self.assertEqual(len(four.shifts), len(one.shifts))
+        self.assertEqual({key[3] for key in four.shifts}, {0})
+
+    def test_classes_get_distinct_rooms_per_cell(self):
+        dept = Department.objects.create(name="Cells")
+        batches = [StudentBatch.objects.create(name=f"Cells {i}", size=size, department=dept) for i, size in enumerate((60, 60, 70))]
+        rooms = [Room.objects.create(name=name, capacity=cap) for name, cap in [("R1", 60), ("R2", 60), ("Big", 75)]]
+        classes = _room_classes(rooms)
+
+        def cell(*picks):
+            return [{'day': 'MON', 'start_time': TIME_SLOTS[0], 'batch_id': b.id, 'room_class': rc} for b, rc in picks]
+
+        # The two 60-seat batches share class 0 and get its two rooms; the 70 gets the 75-seat class
+        slot_data = cell((batches[0], 0), (batches[1], 0), (batches[2], 1))
+        self.assertTrue(_assign_rooms(slot_data, batches, classes))
+        self.assertEqual(sorted(sd['room_id'] for sd in slot_data[:2]), sorted([rooms[0].id, rooms[1].id]))
+        self.assertEqual(slot_data[2]['room_id'], rooms[2].id)
+
+        # A 60-seat batch in class 1 takes Big, even though class 0 still has a room free
+        slot_data = cell((batches[0], 0), (batches[1], 1))
+        self.assertTrue(_assign_rooms(slot_data, batches, classes))
+        self.assertEqual([sd['room_id'] for sd in slot_data], [rooms[0].id, rooms[2].id])
+
+        # A class never lends a room to another, so a third slot in class 0 fails
+        self.assertFalse(_assign_rooms(cell((batches[0], 0), (batches[1], 0), (batches[2], 0)), batches, classes))
+
+    def test_generated_rooms_never_repeat_in_a_cell(self):
+        objs = make_department("Single", subjects=4, lectures=3, rooms=2)
+        other = StudentBatch.objects.create(name="Single B", size=60, department=objs['dept'])
+        for i in range(4):
+            teacher = Teacher.objects.create(name=f"Single B T{i}", department=objs['dept'])
+            Subject.objects.create(name=f"B{i}", weekly_lectures=3, department=objs['dept'], batch=other, teacher=teacher)
+        result = generate(objs['dept'], num_variants=3)
+        self.assertEqual(result['status'], 'success')
+        for tt_id in result['timetable_ids']:
+            cells = list(TimetableSlot.objects.filter(timetable_id=tt_id).values_list('day', 'slot_index', 'room_id'))
+            self.assertEqual(len(cells), 24)
+            self.assertEqual(len(set(cells)), len(cells))
+
+
+class TwoPhaseRoomTests(TestCase):
+    """Two-phase generation decides times first; rooms are then matched so every class fits and none is shared."""
+
+    def setUp(self):
+        generation_cache.invalidate()
+
+    def test_largest_batch_first_in_the_smallest_room_that_fits(self):
+        dept = Department.objects.create(name="Match")
+        batches = [StudentBatch.objects.create(name=f"Match {size}", size=size, department=dept) for size in (50, 55, 70)]
+        rooms = [Room.objects.create(name=f"Match R{cap}", capacity=cap) for cap in (50, 60, 75)]
+        classes = _room_classes(rooms)
+
+        def cell():
+            return [{'day': 'MON', 'start_time': TIME_SLOTS[0], 'batch_id': b.id, 'room_class': None} for b in batches]
+
+        slot_data = cell()
+        self.assertTrue(_assign_rooms(slot_data, batches, classes))
+        self.assertEqual([sd['room_id'] for sd in slot_data], [r.id for r in rooms])
+        # With the 75-seat room kept by another slot, the 70-student batch fits nowhere
+        self.assertFalse(_assign_rooms(cell(), batches, classes, {('MON', TIME_SLOTS[0]): {rooms[2].id}}))
+
+    def test_generated_rooms_fit_and_never_clash(self):
+        dept = Department.objects.create(name="Two Phase")
+        teachers = iter(Teacher.objects.create(name=f"Two Phase T{i}", department=dept) for i in range(12))
+        for size in (50, 60, 70):
+            batch = StudentBatch.objects.create(name=f"Two Phase {size}", size=size, department=dept)
+            for i in range(2):
+                lab = StudentBatch.objects.create(name=f"{batch.name} - Lab {i}", size=size // 2, department=dept, parent_batch=batch)
+                Subject.objects.create(name="Lab", weekly_lectures=1, department=dept, batch=lab, teacher=next(teachers))
+            for i in range(2):
+                Subject.objects.create(name=f"S{i}", weekly_lectures=4, department=dept, batch=batch, teacher=next(teachers))
+        for cap in (60, 75, 75):
+            Room.objects.create(name=f"Two Phase R{cap}", capacity=cap)
+        for i in range(2):
+            Room.objects.create(name=f"Two Phase L{i}", capacity=35, is_lab=True)
+
+        result = generate(dept, solver_mode='two_phase')
+        self.assertEqual(result['status'], 'success')
+        slots = list(TimetableSlot.objects.filter(timetable_id=result['timetable_ids'][0]).select_related('room', 'batch'))
+        self.assertEqual(len(slots), 3 * (2 + 2 * 4))
+        for sl in slots:
+            self.assertGreaterEqual(sl.room.capacity, sl.batch.size)
+            self.assertEqual(sl.room.is_lab, sl.batch.parent_batch_id is not None)
+        cells = [(sl.day, sl.slot_index, sl.room_id) for sl in slots]
+        self.assertEqual(len(set(cells)), len(cells))
+
+
+class WarmStartTests(TestCase):
+    """A previous timetable's slots become solution hints, minus those its inputs no longer allow."""
+
+    def setUp(self):
+        generation_cache.invalidate()
+        self.objs = make_department("Warm", subjects=3, lectures=2, rooms=1)
+        self.source = generate(self.objs['dept'])['timetable_ids'][0]
+
+    def hints(self):
+        """(model built from the current inputs, source rows, hints kept, {shift key: hinted value})."""
+        inputs = _load_inputs(self.objs['dept'].id)
+        batches, subjects, _, rooms, _, _ = inputs
+        built = _build_model(*inputs)
+        tt, rows = _load_warm_start(self.objs['dept'].id, self.source)
+        self.assertEqual(tt.id, self.source)
+        kept = _add_solution_hints(built, rows, subjects, batches, rooms)
+        hint = built.model.Proto().solution_hint
+        value_of = dict(zip(hint.vars, hint.values))
+        return built, rows, kept, {key: value_of[var.Index()] for key, var in built.shifts.items()}
+
+    def test_unchanged_inputs_keep_every_slot(self):
+        built, rows, kept, values = self.hints()
+        self.assertEqual(kept, len(rows))
+        self.assertEqual(kept, 6)
+        self.assertEqual({key for key, value in values.items() if value}, set(_slot_keys(built, rows, self.objs['rooms'])))
+
+        result = generate(self.objs['dept'], warm_start_from=self.source)
+        self.assertEqual(result['warm_start'], {'timetable_id': self.source, 'hints_kept': 6, 'hints_total': 6})
+
+    def test_dropped_and_changed_inputs_are_skipped(self):
+        first, second, _ = self.objs['subjects']
+        blocked = TimetableSlot.objects.filter(timetable_id=self.source, subject=first).first()
+        TeacherUnavailability.objects.create(teacher=first.teacher, day=blocked.day, slot_index=blocked.slot_index)
+        second.teacher = Teacher.objects.create(name="Warm New", department=self.objs['dept'])
+        second.save()
+
+        built, rows, kept, values = self.hints()
+        keys = _slot_keys(built, rows, self.objs['rooms'])
+        dropped = [row for row, key in zip(rows, keys) if key is None]
+        self.assertEqual(kept, 3)
+        self.assertEqual(len(dropped), 3)
+        self.assertIn((first.teacher_id, first.id, blocked.batch_id, blocked.room_id, blocked.day, blocked.slot_index), dropped)
+        self.assertEqual(sum(row[1] == second.id for row in dropped), 2)
+        # The batch lost lectures, so its slots were re-placed into a complete hint
+        hinted = [key for key, value in values.items() if value]
+        self.assertEqual(sorted(key[1] for key in hinted), sorted(s.id for s in self.objs['subjects'] for _ in range(2)))
+
+        result = generate(self.objs['dept'], warm_start_from=self.source)
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['warm_start'], {'timetable_id': self.source, 'hints_kept': 3, 'hints_total': 6})
+
+
+class RepairTests(TestCase):
+    """repair_timetable re-places only what changed inputs broke, widening the neighbourhood when it must."""
+
+    def setUp(self):
+        generation_cache.invalidate()
+
+    def placed(self, tt):
+        return {sl.id: (sl.day, sl.slot_index, sl.room_id) for sl in tt.slots.all()}
+
+    def assertNothingToRepair(self, tt):
+        before = self.placed(tt)
+        result = repair_timetable(tt.id)
+        self.assertEqual(result['slots_moved'], 0)
+        self.assertIsNone(result['neighbourhood'])
+        self.assertEqual(self.placed(tt), before)
+
+    def test_only_the_neighbourhood_moves(self):
+        dept = Department.objects.create(name="Repair")
+        a, b, c = (StudentBatch.objects.create(name=f"Repair {n}", size=60, department=dept) for n in "ABC")
+        t1, t2, t3 = (Teacher.objects.create(name=f"Repair T{i}", department=dept) for i in range(1, 4))
+        for name, lectures, batch, teacher in [("A1", 1, a, t1), ("B1", 1, b, t1), ("B2", 5, b, t2), ("C1", 3, c, t3)]:
+            Subject.objects.create(name=name, weekly_lectures=lectures, department=dept, batch=batch, teacher=teacher)
+        for i in range(3):
+            Room.objects.create(name=f"Repair R{i + 1}", capacity=60)
+        tt = GeneratedTimetable.objects.get(id=generate(dept)['timetable_ids'][0])
+
+        # Block one of T2's cells: T2 and batch B are the neighbourhood, A1 and C1 must stay put
+        blocked = tt.slots.filter(teacher=t2).first()
+        TeacherUnavailability.objects.create(teacher=t2, day=blocked.day, slot_index=blocked.slot_index)
+        before = self.placed(tt)
+        outside = {sl.id: before[sl.id] for sl in tt.slots.exclude(teacher=t2).exclude(batch=b)}
+        self.assertEqual(len(outside), 4)
+
+        result = repair_timetable(tt.id, teacher_ids=[t2.id])
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['neighbourhood']['level'], 'affected')
+        self.assertEqual(result['neighbourhood']['teacher_ids'], [t2.id])
+        self.assertEqual(result['neighbourhood']['batch_ids'], [b.id])
+        self.assertGreaterEqual(result['slots_moved'], 1)
+        self.assertFalse(tt.slots.filter(teacher=t2, day=blocked.day, slot_index=blocked.slot_index).exists())
+        after = self.placed(tt)
+        self.assertEqual({sl_id: after.get(sl_id) for sl_id in outside}, outside)
+        self.assertNothingToRepair(tt)
+
+    def test_escalates_when_the_neighbourhood_is_too_small(self):
+        # A hand-made timetable: T1 teaches A1 (batch A) and B1 (batch B), both on Monday. Both
+        # batches also have lectures on Tuesday at 0 and 1, the only other cells T1 is free in.
+        # Capping T1 at one class a day frees just T1's slots, which fit only once batch A's or
+        # batch B's Tuesday lectures may move as well.
+        dept = Department.objects.create(name="Escalate")
+        a, b = (StudentBatch.objects.create(name=f"Escalate {n}", size=60, department=dept) for n in "AB")
+        t1 = Teacher.objects.create(name="Escalate T1", department=dept)
+        room_a, room_b = (Room.objects.create(name=f"Escalate R{n}", capacity=60) for n in "AB")
+        tt = GeneratedTimetable.objects.create(department=dept)
+        for name, batch, room, day, slot, teacher in [
+            ("A1", a, room_a, 'MON', 1, t1), ("B1", b, room_b, 'MON', 2, t1),
+            ("A2", a, room_a, 'TUE', 0, None), ("A3", a, room_a, 'TUE', 1, None),
+            ("B2", b, room_b, 'TUE', 0, None), ("B3", b, room_b, 'TUE', 1, None),
+        ]:
+            teacher = teacher or Teacher.objects.create(name=f"Escalate {name}", department=dept)
+            subject = Subject.objects.create(name=name, weekly_lectures=1, department=dept, batch=batch, teacher=teacher)
+            start, end = slot_times(slot)
+            TimetableSlot.objects.create(timetable=tt, day=day, slot_index=slot, start_time=start, end_time=end,
+                                         room=room, teacher=teacher, subject=subject, batch=batch)
+        free = {('MON', 1), ('MON', 2), ('TUE', 0), ('TUE', 1)}
+        TeacherUnavailability.objects.bulk_create([
+            TeacherUnavailability(teacher=t1, day=day, slot_index=slot)
+            for day in DAYS for slot in range(SLOTS_PER_DAY) if (day, slot) not in free
+        ])
+        Teacher.objects.filter(id=t1.id).update(max_classes_per_day=1)
+
+        result = repair_timetable(tt.id, teacher_ids=[t1.id])
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['neighbourhood']['level'], 'widened')
+        self.assertTrue(result['messages'][0].startswith("⚠️ The affected slots could not be re-placed on their own; the repair was widened"))
+        self.assertEqual(sorted(tt.slots.filter(teacher=t1).values_list('day', flat=True)), ['MON', 'TUE'])
+        self.assertNothingToRepair(tt)
+
+
+class CampusGenerationTests(TransactionTestCase):
+    """Departments sharing scarce rooms are split per cell and never book the same room at once.
+
+    generate_campus solves the departments in threads on their own connections, which only
+    see committed rows, hence the TransactionTestCase.
+    """
+
+    def setUp(self):
+        generation_cache.invalidate()
+        # One room for two departments. Quotas alternate its cells between them, starting with
+        # the first department, so 'Early' (only free in the first slot) gets no cell it can
+        # use, while 'Late' (never free in it) holds all the ones 'Early' needs.
+        self.late = make_department("Late", subjects=1, lectures=5, rooms=1)
+        self.early = make_department("Early", subjects=1, lectures=5, rooms=0)
+        Teacher.objects.filter(id=self.late['teachers'][0].id).update(preferred_start_slot=1)
+        Teacher.objects.filter(id=self.early['teachers'][0].id).update(preferred_end_slot=1)
+        self.ids = [self.late['dept'].id, self.early['dept'].id]
+
+    def test_quotas_split_every_room(self):
+        rooms = list(Room.objects.all())
+        quotas = _room_quotas(_room_demand(self.ids), rooms, {})
+        for day in DAYS:
+            for start in TIME_SLOTS:
+                shares = [{r.id for r in rooms} - quotas[d_id][(day, start)] for d_id in self.ids]
+                self.assertEqual(sum(len(share) for share in shares), len(rooms))
+                self.assertFalse(set.intersection(*shares))
+        self.assertEqual(quotas[self.early['dept'].id][('MON', TIME_SLOTS[0])], {rooms[0].id})
+
+    def test_retry_when_a_share_is_infeasible(self):
+        result = generate_campus(self.ids, num_variants=1, warm_start_from=None, time_limit=5)
+        self.assertEqual(result['status'], 'success')
+        self.assertIn(
+            "♻️ Early did not fit its share of the rooms and was re-solved against the rooms the others left free.",
+            result['messages'],
+        )
+        cells = list(TimetableSlot.objects.filter(timetable_id__in=result['timetable_ids']).values_list('day', 'slot_index', 'room_id'))
+        self.assertEqual(len(cells), 10)
+        self.assertEqual(len(set(cells)), len(cells))
+
+
+class CampusSpareRoomTests(TransactionTestCase):
+    """Rooms no department's batches need in a cell are held for all, not free to all."""
+
+    def test_no_room_clash_across_departments(self):
+        generation_cache.invalidate()
+        depts = [make_department(name, subjects=2, lectures=3, rooms=0)['dept'] for name in ("North", "South")]
+        ids = [d.id for d in depts]
+        for name, cap in (("R1", 60), ("R2", 60), ("R3", 100)):
+            Room.objects.create(name=name, capacity=cap)
+        big = Room.objects.get(name="R3")
+
+        quotas = _room_quotas(_room_demand(ids), list(Room.objects.all()), {})
+        for d_id in ids:
+            self.assertTrue(all(big.id in quotas[d_id][(day, start)] for day in DAYS for start in TIME_SLOTS))
+
+        result = generate_campus(ids, num_variants=2, warm_start_from=None, time_limit=5)
+        self.assertEqual(result['status'], 'success')
+        variants = [result['departments'][d_id]['timetable_ids'] for d_id in ids]
+        self.assertEqual([len(v) for v in variants], [2, 2])
+        for north in variants[0]:
+            for south in variants[1]:
+                cells = list(TimetableSlot.objects.filter(timetable_id__in=[north, south]).values_list('day', 'slot_index', 'room_id'))
+                self.assertEqual(len(set(cells)), len(cells), (north, south))
@@ -5,7 +5,7 @@ from .views import (
     StudentBatchViewSet, DepartmentViewSet,
     GeneratedTimetableViewSet, TimetableSlotViewSet,
     PinnedSlotViewSet, TeacherUnavailabilityViewSet,
-    trigger_generation, approve_timetable, export_timetable_pdf, swap_slots,
+    trigger_generation, trigger_campus_generation, generation_job_status, approve_timetable, repair_timetable, export_timetable_pdf, export_timetable_bundle, swap_slots, slot_targets, batch_move_slots,
     detect_conflicts
 )
 
@@ -22,9 +22,15 @@ router.register(r'teacher-unavailability', TeacherUnavailabilityViewSet)
 
 urlpatterns = [
     path('slots/swap/', swap_slots, name='swap-slots'),
+    path('slots/<int:pk>/targets/', slot_targets, name='slot-targets'),
     path('generate/', trigger_generation, name='generate-timetable'),
+    path('generate/campus/', trigger_campus_generation, name='generate-campus'),
+    path('generate/jobs/<int:pk>/', generation_job_status, name='generation-job-status'),
     path('timetables/<int:pk>/approve/', approve_timetable, name='approve-timetable'),
+    path('timetables/<int:pk>/repair/', repair_timetable, name='repair-timetable'),
+    path('timetables/<int:pk>/moves/', batch_move_slots, name='batch-move-slots'),
     path('timetables/<int:pk>/pdf/', export_timetable_pdf, name='export-timetable-pdf'),
+    path('timetables/<int:pk>/pdf/bundle/', export_timetable_bundle, name='export-timetable-bundle'),
     path('timetables/<int:pk>/conflicts/', detect_conflicts, name='detect-conflicts'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
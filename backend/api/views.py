@@ -4,12 +4,22 @@ from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
 from .models import *
 from .serializers import *
-from .scheduler import generate_timetable
+from .jobs import submit_generation_job, submit_campus_job, recover_orphaned_jobs
+from .scheduler import DAYS, SLOTS_PER_DAY, SOLVER_MODES, repair_timetable as run_repair
+from .grid import TimetableGrid, names, slot_times
+from .snapshot_cache import snapshot_cache, bump_versions
+from .listing import ListingMixin, wants_pages, wants_stream
+from .moves import MoveValidator, Move
+from .pdf import cached_timetable_pdf, pdf_cache, submit_prerender, timetable_bundle
 
-import io
+import math
 
 
 # --- AUTHENTICATION API ---
@@ -60,7 +70,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user and request.user.is_staff
 
 
-class BaseViewSet(viewsets.ModelViewSet):
+class BaseViewSet(ListingMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
@@ -95,7 +105,7 @@ class StudentBatchViewSet(BaseViewSet):
 
 
 class PinnedSlotViewSet(BaseViewSet):
-    queryset = PinnedSlot.objects.all()
+    queryset = PinnedSlot.objects.select_related('subject')
     serializer_class = PinnedSlotSerializer
     permission_classes = [IsAdminOrReadOnly]
 
@@ -124,7 +134,7 @@ class IsAdminOrOwnerTeacher(permissions.BasePermission):
         return False
 
 class TeacherUnavailabilityViewSet(BaseViewSet):
-    queryset = TeacherUnavailability.objects.all()
+    queryset = TeacherUnavailability.objects.select_related('teacher')
     serializer_class = TeacherUnavailabilitySerializer
     permission_classes = [IsAdminOrOwnerTeacher]
 
@@ -139,7 +149,7 @@ class TeacherUnavailabilityViewSet(BaseViewSet):
         return qs
 
 
-class GeneratedTimetableViewSet(viewsets.ModelViewSet):
+class GeneratedTimetableViewSet(ListingMixin, viewsets.ModelViewSet):
     queryset = GeneratedTimetable.objects.all()
     serializer_class = GeneratedTimetableSerializer
 
@@ -157,9 +167,12 @@ class GeneratedTimetableViewSet(viewsets.ModelViewSet):
         return qs
 
 
-class TimetableSlotViewSet(viewsets.ModelViewSet):
-    queryset = TimetableSlot.objects.all()
+class TimetableSlotViewSet(ListingMixin, viewsets.ModelViewSet):
+    # The serializer shows room, teacher, subject and batch names
+    queryset = TimetableSlot.objects.select_related('room', 'teacher', 'subject', 'batch')
     serializer_class = TimetableSlotSerializer
+    # Filters that pick a slice of one timetable; published slices are cached per timetable version
+    SLICE_FILTERS = ('batch', 'teacher', 'room')
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -185,8 +198,67 @@ class TimetableSlotViewSet(viewsets.ModelViewSet):
         teacher = self.request.query_params.get('teacher')
         if teacher:
             qs = qs.filter(teacher_id=teacher)
+
+        room = self.request.query_params.get('room')
+        if room:
+            qs = qs.filter(room_id=room)
         return qs
 
+    def _published_snapshot(self):
+        """(timetable id, version, updated_at, slice) when this list reads one published timetable, else None."""
+        params = self.request.query_params
+        timetable, dept = params.get('timetable'), params.get('department')
+        slice_ = tuple(params.get(f, '') for f in self.SLICE_FILTERS)
+        if not all(v.isdigit() for v in (timetable, dept, *slice_) if v):
+            return None
+        if timetable:
+            qs = GeneratedTimetable.objects.filter(id=timetable)
+        elif dept and not self.request.user.is_staff:
+            # Faculty reading a department see its one published timetable
+            qs = GeneratedTimetable.objects.filter(department_id=dept)
+        else:
+            return None
+        if dept:
+            qs = qs.filter(department_id=dept)
+        found = list(qs.filter(status='PUBLISHED').values_list('id', 'version', 'updated_at')[:2])
+        return (*found[0], slice_) if len(found) == 1 else None
+
+    def list(self, request, *args, **kwargs):
+        plain = request.accepted_renderer.format == 'json' and not (wants_stream(request) or wants_pages(request))
+        snapshot = self._published_snapshot() if plain else None
+        if snapshot is None:
+            return super().list(request, *args, **kwargs)
+
+        timetable_id, version, updated_at, slice_ = snapshot
+        etag = f'"{timetable_id}.{version}.{"-".join(slice_)}"'
+        last_modified = int(updated_at.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            key = (timetable_id, version, slice_)
+            body = snapshot_cache.get(key)
+            if body is None:
+                slots = self.get_queryset().filter(timetable_id=timetable_id)
+                body = JSONRenderer().render(self.get_serializer(slots, many=True).data)
+                snapshot_cache.put(key, body)
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def perform_create(self, serializer):
+        slot = serializer.save()
+        bump_versions([slot.timetable_id])
+
+    def perform_update(self, serializer):
+        previous = serializer.instance.timetable_id
+        slot = serializer.save()
+        bump_versions({previous, slot.timetable_id})
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        bump_versions([instance.timetable_id])
+
 
 # --- CONFLICT DETECTION ---
 @api_view(['GET'])
@@ -198,73 +270,91 @@ def detect_conflicts(request, pk):
     except GeneratedTimetable.DoesNotExist:
         return Response({"error": "Timetable not found"}, status=404)
 
-    slots = list(TimetableSlot.objects.filter(timetable=tt).select_related('teacher', 'room', 'batch', 'subject'))
-    conflicts = []
+    grid = TimetableGrid.for_timetable(tt.id)
+    labels = {'teacher': ("Teacher", Teacher), 'room': ("Room", Room), 'batch': ("Batch", StudentBatch)}
 
-    # Group slots by (day, start_time)
-    from collections import defaultdict
-    by_time = defaultdict(list)
-    for s in slots:
-        by_time[(s.day, s.start_time.strftime("%H:%M"))].append(s)
-
-    TIME_KEYS = ["07:30", "08:30", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00"]
-
-    for (day, time_key), cell_slots in by_time.items():
-        slot_idx = TIME_KEYS.index(time_key) if time_key in TIME_KEYS else -1
-
-        # Teacher clash
-        teacher_map = defaultdict(list)
-        for s in cell_slots:
-            teacher_map[s.teacher_id].append(s)
-        for tid, slist in teacher_map.items():
-            if len(slist) > 1:
-                conflicts.append({
-                    "type": "teacher",
-                    "day": day,
-                    "slot_index": slot_idx,
-                    "slot_ids": [s.id for s in slist],
-                    "detail": f"Teacher '{slist[0].teacher.name}' has {len(slist)} classes at the same time"
-                })
-
-        # Room clash
-        room_map = defaultdict(list)
-        for s in cell_slots:
-            room_map[s.room_id].append(s)
-        for rid, slist in room_map.items():
-            if len(slist) > 1:
-                conflicts.append({
-                    "type": "room",
-                    "day": day,
-                    "slot_index": slot_idx,
-                    "slot_ids": [s.id for s in slist],
-                    "detail": f"Room '{slist[0].room.name}' has {len(slist)} classes at the same time"
-                })
-
-        # Batch clash (same batch or parent overlap)
-        batch_map = defaultdict(list)
-        for s in cell_slots:
-            batch_map[s.batch_id].append(s)
-            if s.batch.parent_batch_id:
-                batch_map[f"parent_{s.batch.parent_batch_id}"].append(s)
-        for bid, slist in batch_map.items():
-            if isinstance(bid, int) and len(slist) > 1:
-                conflicts.append({
-                    "type": "batch",
-                    "day": day,
-                    "slot_index": slot_idx,
-                    "slot_ids": [s.id for s in slist],
-                    "detail": f"Batch '{slist[0].batch.name}' has {len(slist)} classes at the same time"
-                })
+    # Teacher, room and batch clashes: any of them with more than one class in a cell
+    conflicts = []
+    for kind, (label, model) in labels.items():
+        clashes = grid.clashes(kind)
+        if not clashes:
+            continue
+        clash_names = names(model, {resource_id for _, _, resource_id, _ in clashes})
+        for day, slot_idx, resource_id, records in clashes:
+            conflicts.append({
+                "type": kind,
+                "day": DAYS[day],
+                "slot_index": slot_idx,
+                "slot_ids": [r.id for r in records],
+                "detail": f"{label} '{clash_names.get(resource_id, resource_id)}' has {len(records)} classes at the same time"
+            })
+    order = {kind: i for i, kind in enumerate(labels)}
+    conflicts.sort(key=lambda c: (DAYS.index(c["day"]), c["slot_index"], order[c["type"]]))
 
     return Response({"conflicts": conflicts})
 
 
 # --- GENERATION TRIGGER ---
+def _positive_number(value):
+    """Parse a request value as a float > 0, or return None."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 and math.isfinite(value) else None
+
+
+def _generation_options(data):
+    """Validate the solver options shared by both generation triggers. Returns (options, error response or None)."""
+    options = {}
+    solver_mode = data.get('solver_mode')
+    if solver_mode:
+        if solver_mode not in SOLVER_MODES:
+            return None, Response({"error": f"solver_mode must be one of: {', '.join(SOLVER_MODES)}"}, status=400)
+        options['solver_mode'] = solver_mode
+
+    # 'published' (default), a timetable id such as a draft, or null to solve from scratch
+    if 'warm_start_from' in data:
+        warm_start_from = data.get('warm_start_from')
+        if warm_start_from not in (None, 'published'):
+            if not str(warm_start_from).isdigit():
+                return None, Response({"error": "warm_start_from must be 'published', a timetable id or null"}, status=400)
+            warm_start_from = int(warm_start_from)
+        options['warm_start_from'] = warm_start_from
+
+    # Stop criteria: seconds per variant (or 'auto' to estimate from past runs), relative gap, quiet window
+    time_limit = data.get('time_limit')
+    if time_limit is not None:
+        if time_limit != 'auto':
+            time_limit = _positive_number(time_limit)
+            if time_limit is None:
+                return None, Response({"error": "time_limit must be 'auto' or a positive number of seconds"}, status=400)
+        options['time_limit'] = time_limit
+
+    relative_gap = data.get('relative_gap')
+    if relative_gap is not None:
+        relative_gap = _positive_number(relative_gap)
+        if relative_gap is None or relative_gap >= 1:
+            return None, Response({"error": "relative_gap must be a number between 0 and 1, e.g. 0.01 for 1%"}, status=400)
+        options['relative_gap'] = relative_gap
+
+    no_improvement_seconds = data.get('no_improvement_seconds')
+    if no_improvement_seconds is not None:
+        no_improvement_seconds = _positive_number(no_improvement_seconds)
+        if no_improvement_seconds is None:
+            return None, Response({"error": "no_improvement_seconds must be a positive number"}, status=400)
+        options['no_improvement_seconds'] = no_improvement_seconds
+
+    return options, None
+
+
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def trigger_generation(request):
     department_id = request.data.get('department_id')
+    if not department_id:
+        return Response({"error": "department_id is required"}, status=400)
 
     if not request.user.is_staff:
         try:
@@ -274,15 +364,64 @@ def trigger_generation(request):
         except Teacher.DoesNotExist:
             return Response({"error": "Unauthorized"}, status=403)
 
+    if not Department.objects.filter(id=department_id).exists():
+        return Response({"error": "Department not found"}, status=404)
+
+    options, error = _generation_options(request.data)
+    if error:
+        return error
+
+    job = submit_generation_job(department_id, options)
+    return Response(GenerationJobSerializer(job).data, status=202)
+
+
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def trigger_campus_generation(request):
+    """Generate every department (or those in department_ids) together, so no room is booked twice."""
+    if not request.user.is_staff:
+        return Response({"error": "Only admins can generate the whole campus"}, status=403)
+
+    options, error = _generation_options(request.data)
+    if error:
+        return error
+
+    department_ids = request.data.get('department_ids')
+    if department_ids is not None:
+        if not isinstance(department_ids, list) or not all(str(i).isdigit() for i in department_ids):
+            return Response({"error": "department_ids must be a list of ids"}, status=400)
+        department_ids = sorted({int(i) for i in department_ids})
+        missing = set(department_ids) - set(Department.objects.filter(id__in=department_ids).values_list('id', flat=True))
+        if missing:
+            return Response({"error": f"Department(s) not found: {', '.join(map(str, sorted(missing)))}"}, status=404)
+        options['department_ids'] = department_ids
+
+    job = submit_campus_job(options)
+    return Response(GenerationJobSerializer(job).data, status=202)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def generation_job_status(request, pk):
     try:
-        result = generate_timetable(department_id)
-    except Exception as e:
-        return Response({"error": f"Scheduler error: {str(e)}"}, status=500)
+        job = GenerationJob.objects.get(id=pk)
+    except GenerationJob.DoesNotExist:
+        return Response({"error": "Job not found"}, status=404)
 
-    if result['status'] == 'error':
-        return Response({"error": result['messages'][0]}, status=400)
+    if not request.user.is_staff:
+        try:
+            teacher = Teacher.objects.get(user=request.user)
+            if teacher.department_id != job.department_id:
+                return Response({"error": "You can only view your own department's jobs"}, status=403)
+        except Teacher.DoesNotExist:
+            return Response({"error": "Unauthorized"}, status=403)
 
-    return Response(result)
+    # Polling also revives the pool after a restart and requeues jobs of dead workers, so
+    # neither waits for the next POST
+    recover_orphaned_jobs()
+    job.refresh_from_db()
+    return Response(GenerationJobSerializer(job).data)
 
 
 # --- APPROVE TIMETABLE ---
@@ -303,10 +442,39 @@ def approve_timetable(request, pk):
 
     tt.status = 'PUBLISHED'
     tt.save()
+    bump_versions([tt.id])
+    pdf_cache.invalidate(tt.id)
+    # Students and teachers all download their PDFs right after publishing
+    transaction.on_commit(lambda: submit_prerender(tt.id))
 
     return Response({"status": "success", "message": f"Variant {tt.variant_number} published! All other variants deleted."})
 
 
+# --- REPAIR TIMETABLE ---
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def repair_timetable(request, pk):
+    """Re-place only the slots affected by changed inputs (e.g. a new teacher unavailability)."""
+    if not request.user.is_staff:
+        return Response({"error": "Only admins can repair timetables"}, status=403)
+
+    if not GeneratedTimetable.objects.filter(id=pk).exists():
+        return Response({"error": "Timetable not found"}, status=404)
+
+    # Optional: the teachers, batches and rooms whose inputs changed. Slots that break the
+    # current constraints are found automatically, so an empty body is enough for most edits.
+    changed = {}
+    for field in ('teacher_ids', 'batch_ids', 'room_ids'):
+        ids = request.data.get(field) or []
+        if not isinstance(ids, list) or not all(str(i).isdigit() for i in ids):
+            return Response({"error": f"{field} must be a list of ids"}, status=400)
+        changed[field] = [int(i) for i in ids]
+
+    result = run_repair(pk, **changed)
+    return Response(result, status=200 if result['status'] == 'success' else 409)
+
+
 # --- SWAP / MOVE SLOTS ---
 @csrf_exempt
 @api_view(['POST'])
@@ -321,22 +489,11 @@ def swap_slots(request):
     target_day = request.data.get('target_day')
     target_slot_index = request.data.get('target_slot_index')
 
-    TIME_SLOT_MAP = {
-        0: ("07:30", "08:30"),
-        1: ("08:30", "09:30"),
-        2: ("10:00", "11:00"),
-        3: ("11:00", "12:00"),
-        4: ("12:00", "13:00"),
-        5: ("13:00", "14:00"),
-        6: ("14:00", "15:00"),
-        7: ("15:00", "16:00"),
-    }
-
     # --- Case 1: Swap two slots ---
     if slot_a_id and slot_b_id:
         try:
-            slot_a = TimetableSlot.objects.get(id=slot_a_id)
-            slot_b = TimetableSlot.objects.get(id=slot_b_id)
+            slot_a = TimetableSlot.objects.select_related('timetable', 'room', 'teacher', 'subject', 'batch').get(id=slot_a_id)
+            slot_b = TimetableSlot.objects.select_related('room', 'teacher', 'subject', 'batch').get(id=slot_b_id)
         except TimetableSlot.DoesNotExist:
             return Response({"error": "Slot not found"}, status=404)
 
@@ -344,20 +501,26 @@ def swap_slots(request):
             return Response({"error": "Slots must belong to the same timetable"}, status=400)
 
         # Check if either slot is pinned
-        time_keys = ["07:30", "08:30", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00"]
         for s in [slot_a, slot_b]:
-            s_time_key = s.start_time.strftime("%H:%M")
-            s_idx = time_keys.index(s_time_key) if s_time_key in time_keys else -1
-            if PinnedSlot.objects.filter(subject=s.subject, day=s.day, slot_index=s_idx).exists():
+            if PinnedSlot.objects.filter(subject=s.subject, day=s.day, slot_index=s.slot_index).exists():
                 return Response({"error": f"Cannot move '{s.subject.name}' — it is a fixed slot"}, status=400)
 
+        # No clash or broken rule, unless the admin insists
+        validator = MoveValidator(slot_a.timetable)
+        problems = validator.problems(validator.swap(validator.records[slot_a.id], validator.records[slot_b.id]))
+        if problems and not request.data.get('force'):
+            return Response({"error": problems[0], "problems": problems}, status=409)
+
         # Swap day, start_time, end_time, room
         slot_a.day, slot_b.day = slot_b.day, slot_a.day
         slot_a.start_time, slot_b.start_time = slot_b.start_time, slot_a.start_time
+        slot_a.slot_index, slot_b.slot_index = slot_b.slot_index, slot_a.slot_index
         slot_a.end_time, slot_b.end_time = slot_b.end_time, slot_a.end_time
         slot_a.room, slot_b.room = slot_b.room, slot_a.room
         slot_a.save()
         slot_b.save()
+        bump_versions([slot_a.timetable_id])
+        pdf_cache.invalidate(slot_a.timetable_id)
 
         return Response({
             "status": "success",
@@ -370,27 +533,31 @@ def swap_slots(request):
     # --- Case 2: Move slot to empty cell ---
     if slot_id and target_day is not None and target_slot_index is not None:
         try:
-            slot = TimetableSlot.objects.get(id=slot_id)
+            slot = TimetableSlot.objects.select_related('timetable', 'room', 'teacher', 'subject', 'batch').get(id=slot_id)
         except TimetableSlot.DoesNotExist:
             return Response({"error": "Slot not found"}, status=404)
 
         # Check if slot is pinned
-        time_keys_move = ["07:30", "08:30", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00"]
-        s_time_key = slot.start_time.strftime("%H:%M")
-        s_idx = time_keys_move.index(s_time_key) if s_time_key in time_keys_move else -1
-        if PinnedSlot.objects.filter(subject=slot.subject, day=slot.day, slot_index=s_idx).exists():
+        if PinnedSlot.objects.filter(subject=slot.subject, day=slot.day, slot_index=slot.slot_index).exists():
             return Response({"error": f"Cannot move '{slot.subject.name}' — it is a fixed slot"}, status=400)
 
-        idx = int(target_slot_index)
-        if idx not in TIME_SLOT_MAP:
+        if target_day not in DAYS:
+            return Response({"error": "Invalid day"}, status=400)
+        idx = int(target_slot_index) if str(target_slot_index).isdigit() else -1
+        if not 0 <= idx < SLOTS_PER_DAY:
             return Response({"error": "Invalid slot index"}, status=400)
 
-        start_str, end_str = TIME_SLOT_MAP[idx]
-        from datetime import time as dt_time
+        validator = MoveValidator(slot.timetable)
+        problems = validator.problems([Move(validator.records[slot.id], DAYS.index(target_day), idx, slot.room_id)])
+        if problems and not request.data.get('force'):
+            return Response({"error": problems[0], "problems": problems}, status=409)
+
         slot.day = target_day
-        slot.start_time = dt_time(*map(int, start_str.split(":")))
-        slot.end_time = dt_time(*map(int, end_str.split(":")))
+        slot.start_time, slot.end_time = slot_times(idx)
+        slot.slot_index = idx
         slot.save()
+        bump_versions([slot.timetable_id])
+        pdf_cache.invalidate(slot.timetable_id)
 
         return Response({
             "status": "success",
@@ -400,10 +567,112 @@ def swap_slots(request):
     return Response({"error": "Provide either (slot_a_id, slot_b_id) or (slot_id, target_day, target_slot_index)"}, status=400)
 
 
-# --- PDF EXPORT ---
+def _parse_move(data, validator):
+    """One entry of a batch-move request as a MoveValidator.replay() operation. Returns (operation, error)."""
+    if not isinstance(data, dict):
+        return None, "Each move must be an object"
+    ids = [data.get(k) for k in ('slot_a_id', 'slot_b_id')] if 'slot_a_id' in data else [data.get('slot_id')]
+    if not all(str(i).isdigit() and int(i) in validator.records for i in ids):
+        return None, "Slot not found in this timetable"
+    records = [validator.records[int(i)] for i in ids]
+    for r in records:
+        if validator.is_pinned(r):
+            return None, f"Cannot move '{validator.subjects.get(r.subject_id)}' — it is a fixed slot"
+
+    if len(records) == 2:
+        if records[0].id == records[1].id:
+            return None, "A slot cannot be swapped with itself"
+        if any(r.day < 0 or r.slot < 0 for r in records):
+            return None, "Only slots on the timetable grid can be swapped"
+        return ('swap', records[0].id, records[1].id), None
+
+    day, index = data.get('target_day'), data.get('target_slot_index')
+    if day not in DAYS:
+        return None, "Invalid day"
+    if not str(index).isdigit() or not 0 <= int(index) < SLOTS_PER_DAY:
+        return None, "Invalid slot index"
+    return ('move', records[0].id, DAYS.index(day), int(index)), None
+
+
 @csrf_exempt
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_move_slots(request, pk):
+    """Apply an ordered list of moves and swaps in one transaction, checked together against the final state.
+
+    Body: {"moves": [{"slot_id", "target_day", "target_slot_index"} or {"slot_a_id", "slot_b_id"}, ...],
+    "force": false}. Either every entry is applied or none is; results[i] reports entry i.
+    """
+    if not request.user.is_staff:
+        return Response({"error": "Only admins can swap slots"}, status=403)
+    entries = request.data.get('moves')
+    if not isinstance(entries, list) or not entries:
+        return Response({"error": "moves must be a non-empty list"}, status=400)
+
+    with transaction.atomic():
+        try:
+            # Locked so two editing sessions on one timetable apply one after the other
+            tt = GeneratedTimetable.objects.select_for_update().get(id=pk)
+        except GeneratedTimetable.DoesNotExist:
+            return Response({"error": "Timetable not found"}, status=404)
+
+        validator = MoveValidator(tt)
+        parsed = [_parse_move(entry, validator) for entry in entries]
+        if any(error for _, error in parsed):
+            results = [{"index": i, "status": "invalid" if error else "ok", "problems": [error] if error else []}
+                       for i, (_, error) in enumerate(parsed)]
+            return Response({"status": "invalid", "error": next(e for _, e in parsed if e), "results": results}, status=400)
+
+        operations = [operation for operation, _ in parsed]
+        moves = validator.replay(operations)
+        found = dict(zip(moves, validator.check(list(moves.values()))))
+        results = []
+        for i, operation in enumerate(operations):
+            touched = operation[1:3] if operation[0] == 'swap' else operation[1:2]
+            problems = list(dict.fromkeys(p for slot_id in touched for p in found.get(slot_id, [])))
+            results.append({"index": i, "status": "rejected" if problems else "ok", "problems": problems})
+        rejected = [r for r in results if r['status'] == 'rejected']
+        if rejected and not request.data.get('force'):
+            return Response({"status": "rejected", "error": rejected[0]['problems'][0], "results": results}, status=409)
+
+        updates = []
+        for m in moves.values():
+            start_time, end_time = slot_times(m.slot)
+            updates.append(TimetableSlot(
+                id=m.record.id, day=DAYS[m.day], slot_index=m.slot, start_time=start_time, end_time=end_time, room_id=m.room_id,
+            ))
+        TimetableSlot.objects.bulk_update(updates, ['day', 'slot_index', 'start_time', 'end_time', 'room'])
+        if updates:
+            bump_versions([tt.id])
+            transaction.on_commit(lambda: pdf_cache.invalidate(tt.id))
+
+    slots = TimetableSlot.objects.filter(id__in=moves).select_related('room', 'teacher', 'subject', 'batch')
+    return Response({"status": "success", "results": results, "slots": TimetableSlotSerializer(slots, many=True).data})
+
+
 @api_view(['GET'])
-def export_timetable_pdf(request, pk):
+@permission_classes([permissions.IsAuthenticated])
+def slot_targets(request, pk):
+    """Every cell a slot can move to, and every slot of its batch it can swap with, without breaking a rule."""
+    if not request.user.is_staff:
+        return Response({"error": "Only admins can swap slots"}, status=403)
+    try:
+        slot = TimetableSlot.objects.select_related('timetable').get(id=pk)
+    except TimetableSlot.DoesNotExist:
+        return Response({"error": "Slot not found"}, status=404)
+
+    validator = MoveValidator(slot.timetable)
+    cells, swaps = validator.targets(validator.records[slot.id])
+    return Response({
+        "slot_id": slot.id,
+        "cells": [{"day": DAYS[day], "slot_index": index} for day, index in cells],
+        "swap_slot_ids": swaps,
+    })
+
+
+# --- PDF EXPORT ---
+def _authenticate_token(request):
+    """Set request.user from ?token= or an Authorization header; returns an error Response, or None."""
     # Accept token from query param since window.open() can't send headers
     token_key = request.query_params.get('token')
     if not token_key:
@@ -417,157 +686,53 @@ def export_timetable_pdf(request, pk):
         request.user = token_obj.user
     except Token.DoesNotExist:
         return Response({"error": "Invalid token"}, status=401)
+    return None
+
+
+@csrf_exempt
+@api_view(['GET'])
+def export_timetable_pdf(request, pk):
+    error = _authenticate_token(request)
+    if error:
+        return error
     try:
-        from reportlab.lib import colors
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.lib.units import inch
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        import reportlab  # noqa: F401
     except ImportError:
         return Response({"error": "reportlab is not installed. Run: pip install reportlab"}, status=500)
 
     try:
-        tt = GeneratedTimetable.objects.get(id=pk)
+        tt = GeneratedTimetable.objects.select_related('department').get(id=pk)
     except GeneratedTimetable.DoesNotExist:
         return Response({"error": "Timetable not found"}, status=404)
 
     batch_id = request.query_params.get('batch')
     teacher_id = request.query_params.get('teacher')
+    if not all(v.isdigit() for v in (batch_id, teacher_id) if v):
+        return Response({"error": "batch and teacher must be ids"}, status=400)
 
-    slots = TimetableSlot.objects.filter(timetable=tt)
-    if batch_id:
-        sub_ids = list(StudentBatch.objects.filter(parent_batch_id=batch_id).values_list('id', flat=True))
-        all_ids = [int(batch_id)] + sub_ids
-        slots = slots.filter(batch_id__in=all_ids)
-    if teacher_id:
-        slots = slots.filter(teacher_id=teacher_id)
-
-    slots = slots.select_related('subject', 'teacher', 'room', 'batch')
-
-    days = ['MON', 'TUE', 'WED', 'THU', 'FRI']
-    time_labels = [
-        "07:30-08:30", "08:30-09:30", "10:00-11:00", "11:00-12:00",
-        "12:00-13:00", "13:00-14:00", "14:00-15:00", "15:00-16:00"
-    ]
-    time_keys = ["07:30", "08:30", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00"]
-
-    matrix = [[[] for _ in range(5)] for _ in range(8)]
-    for slot in slots:
-        time_key = slot.start_time.strftime("%H:%M")
-        try:
-            row = time_keys.index(time_key)
-        except ValueError:
-            continue
-        try:
-            col = days.index(slot.day)
-        except ValueError:
-            continue
-        matrix[row][col].append(f"{slot.subject.name}\n{slot.teacher.name}\n{slot.room.name}")
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), topMargin=0.5 * inch, bottomMargin=0.5 * inch)
-
-    styles = getSampleStyleSheet()
-
-    # Clean, readable styles
-    cell_style = ParagraphStyle(
-        'Cell', parent=styles['Normal'],
-        fontSize=7.5, leading=10, textColor=colors.HexColor('#1e293b'),
-        alignment=1  # CENTER
-    )
-    time_style = ParagraphStyle(
-        'TimeCell', parent=styles['Normal'],
-        fontSize=7.5, leading=10, textColor=colors.HexColor('#475569'),
-        alignment=1, fontName='Helvetica-Bold'
-    )
-    header_style = ParagraphStyle(
-        'Header', parent=styles['Normal'],
-        fontSize=9, leading=11, textColor=colors.white,
-        alignment=1, fontName='Helvetica-Bold'
-    )
-    title_style = ParagraphStyle(
-        'CustomTitle', parent=styles['Title'],
-        fontSize=16, leading=20, textColor=colors.HexColor('#0f172a'),
-        spaceAfter=4, alignment=1
-    )
-    subtitle_style = ParagraphStyle(
-        'Subtitle', parent=styles['Normal'],
-        fontSize=8, leading=10, textColor=colors.HexColor('#64748b'),
-        alignment=1
-    )
-
-    # Determine title
-    title_parts = [tt.department.name]
-    if batch_id:
-        batch_obj = StudentBatch.objects.filter(id=batch_id).first()
-        if batch_obj:
-            title_parts.append(batch_obj.name)
-    if teacher_id:
-        teacher_obj = Teacher.objects.filter(id=teacher_id).first()
-        if teacher_obj:
-            title_parts.append(teacher_obj.name)
-    status_label = f"Variant {tt.variant_number}" if tt.status == 'DRAFT' else 'Published'
-
-    title = Paragraph(f"<b>{'  —  '.join(title_parts)}</b>", title_style)
-    subtitle = Paragraph(f"{status_label}  •  Generated by ATLAS", subtitle_style)
-
-    header_row = [Paragraph('<b>TIME</b>', header_style)] + [Paragraph(f'<b>{d}</b>', header_style) for d in days]
-
-    data = [header_row]
-    for i, row in enumerate(matrix):
-        cells = [Paragraph(f'<b>{time_labels[i]}</b>', time_style)]
-        for cell_entries in row:
-            if cell_entries:
-                formatted = []
-                for entry in cell_entries:
-                    parts = entry.split('\n')
-                    subj = f'<b>{parts[0]}</b>' if len(parts) > 0 else ''
-                    teacher = f'<br/><i><font color="#475569">{parts[1]}</font></i>' if len(parts) > 1 else ''
-                    room = f'<br/><font color="#64748b" size="6">{parts[2]}</font>' if len(parts) > 2 else ''
-                    formatted.append(f'{subj}{teacher}{room}')
-                cells.append(Paragraph('<br/>'.join(formatted), cell_style))
-            else:
-                cells.append(Paragraph('<font color="#cbd5e1">—</font>', cell_style))
-        data.append(cells)
-
-    col_widths = [80] + [130] * 5
-    table = Table(data, colWidths=col_widths)
-
-    # Clean teal header, white body, light alternating rows
-    teal = colors.HexColor('#0d9488')
-    teal_dark = colors.HexColor('#0f766e')
-    light_gray = colors.HexColor('#f8fafc')
-    border_color = colors.HexColor('#e2e8f0')
-
-    table.setStyle(TableStyle([
-        # Header row
-        ('BACKGROUND', (0, 0), (-1, 0), teal),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-
-        # Time column
-        ('BACKGROUND', (0, 1), (0, -1), colors.HexColor('#f1f5f9')),
-
-        # Alternating row backgrounds
-        ('ROWBACKGROUNDS', (1, 1), (-1, -1), [colors.white, light_gray]),
-
-        # Grid and borders
-        ('GRID', (0, 0), (-1, -1), 0.5, border_color),
-        ('LINEBELOW', (0, 0), (-1, 0), 1.5, teal_dark),
-        ('LINEAFTER', (0, 0), (0, -1), 1, colors.HexColor('#cbd5e1')),
-
-        # Alignment and padding
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-    ]))
-
-    elements = [title, subtitle, Spacer(1, 14), table]
-    doc.build(elements)
-
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="timetable_{pk}.pdf"'
+    path = cached_timetable_pdf(tt, int(batch_id) if batch_id else None, int(teacher_id) if teacher_id else None)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"timetable_{pk}.pdf", content_type='application/pdf')
+
+
+@csrf_exempt
+@api_view(['GET'])
+def export_timetable_bundle(request, pk):
+    """ZIP of every batch's and teacher's PDF, streamed while the PDFs render."""
+    error = _authenticate_token(request)
+    if error:
+        return error
+    if not request.user.is_staff:
+        return Response({"error": "Only admins can export every timetable PDF"}, status=403)
+    try:
+        import reportlab  # noqa: F401
+    except ImportError:
+        return Response({"error": "reportlab is not installed. Run: pip install reportlab"}, status=500)
+
+    try:
+        tt = GeneratedTimetable.objects.select_related('department').get(id=pk)
+    except GeneratedTimetable.DoesNotExist:
+        return Response({"error": "Timetable not found"}, status=404)
+
+    response = StreamingHttpResponse(timetable_bundle(tt), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="timetable_{pk}_pdfs.zip"'
     return response
@@ -129,5 +129,32 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # Lists stay plain arrays unless the client asks for cursor pages with ?page_size=N
+    'DEFAULT_PAGINATION_CLASS': 'api.listing.OptInCursorPagination',
 }
 
+
+# TIMETABLE GENERATION
+# Background threads per web process that run queued generation jobs. Each job
+# already spreads its solver variants over every core, so keep this small.
+GENERATION_JOB_WORKERS = 1
+
+# Seconds without a heartbeat after which a running job counts as orphaned and is
+# requeued. Workers beat every quarter of this.
+GENERATION_JOB_LEASE = 60
+
+# Identical inputs and settings return the cached variants instead of re-solving.
+# Entries per web process, least recently used evicted first.
+GENERATION_CACHE_SIZE = 32
+
+# Serialized slot lists of published timetables, cached per timetable version.
+# Bytes of rendered JSON per web process, least recently used evicted first.
+SNAPSHOT_CACHE_BYTES = 16 * 1024 * 1024
+
+# Rendered timetable PDFs, cached on disk per timetable version and pre-rendered
+# for every batch and teacher when a timetable is published.
+PDF_CACHE_DIR = BASE_DIR / 'pdf_cache'
+PDF_CACHE_BYTES = 256 * 1024 * 1024
+PDF_PRERENDER_WORKERS = 1
+# Processes that render PDFs for bundles and pre-rendering (empty: one per core)
+PDF_RENDER_PROCESSES = None